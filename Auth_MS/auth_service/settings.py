@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -75,6 +76,8 @@ SIMPLE_JWT = {
 # Application definition
 
 INSTALLED_APPS = [
+    # Serves the ASGI application for runserver too
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -117,6 +120,9 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'auth_service.wsgi.application'
+# Login and register are async views: run under ASGI (daphne) so that
+# password hashing doesn't tie up a worker per request
+ASGI_APPLICATION = 'auth_service.asgi.application'
 
 
 # Database
@@ -136,6 +142,26 @@ DATABASES = {
     }
 }
 
+# Set AUTH_DB=sqlite to run locally (or run the test suite) without MySQL
+if os.environ.get("AUTH_DB") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+        }
+    }
+
+
+# Password hashing pool for login/register (processes; 0 hashes in threads)
+AUTH_HASHING_PROCESSES = int(os.environ.get("AUTH_HASHING_PROCESSES", os.cpu_count() or 1))
+# Hashes allowed in flight before login/register answer 503
+AUTH_HASHING_MAX_PENDING = 4 * max(AUTH_HASHING_PROCESSES, 1)
+
+# Log in with either the username or the email address
+AUTHENTICATION_BACKENDS = [
+    'users.backends.UsernameOrEmailBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -0,0 +1,132 @@
+"""Logins/sec versus hashing pool size, and what a login storm does to /me/.
+
+For each pool size, fires ``--logins`` logins at ``--concurrency`` at a time
+through the ASGI app (against a throwaway SQLite database) while another
+task polls /api/auth/me/. Prints one JSON object per pool size: logins/sec,
+login latency percentiles, 503s from admission control and /me/ latency
+percentiles during the storm. Clients turned away with 503 retry after 50 ms.
+Pool size 0 hashes in threads instead.
+
+    python benchmarks/logins.py --pool-sizes 1,2,4 --logins 200
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auth_service.settings")
+os.environ["AUTH_DB"] = "sqlite"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import AsyncClient  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from users import views  # noqa: E402
+from users.hashing import HashingPool  # noqa: E402
+
+PASSWORD = "bench-pass-123"
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(percent):
+        return round(values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))], 2)
+
+    return {"mean": round(statistics.fmean(values), 2), "p50": at(50), "p95": at(95), "p99": at(99)}
+
+
+async def _storm(logins, concurrency, access):
+    client = AsyncClient()
+    login_latencies = []
+    me_latencies = []
+    statuses = {}
+    remaining = iter(range(logins))
+    done = asyncio.Event()
+
+    async def login_worker():
+        for number in remaining:
+            started = time.perf_counter()
+            while True:
+                response = await client.post(
+                    "/api/auth/login/",
+                    {"username": f"user{number % 10}@example.com", "password": PASSWORD},
+                    content_type="application/json",
+                )
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code != 503:
+                    break
+                # Turned away by admission control: back off and retry, like a client would
+                await asyncio.sleep(0.05)
+            if response.status_code == 200:
+                login_latencies.append((time.perf_counter() - started) * 1000)
+
+    async def me_prober():
+        while not done.is_set():
+            started = time.perf_counter()
+            await client.get("/api/auth/me/", headers={"Authorization": f"Bearer {access}"})
+            me_latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.01)
+
+    prober = asyncio.create_task(me_prober())
+    started = time.perf_counter()
+    await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await prober
+    return elapsed, statuses, login_latencies, me_latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pool-sizes", default="1,2,4", help="comma-separated hashing process counts")
+    parser.add_argument("--logins", type=int, default=100, help="logins per pool size")
+    parser.add_argument("--concurrency", type=int, default=16, help="logins in flight at once")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="admission limit (default: 4 x pool size, as in settings)")
+    args = parser.parse_args()
+
+    # 503s are expected here, don't log each one
+    logging.getLogger("django.request").setLevel(logging.CRITICAL)
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+    for number in range(10):
+        User.objects.create_user(username=f"user{number}", email=f"user{number}@example.com", password=PASSWORD)
+    access = views.LoginSerializer.get_token(User.objects.get(username="user0")).access_token
+
+    for size in (int(value) for value in args.pool_sizes.split(",")):
+        pool = HashingPool(processes=size, max_pending=args.max_pending)
+        views.hashing_pool = pool
+        # Start the workers before timing anything
+        asyncio.run(pool.hash_password("warm-up"))
+        elapsed, statuses, login_latencies, me_latencies = asyncio.run(
+            _storm(args.logins, args.concurrency, access)
+        )
+        pool.shutdown()
+        print(json.dumps({
+            "pool_size": size,
+            "max_pending": pool.max_pending,
+            "logins": args.logins,
+            "concurrency": args.concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "logins_per_second": round(statuses.get(200, 0) / elapsed, 2),
+            "statuses": statuses,
+            "login_latency_ms": _percentiles(login_latencies),
+            "me_latency_ms": _percentiles(me_latencies),
+        }))
+
+
+if __name__ == "__main__":
+    main()
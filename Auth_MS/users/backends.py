@@ -0,0 +1,122 @@
+import inspect
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model, load_backend
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.views.decorators.debug import sensitive_variables
+
+from .hashing import hashing_pool
+
+UserModel = get_user_model()
+
+# Credentials not to pass on to user_login_failed receivers, as Django's authenticate() does
+SENSITIVE_CREDENTIALS = re.compile("api|token|key|secret|password|signature", re.I)
+CLEANSED_SUBSTITUTE = "********************"
+
+
+def login_candidates(identifier):
+    """Users whose username or email is ``identifier``: one indexed query."""
+    return UserModel._default_manager.filter(
+        Q(**{UserModel.USERNAME_FIELD: identifier}) | Q(email=identifier)
+    )[:2]
+
+
+def pick_login_user(candidates, identifier):
+    """The user a login identifier means; a username match beats an email one."""
+    candidates = sorted(candidates, key=lambda candidate: candidate.get_username() != identifier)
+    return candidates[0] if candidates else None
+
+
+class UsernameOrEmailBackend(ModelBackend):
+    """Authenticate with either the username or the email address.
+
+    Both are looked up in one query (``auth_user.email`` is indexed, see
+    migration 0001) and the password is hashed exactly once, whether or not
+    a user matched. If the input is one user's username and another's email,
+    the username wins.
+
+    ``aauthenticate`` does the same for async callers, hashing in the
+    hashing pool (see users/hashing.py) instead of on the calling thread.
+    """
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = pick_login_user(login_candidates(username), username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user
+            UserModel().set_password(password)
+            return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = pick_login_user([user async for user in login_candidates(username)], username)
+        if user is None:
+            await hashing_pool.hash_password(password)
+            return None
+
+        matches, new_hash = await hashing_pool.verify_password(password, user.password)
+        if not matches or not self.user_can_authenticate(user):
+            return None
+        if new_hash is not None:
+            # Stored with an outdated hasher: save the upgrade, as check_password() would
+            user.password = new_hash
+            await user.asave(update_fields=["password"])
+        return user
+
+
+@sensitive_variables("credentials")
+async def aauthenticate(request=None, **credentials):
+    """Async ``django.contrib.auth.authenticate()``, as Django 5.0 has it.
+
+    Tries every backend in AUTHENTICATION_BACKENDS, awaiting those with an
+    ``aauthenticate`` method and running the others in a thread, and sends
+    ``user_login_failed`` if none accepts the credentials.
+    """
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+        try:
+            inspect.signature(backend.authenticate).bind(request, **credentials)
+        except TypeError:
+            # This backend doesn't accept these credentials
+            continue
+        try:
+            if hasattr(backend, 'aauthenticate'):
+                user = await backend.aauthenticate(request, **credentials)
+            else:
+                user = await sync_to_async(backend.authenticate)(request, **credentials)
+        except PermissionDenied:
+            break
+        if user is None:
+            continue
+        user.backend = backend_path
+        return user
+
+    await sync_to_async(user_login_failed.send)(
+        sender=__name__, credentials=_cleansed(credentials), request=request
+    )
+
+
+@sensitive_variables("credentials")
+def _cleansed(credentials):
+    return {
+        key: CLEANSED_SUBSTITUTE if SENSITIVE_CREDENTIALS.search(key) else value
+        for key, value in credentials.items()
+    }
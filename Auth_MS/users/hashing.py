@@ -0,0 +1,107 @@
+import asyncio
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class HashingOverloaded(Exception):
+    """More password hashes are queued than the pool is allowed to take."""
+
+
+def _setup_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def make_executor(processes):
+    """Process pool whose workers have Django set up for hashing."""
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        # Don't fork the server's threads and sockets into the workers
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_setup_worker,
+        initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'auth_service.settings'),),
+    )
+
+
+def _hash(password):
+    return make_password(password)
+
+
+def _verify(password, encoded):
+    """Check a password; returns (matches, hash to store instead or None).
+
+    The new hash is set when the stored one uses an outdated hasher or
+    iteration count, as ``User.check_password`` would upgrade it.
+    """
+    upgraded = []
+    matches = check_password(password, encoded, setter=lambda raw: upgraded.append(make_password(raw)))
+    return matches, upgraded[0] if upgraded else None
+
+
+class HashingPool:
+    """Runs password hashing in a bounded pool of worker processes.
+
+    PBKDF2 is pure CPU, so on the request thread (or the event loop) a burst
+    of logins holds up every other request. Here the event loop only awaits
+    the result. At most ``max_pending`` hashes may be queued or running at
+    once; beyond that ``HashingOverloaded`` is raised straight away, so a
+    login storm gets fast 503s instead of a queue that grows without bound.
+
+    With ``processes=0`` hashing runs in the default thread pool instead,
+    which is enough for development and tests.
+    """
+
+    def __init__(self, processes=None, max_pending=None):
+        if processes is None:
+            processes = os.cpu_count() or 1
+        self.processes = processes
+        self.max_pending = max_pending if max_pending is not None else 4 * max(self.processes, 1)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+        self.rejected = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None and self.processes > 0:
+                self._executor = make_executor(self.processes)
+            return self._executor
+
+    async def _run(self, function, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise HashingOverloaded()
+            self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), function, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    async def hash_password(self, password):
+        return await self._run(_hash, password)
+
+    async def verify_password(self, password, encoded):
+        return await self._run(_verify, password, encoded)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+hashing_pool = HashingPool(
+    processes=getattr(settings, 'AUTH_HASHING_PROCESSES', None),
+    max_pending=getattr(settings, 'AUTH_HASHING_MAX_PENDING', None),
+)
+atexit.register(hashing_pool.shutdown)
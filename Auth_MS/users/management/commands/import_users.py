@@ -0,0 +1,176 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from users.hashing import make_executor
+
+TRUE_VALUES = {"1", "true", "yes", "y"}
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, row dict) from a CSV (with header) or NDJSON stream."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield line_number, row if isinstance(row, dict) else {"_error": "not a JSON object"}
+
+
+def build_user(row):
+    """Validate one input row; returns an unsaved User (password in plain) or raises ValueError."""
+    if "_error" in row:
+        raise ValueError(row["_error"])
+    username = str(row.get("username") or "").strip()
+    email = str(row.get("email") or "").strip()
+    password = row.get("password") or ""
+    if not username or not email or not password:
+        raise ValueError("username, email and password are required")
+    try:
+        User.username_validator(username)
+        validate_email(email)
+    except ValidationError as e:
+        raise ValueError(" ".join(e.messages))
+    if len(username) > User._meta.get_field("username").max_length:
+        raise ValueError("username is too long")
+
+    is_admin = str(row.get("is_admin", "")).strip().lower() in TRUE_VALUES
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        is_staff=is_admin,
+        is_superuser=is_admin,
+    )
+    user.password = str(password)
+    return user
+
+
+class Command(BaseCommand):
+    help = "Create users in bulk from a CSV or NDJSON file (username, email, password, is_admin)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument(
+            '--format', choices=['csv', 'ndjson'], default=None,
+            help="Input format (default: from the file extension, else csv)",
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Users hashed and inserted per transaction (default: 1000)",
+        )
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help="Hashing processes (default: AUTH_HASHING_PROCESSES; 0 hashes in this process)",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        batch_size = options['batch_size']
+        processes = options['processes']
+        if processes is None:
+            processes = getattr(settings, 'AUTH_HASHING_PROCESSES', os.cpu_count() or 1)
+        if batch_size < 1 or processes < 0:
+            raise CommandError("--batch-size must be at least 1 and --processes at least 0")
+
+        if path == '-':
+            stream = sys.stdin
+        else:
+            try:
+                stream = open(path, newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(f"Can't open {path}: {e}")
+
+        executor = make_executor(processes) if processes > 0 else None
+        self.imported = 0
+        self.failed = 0
+        started = time.perf_counter()
+        try:
+            rows = read_rows(stream, fmt)
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - started
+        total = self.imported + self.failed
+        self.stdout.write(
+            f"Imported {self.imported} users, {self.failed} failed, "
+            f"{total} rows in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.1f} rows/sec)"
+        )
+
+    def fail(self, line_number, reason):
+        self.failed += 1
+        self.stderr.write(f"line {line_number}: {reason}")
+
+    def import_batch(self, batch, executor):
+        users = []
+        seen = set()
+        for line_number, row in batch:
+            try:
+                user = build_user(row)
+            except ValueError as e:
+                self.fail(line_number, e)
+                continue
+            if user.username in seen:
+                self.fail(line_number, f"duplicate username {user.username!r} in file")
+                continue
+            seen.add(user.username)
+            users.append((line_number, user))
+
+        # One query for the whole batch instead of one per row
+        existing = set(
+            User.objects.filter(username__in=[user.username for _, user in users])
+            .values_list('username', flat=True)
+        )
+        pending = []
+        for line_number, user in users:
+            if user.username in existing:
+                self.fail(line_number, f"username {user.username!r} already exists")
+            else:
+                pending.append((line_number, user))
+        if not pending:
+            return
+
+        passwords = [user.password for _, user in pending]
+        hashes = executor.map(make_password, passwords, chunksize=16) if executor else map(make_password, passwords)
+        for (_, user), encoded in zip(pending, hashes):
+            user.password = encoded
+
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create([user for _, user in pending])
+            self.imported += len(pending)
+        except IntegrityError:
+            # Someone created one of these meanwhile: insert one by one to find out which
+            for line_number, user in pending:
+                try:
+                    with transaction.atomic():
+                        user.save()
+                    self.imported += 1
+                except IntegrityError as e:
+                    self.fail(line_number, e)
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+INDEX = models.Index(fields=['email'], name='auth_user_email_idx')
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model('auth', 'User'), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model('auth', 'User'), INDEX)
+
+
+class Migration(migrations.Migration):
+    """Index auth_user.email for the username-or-email login lookup.
+
+    auth.User belongs to django.contrib.auth, so the index is created directly
+    rather than declared on the model.
+    """
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
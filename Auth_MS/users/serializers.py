@@ -1,6 +1,5 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from django.contrib.auth import authenticate
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -13,61 +12,33 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         is_admin = validated_data.pop('is_admin', False)
-        
-        user = User.objects.create_user(
-            username=validated_data["username"],
-            email=validated_data["email"],
-            password=validated_data["password"],
+        # The async register view hashes the password in the hashing pool
+        password_hash = validated_data.pop('password_hash', None)
+
+        # One INSERT, admin flags included
+        user = User(
+            username=User.normalize_username(validated_data["username"]),
+            email=User.objects.normalize_email(validated_data["email"]),
+            is_staff=is_admin,
+            is_superuser=is_admin,
         )
-        
-        # Set admin privileges if specified
-        if is_admin:
-            user.is_staff = True
-            user.is_superuser = True
-            user.save()
+        if password_hash is not None:
+            user.password = password_hash
+        else:
+            user.set_password(validated_data["password"])
+        user.save()
         
         return user
 
 class LoginSerializer(TokenObtainPairSerializer):
     username_field = "username"
 
-    def validate(self, attrs):
-        username_or_email = attrs.get("username")
-        password = attrs.get("password")
-
-        user = authenticate(
-            request=self.context.get("request"),
-            username=username_or_email,
-            password=password,
-        )
-
-        # Try email login if username fails
-        if not user:
-            try:
-                from django.contrib.auth.models import User
-                user_obj = User.objects.get(email=username_or_email)
-                user = authenticate(
-                    request=self.context.get("request"),
-                    username=user_obj.username,
-                    password=password,
-                )
-            except User.DoesNotExist:
-                pass
-
-        if not user:
-            raise ValueError("Invalid credentials")
-
-        data = super().validate({
-            "username": user.username,
-            "password": password,
-        })
-
-        # Add user information including admin status
-        data["user"] = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "is_admin": user.is_staff or user.is_superuser,  # Check if user is admin
-        }
-        
-        return data
\ No newline at end of file
+    @classmethod
+    def get_token(cls, user):
+        # Signed claims, so services can tell who the caller is (and whether
+        # they're an admin) from the token alone, without a DB lookup
+        token = super().get_token(user)
+        token["username"] = user.username
+        token["email"] = user.email
+        token["is_admin"] = user.is_staff or user.is_superuser
+        return token
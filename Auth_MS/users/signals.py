@@ -0,0 +1,21 @@
+from django.contrib.auth.models import update_last_login
+from django.contrib.auth.signals import user_logged_in
+from rest_framework_simplejwt.settings import api_settings
+
+
+def update_last_login_unless_token_login(sender, user, request=None, **kwargs):
+    """Django's last_login receiver, skipped for token logins (see users.views.login).
+
+    Those record last_login only if SIMPLE_JWT's UPDATE_LAST_LOGIN is set,
+    as simplejwt's own login view does: it's an extra UPDATE of the user's
+    row on every login.
+    """
+    if getattr(request, "token_login", False) and not api_settings.UPDATE_LAST_LOGIN:
+        return
+    update_last_login(sender, user, **kwargs)
+
+
+def replace_update_last_login():
+    # Same dispatch_uid as django.contrib.auth, which connects its receiver first
+    if user_logged_in.disconnect(dispatch_uid="update_last_login"):
+        user_logged_in.connect(update_last_login_unless_token_login, dispatch_uid="update_last_login")
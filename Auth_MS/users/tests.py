@@ -1,3 +1,240 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in, user_login_failed
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework_simplejwt.settings import api_settings
+
+from .hashing import HashingPool, hashing_pool
+
+
+class LoginTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='s3cret-pass')
+        self.admin = User.objects.create_user(
+            username='boss', email='boss@example.com', password='s3cret-pass', is_staff=True, is_superuser=True
+        )
+
+    def login(self, username, password='s3cret-pass'):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': password})
+
+    def test_access_token_carries_profile_claims(self):
+        response = self.login('alice')
+        self.assertEqual(response.status_code, 200)
+        claims = jwt.decode(response.json()['access'], settings.SECRET_KEY, algorithms=['HS256'])
+        self.assertEqual(claims['user_id'], str(self.user.id))
+        self.assertEqual(claims['username'], 'alice')
+        self.assertEqual(claims['email'], 'alice@example.com')
+        self.assertFalse(claims['is_admin'])
+
+        claims = jwt.decode(self.login('boss').json()['access'], settings.SECRET_KEY, algorithms=['HS256'])
+        self.assertTrue(claims['is_admin'])
+
+    def test_refreshed_access_token_keeps_claims(self):
+        from rest_framework_simplejwt.tokens import RefreshToken
+        refresh = RefreshToken(self.login('boss').json()['refresh'])
+        self.assertEqual(refresh.access_token['username'], 'boss')
+        self.assertTrue(refresh.access_token['is_admin'])
+
+    def test_profile_is_served_from_token_without_queries(self):
+        access = self.login('boss').json()['access']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.json(), {
+            'id': self.admin.id, 'username': 'boss', 'email': 'boss@example.com', 'is_admin': True,
+        })
+
+    def test_profile_of_token_without_claims_falls_back_to_database(self):
+        from rest_framework_simplejwt.tokens import AccessToken
+        access = AccessToken.for_user(self.user)
+        response = self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.json()['username'], 'alice')
+        self.assertFalse(response.json()['is_admin'])
+
+
+class UsernameOrEmailLoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='s3cret-pass')
+
+    def login(self, username, password='s3cret-pass'):
+        return self.client.post('/api/auth/login/', {'username': username, 'password': password})
+
+    def test_login_with_username_or_email_hashes_once_in_one_query(self):
+        for identifier in ('alice', 'alice@example.com'):
+            with mock.patch.object(hashing_pool, '_run', side_effect=hashing_pool._run) as run:
+                with self.assertNumQueries(1):
+                    response = self.login(identifier)
+            self.assertEqual(response.status_code, 200, identifier)
+            self.assertEqual(response.json()['user']['username'], 'alice')
+            self.assertEqual(run.call_count, 1)
+
+    def test_backend_hashes_once_in_one_query(self):
+        with mock.patch.object(User, 'check_password', autospec=True, side_effect=User.check_password) as check:
+            with self.assertNumQueries(1):
+                user = authenticate(username='alice@example.com', password='s3cret-pass')
+        self.assertEqual(user, self.user)
+        self.assertEqual(check.call_count, 1)
+
+    def test_wrong_password_or_unknown_user_is_rejected(self):
+        with mock.patch.object(hashing_pool, '_run', side_effect=hashing_pool._run) as run:
+            self.assertEqual(self.login('nobody@example.com').status_code, 401)
+        # Still hashes once, so unknown users take as long as wrong passwords
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(self.login('alice', 'wrong').status_code, 401)
+
+    def test_login_sends_the_auth_signals(self):
+        logged_in, failed = mock.Mock(), mock.Mock()
+        user_logged_in.connect(logged_in)
+        self.addCleanup(user_logged_in.disconnect, logged_in)
+        user_login_failed.connect(failed)
+        self.addCleanup(user_login_failed.disconnect, failed)
+
+        self.assertEqual(self.login('alice', 'wrong').status_code, 401)
+        self.assertEqual(failed.call_args.kwargs['credentials']['username'], 'alice')
+        self.assertNotEqual(failed.call_args.kwargs['credentials']['password'], 'wrong')
+        logged_in.assert_not_called()
+
+        self.assertEqual(self.login('alice').status_code, 200)
+        self.assertEqual(logged_in.call_args.kwargs['user'], self.user)
+
+    def test_last_login_is_recorded_only_if_configured(self):
+        self.assertEqual(self.login('alice').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        with mock.patch.object(api_settings, 'UPDATE_LAST_LOGIN', True):
+            self.assertEqual(self.login('alice').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_session_logins_still_record_last_login(self):
+        self.client.force_login(self.user)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    def test_inactive_user_is_rejected(self):
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        self.assertEqual(self.login('alice').status_code, 401)
+
+    @override_settings(AUTHENTICATION_BACKENDS=[
+        'django.contrib.auth.backends.ModelBackend',
+        'users.backends.UsernameOrEmailBackend',
+    ])
+    def test_login_goes_through_every_backend(self):
+        # ModelBackend only knows usernames; the email still works via ours
+        self.assertEqual(self.login('alice').status_code, 200)
+        self.assertEqual(self.login('alice@example.com').status_code, 200)
+        with mock.patch('django.contrib.auth.backends.ModelBackend.authenticate', return_value=None) as model_backend:
+            self.assertEqual(self.login('alice').status_code, 200)
+        self.assertEqual(model_backend.call_count, 1)
+
+    def test_login_body_must_be_an_object(self):
+        for body in ([{'username': 'alice', 'password': 's3cret-pass'}], 'alice', 42):
+            response = self.client.post('/api/auth/login/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+    def test_username_wins_over_someone_elses_email(self):
+        User.objects.create_user(username='bob', email='alice', password='other-pass')
+        self.assertEqual(self.login('alice').json()['user']['username'], 'alice')
+        self.assertEqual(self.login('alice', 'other-pass').status_code, 401)
+
+    def test_email_is_indexed(self):
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(cursor, User._meta.db_table)
+        self.assertTrue(any(index['columns'] == ['email'] and index['index'] for index in indexes.values()))
+
+
+class HashingPoolTests(TestCase):
+    def test_register_hashes_in_pool_and_inserts_once(self):
+        with self.assertNumQueries(2):
+            # Username uniqueness check, then a single INSERT
+            response = self.client.post('/api/auth/register/', {
+                'username': 'carol', 'email': 'carol@example.com', 'password': 's3cret-pass', 'is_admin': True,
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='carol')
+        self.assertTrue(user.check_password('s3cret-pass'))
+        self.assertTrue(user.is_staff and user.is_superuser)
+
+    def test_full_pool_rejects_with_503(self):
+        User.objects.create_user(username='alice', email='alice@example.com', password='s3cret-pass')
+        with mock.patch.object(hashing_pool, 'pending', hashing_pool.max_pending):
+            response = self.client.post('/api/auth/login/', {'username': 'alice', 'password': 's3cret-pass'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_process_pool_hashes_and_verifies(self):
+        pool = HashingPool(processes=1)
+        self.addCleanup(pool.shutdown)
+
+        async def roundtrip():
+            encoded = await pool.hash_password('s3cret-pass')
+            return encoded, await pool.verify_password('s3cret-pass', encoded), await pool.verify_password('x', encoded)
+
+        encoded, right, wrong = async_to_sync(roundtrip)()
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$'))
+        self.assertEqual(right, (True, None))
+        self.assertEqual(wrong, (False, None))
+        self.assertEqual(pool.pending, 0)
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        user = User.objects.create_user(username='alice', email='alice@example.com', password='s3cret-pass')
+        User.objects.filter(id=user.id).update(password=make_password('s3cret-pass', hasher='pbkdf2_sha1'))
+        response = self.client.post('/api/auth/login/', {'username': 'alice', 'password': 's3cret-pass'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(id=user.id).password.startswith('pbkdf2_sha256$'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersCommandTests(TestCase):
+    def run_import(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as handle:
+            handle.write(content)
+        self.addCleanup(os.unlink, handle.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_users', handle.name, '--processes', '0', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_reports_failures_per_row(self):
+        User.objects.create_user(username='taken', email='taken@example.com', password='x')
+        out, err = self.run_import(
+            "username,email,password,is_admin\n"
+            "ann,ann@example.com,pw-ann,\n"
+            "ann,ann2@example.com,pw,\n"
+            "boss,boss@example.com,pw-boss,true\n"
+            "taken,other@example.com,pw,\n"
+            "bad name,bad@example.com,pw,\n"
+            "nopass,nopass@example.com,,\n",
+            '.csv', '--batch-size', '2',
+        )
+        self.assertIn("Imported 2 users, 4 failed", out)
+        self.assertIn("rows/sec", out)
+        self.assertIn("line 3: duplicate username 'ann' in file", err)
+        self.assertIn("line 5: username 'taken' already exists", err)
+        self.assertIn("line 6:", err)
+        self.assertIn("line 7: username, email and password are required", err)
+
+        self.assertTrue(User.objects.get(username='ann').check_password('pw-ann'))
+        boss = User.objects.get(username='boss')
+        self.assertTrue(boss.is_staff and boss.is_superuser)
+
+    def test_ndjson_import_in_batches(self):
+        lines = [json.dumps({'username': f'u{i}', 'email': f'u{i}@example.com', 'password': 'pw'}) for i in range(25)]
+        lines.insert(3, '[1, 2]')
+        # 26 rows in batches of 10: one existence query and one INSERT per batch
+        with self.assertNumQueries(6 + 3 * 2):
+            out, err = self.run_import("\n".join(lines) + "\n", '.ndjson', '--batch-size', '10')
+        self.assertIn("Imported 25 users, 1 failed", out)
+        self.assertIn("line 4: not a JSON object", err)
+        self.assertEqual(User.objects.filter(username__startswith='u').count(), 25)
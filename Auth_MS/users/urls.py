@@ -1,8 +1,8 @@
 from django.urls import path
-from .views import RegisterView, ProfileView, LoginView
+from .views import ProfileView, login, register
 
 urlpatterns = [
-    path("register/", RegisterView.as_view()),
-    path("login/", LoginView.as_view()),
+    path("register/", register),
+    path("login/", login),
     path("me/", ProfileView.as_view()),
 ]
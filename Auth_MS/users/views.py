@@ -1,24 +1,132 @@
-from rest_framework import generics, permissions
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from rest_framework import generics, permissions, status
 from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.http import JsonResponse
+from .backends import aauthenticate
+from .hashing import HashingOverloaded, hashing_pool
 from .serializers import RegisterSerializer, LoginSerializer
 from rest_framework.response import Response
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST
+
+
+def _overloaded():
+    response = JsonResponse(
+        {"detail": "Too many logins in progress, try again shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE
+    )
+    response["Retry-After"] = "1"
+    return response
+
+
+def _async_post_view(view):
+    """Plain async POST endpoint: 405 for other methods, no CSRF (token auth only)."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != "POST":
+            return JsonResponse(
+                {"detail": f'Method "{request.method}" not allowed.'},
+                status=status.HTTP_405_METHOD_NOT_ALLOWED
+            )
+        try:
+            request.data = _request_data(request)
+        except ValueError:
+            return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+        return await view(request, *args, **kwargs)
+
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+# Login and register are async so the password hash runs in the hashing pool
+# while the event loop keeps serving everything else (see users/hashing.py)
+@_async_post_view
+async def register(request):
+    serializer = RegisterSerializer(data=request.data)
+    # Uniqueness checks query the database
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        password_hash = await hashing_pool.hash_password(serializer.validated_data["password"])
+    except HashingOverloaded:
+        return _overloaded()
 
-class RegisterView(generics.CreateAPIView):
-    queryset = User.objects.all()
-    serializer_class = RegisterSerializer
+    await sync_to_async(serializer.save)(password_hash=password_hash)
+    return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@_async_post_view
+async def login(request):
+    # A JSON body may be a list or a scalar
+    if not isinstance(request.data, dict):
+        return JsonResponse(
+            {"detail": "Expected an object with username and password"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    username_or_email = request.data.get("username")
+    password = request.data.get("password")
+    if not username_or_email or not password:
+        return JsonResponse(
+            {"detail": "username and password are required"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # UsernameOrEmailBackend hashes in the hashing pool: one query, one hash
+    try:
+        user = await aauthenticate(request, username=username_or_email, password=password)
+    except HashingOverloaded:
+        return _overloaded()
+    if user is None:
+        return JsonResponse(
+            {"detail": "No active account found with the given credentials"},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+    # No last_login UPDATE unless SIMPLE_JWT's UPDATE_LAST_LOGIN (see users/signals.py)
+    request.token_login = True
+    await sync_to_async(user_logged_in.send)(sender=user.__class__, request=request, user=user)
+
+    refresh = LoginSerializer.get_token(user)
+    return JsonResponse({
+        "refresh": str(refresh),
+        "access": str(refresh.access_token),
+        "user": {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "is_admin": user.is_staff or user.is_superuser,  # Check if user is admin
+        },
+    }, status=status.HTTP_200_OK)
 
 
 class ProfileView(generics.RetrieveAPIView):
+    # The profile is read from the token's claims, not the users table
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request):
-        user = request.user
+        token = request.user.token
+        if "username" not in token:
+            # Issued before tokens carried the profile claims
+            user = User.objects.get(id=request.user.id)
+            return Response({
+                "id": user.id,
+                "username": user.username,
+                "email": user.email,
+                "is_admin": user.is_staff or user.is_superuser,
+            })
         return Response({
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
+            "id": int(request.user.id),
+            "username": token["username"],
+            "email": token.get("email", ""),
+            "is_admin": token.get("is_admin", False),
         })
-
-class LoginView(TokenObtainPairView):
-    serializer_class = LoginSerializer
\ No newline at end of file
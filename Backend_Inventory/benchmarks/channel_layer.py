@@ -0,0 +1,124 @@
+"""Throughput and delivery latency of LocalBrokerChannelLayer across processes.
+
+Starts ``--receivers`` processes that each join a group with ``--sockets``
+channels (standing in for the admin sockets of one daphne process), then
+group_sends ``--messages`` messages from this process and reports the
+delivered messages/sec and the send-to-receive latency percentiles as JSON.
+
+    python benchmarks/channel_layer.py --receivers 4 --messages 20000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory.channel_layer import LocalBrokerChannelLayer  # noqa: E402
+
+GROUP = "admin_orders"
+
+
+def _percentile(values, percent):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def _receive(path, sockets, expected, ready, results):
+    layer = LocalBrokerChannelLayer(path=path, capacity=expected + 1)
+    channels = [await layer.new_channel() for _ in range(sockets)]
+    for channel in channels:
+        await layer.group_add(GROUP, channel)
+    ready.set()
+
+    async def drain(channel):
+        latencies = []
+        for _ in range(expected):
+            message = await layer.receive(channel)
+            latencies.append(time.time() - message["sent"])
+        return latencies
+
+    per_channel = await asyncio.gather(*(drain(channel) for channel in channels))
+    results.put([latency for latencies in per_channel for latency in latencies])
+
+
+def receiver(path, sockets, expected, ready, results):
+    asyncio.run(_receive(path, sockets, expected, ready, results))
+
+
+async def _send(layer, messages, rate):
+    interval = 1 / rate if rate else 0
+    started = time.perf_counter()
+    for number in range(messages):
+        await layer.group_send(GROUP, {"type": "order_update", "number": number, "sent": time.time()})
+        if interval:
+            # Pace the sender so latency isn't measured on a backlog
+            delay = started + (number + 1) * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--receivers", type=int, default=4, help="receiving processes")
+    parser.add_argument("--sockets", type=int, default=1, help="group members per receiving process")
+    parser.add_argument("--messages", type=int, default=10000, help="messages to group_send")
+    parser.add_argument("--rate", type=float, default=0, help="messages/sec to send at (0: as fast as possible)")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench-channels.sock")
+    # This process starts the broker, as the first web process would
+    layer = LocalBrokerChannelLayer(path=path)
+    asyncio.run(layer.new_channel())
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = []
+    for _ in range(args.receivers):
+        ready = context.Event()
+        process = context.Process(
+            target=receiver, args=(path, args.sockets, args.messages, ready, results), daemon=True
+        )
+        process.start()
+        if not ready.wait(30):
+            raise SystemExit("receiver didn't start")
+        workers.append(process)
+
+    started = time.perf_counter()
+    asyncio.run(_send(layer, args.messages, args.rate))
+    latencies = []
+    for _ in workers:
+        latencies.extend(results.get(timeout=300))
+    elapsed = time.perf_counter() - started
+    for process in workers:
+        process.join()
+
+    latencies_ms = [latency * 1000 for latency in latencies]
+    print(json.dumps({
+        "receivers": args.receivers,
+        "sockets_per_receiver": args.sockets,
+        "messages_sent": args.messages,
+        "messages_delivered": len(latencies),
+        "elapsed_seconds": round(elapsed, 3),
+        "sent_per_second": round(args.messages / elapsed, 1),
+        "delivered_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies_ms), 3),
+            "p50": round(_percentile(latencies_ms, 50), 3),
+            "p95": round(_percentile(latencies_ms, 95), 3),
+            "p99": round(_percentile(latencies_ms, 99), 3),
+            "max": round(max(latencies_ms), 3),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""End-to-end load test of the order flow through the ASGI app, HTTP and WebSockets.
+
+Boots ``inventory_proj.asgi.application`` in this process against a
+throwaway SQLite database and the in-memory channel layer, with the order
+workers running in this process too. ``--users`` clients each loop
+``--iterations`` times through login, product search, save_order (a cart of
+``--items`` items), accept_order for every order of the cart (as an admin)
+and waiting for the worker to mark the orders Processed. Every user has
+``--user-listeners`` sockets on ws/orders/<user>/ and there are
+``--admin-listeners`` sockets on ws/admin/orders/.
+
+Prints one JSON object: throughput, latency percentiles per step (ms), the
+statuses returned by each endpoint and the notification lag (ms) from
+group_send to the socket receiving the frame, so runs on different commits
+can be compared.
+
+Login goes to the auth service when ``--auth-url`` is given (it must be
+running; users are registered on first use). Otherwise tokens are signed
+here with the claims the auth service issues, and no login time is reported.
+
+    python benchmarks/end_to_end.py --users 20 --iterations 5 --admin-listeners 10
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "inventory_proj.settings")
+os.environ["INVENTORY_DB"] = "sqlite"
+os.environ["ORDER_CONSUMER_IN_PROCESS"] = "0"
+# Caches of its own, not the ones of the servers on this host
+CACHE_DIR = tempfile.mkdtemp(prefix="inventory-bench-cache-")
+os.environ["ORDER_LIST_CACHE_DIR"] = os.path.join(CACHE_DIR, "orders")
+os.environ["PRODUCT_CATALOG_CACHE_DIR"] = os.path.join(CACHE_DIR, "catalog")
+
+import django  # noqa: E402
+
+django.setup()
+
+import jwt  # noqa: E402
+from asgiref.sync import sync_to_async  # noqa: E402
+from channels.layers import get_channel_layer  # noqa: E402
+from channels.testing import HttpCommunicator, WebsocketCommunicator  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.backends.sqlite3.base import DatabaseWrapper  # noqa: E402
+
+# Before anything asks for the channel layer
+settings.CHANNEL_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {"capacity": 100000},
+    }
+}
+
+
+@contextlib.contextmanager
+def _immediate_transactions():
+    """Take SQLite's write lock when a transaction starts (Django 5.1's transaction_mode="IMMEDIATE").
+
+    A deferred transaction that reads and then writes fails with "database
+    is locked" at once when another connection is writing, instead of
+    waiting for it like MySQL would.
+    """
+    def begin_immediate(self):
+        self.cursor().execute("BEGIN IMMEDIATE")
+
+    original = DatabaseWrapper._start_transaction_under_autocommit
+    DatabaseWrapper._start_transaction_under_autocommit = begin_immediate
+    try:
+        yield
+    finally:
+        DatabaseWrapper._start_transaction_under_autocommit = original
+
+from inventory.consumer import ConsumeOrders  # noqa: E402
+from inventory.models import Product  # noqa: E402
+from inventory_proj.asgi import application  # noqa: E402
+
+PASSWORD = "bench-pass-123"
+TIMEOUT = 60
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def at(percent):
+        return round(values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))], 2)
+
+    return {"count": len(values), "mean": round(statistics.fmean(values), 2), "p50": at(50), "p95": at(95), "p99": at(99)}
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _mint_token(user_id, username, is_admin=False):
+    # The claims LoginSerializer.get_token puts in an access token
+    now = int(time.time())
+    claims = {
+        "token_type": "access", "exp": now + 3600, "iat": now, "jti": uuid.uuid4().hex,
+        "user_id": user_id, "username": username, "email": f"{username}@example.com", "is_admin": is_admin,
+    }
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm="HS256")
+
+
+def _auth_post(url, data):
+    request = urllib.request.Request(
+        url, data=json.dumps(data).encode(), headers={"Content-Type": "application/json"}, method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.lag = {"user": [], "admin": []}
+
+    def record(self, step, started, status=None):
+        self.latencies.setdefault(step, []).append((time.perf_counter() - started) * 1000)
+        if status is not None:
+            counts = self.statuses.setdefault(step, {})
+            counts[status] = counts.get(status, 0) + 1
+
+
+def stamp_group_sends(channel_layer):
+    """Add the time of each group_send to the order messages it carries.
+
+    The socket consumers forward ``message`` / ``messages`` as they are, so
+    listeners can tell how long a notification took to reach them.
+    """
+    group_send = channel_layer.group_send
+
+    async def stamped(group, message):
+        sent_at = time.perf_counter()
+        message = dict(message)
+        if "message" in message:
+            message["message"] = {**message["message"], "sent_at": sent_at}
+        if "messages" in message:
+            message["messages"] = [{**item, "sent_at": sent_at} for item in message["messages"]]
+        await group_send(group, message)
+
+    channel_layer.group_send = stamped
+
+
+class Flow:
+    def __init__(self, args, recorder, products):
+        self.args = args
+        self.recorder = recorder
+        self.admin_token = _mint_token(1_000_000, "bench_admin", is_admin=True)
+        # order id -> future set when a user socket sees the order Processed
+        self.processed = {}
+        self.products = products
+
+    async def request(self, step, method, path, token, body=None):
+        headers = [(b"host", b"localhost"), (b"authorization", f"Bearer {token}".encode())]
+        if body is not None:
+            headers.append((b"content-type", b"application/json"))
+        communicator = HttpCommunicator(
+            application, method, path, body=json.dumps(body).encode() if body is not None else b"", headers=headers,
+        )
+        started = time.perf_counter()
+        response = await communicator.get_response(timeout=TIMEOUT)
+        self.recorder.record(step, started, response["status"])
+        return response["status"], json.loads(response["body"]) if response["body"] else None
+
+    async def login(self, number):
+        username = f"bench_user{number}"
+        if not self.args.auth_url:
+            return _mint_token(number + 1, username)
+        base = self.args.auth_url.rstrip("/")
+        await asyncio.to_thread(_auth_post, f"{base}/api/auth/register/",
+                                {"username": username, "email": f"{username}@example.com", "password": PASSWORD})
+        started = time.perf_counter()
+        status, data = await asyncio.to_thread(_auth_post, f"{base}/api/auth/login/",
+                                               {"username": username, "password": PASSWORD})
+        self.recorder.record("login", started, status)
+        if status != 200:
+            raise RuntimeError(f"login failed for {username}: {status}")
+        return data["access"]
+
+    async def listen(self, path, kind):
+        """Record the lag of every notification on one socket, until cancelled."""
+        communicator = WebsocketCommunicator(application, path)
+        connected, _ = await communicator.connect(timeout=TIMEOUT)
+        if not connected:
+            raise RuntimeError(f"WebSocket {path} refused")
+        try:
+            while True:
+                # A receive that times out tears the socket down, so wait as long as it takes
+                frame = await communicator.receive_json_from(timeout=24 * 3600)
+                received = time.perf_counter()
+                items = frame["data"] if isinstance(frame["data"], list) else [frame["data"]]
+                for item in items:
+                    self.recorder.lag[kind].append((received - item["sent_at"]) * 1000)
+                    if kind == "user" and item["status"] == "Processed":
+                        waiter = self.processed.get(item["order_id"])
+                        if waiter is not None and not waiter.done():
+                            waiter.set_result(received)
+        finally:
+            await communicator.disconnect()
+
+    async def client(self, number, rng):
+        token = await self.login(number)
+        loop = asyncio.get_running_loop()
+        for _ in range(self.args.iterations):
+            name = rng.choice(self.products)
+            await self.request("search", "GET", f"/api/products/search/?search={name[:3]}", token)
+
+            cart = [{"item_id": rng.randrange(1, 1000), "item_name": name, "item_quantity": 1}
+                    for _ in range(self.args.items)]
+            started = time.perf_counter()
+            status, data = await self.request("save_order", "POST", "/api/orders/", token, cart)
+            if status != 201:
+                continue
+            waiters = []
+            for order_id in data["order_ids"]:
+                # Before the accept: the worker may finish the order before the response is back
+                waiter = self.processed.setdefault(order_id, loop.create_future())
+                status, _ = await self.request("accept_order", "POST", f"/api/admin/orders/{order_id}/accept/", self.admin_token)
+                if status == 200:
+                    waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.gather(*waiters), TIMEOUT)
+                self.recorder.record("order_to_processed", started)
+            except asyncio.TimeoutError:
+                self.recorder.statuses.setdefault("order_to_processed", {}).setdefault("timeout", 0)
+                self.recorder.statuses["order_to_processed"]["timeout"] += 1
+
+
+async def run_workers(consumer, channel_layer, stop):
+    async def work(index):
+        worker_id = f"{consumer.worker_id}-{index}"
+        # In executor threads, whose group_sends run back on this event loop
+        process_next = sync_to_async(consumer.process_next, thread_sensitive=False)
+        while not stop.is_set():
+            if await process_next(channel_layer, worker_id) is None:
+                await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(work(index) for index in range(consumer.concurrency)))
+
+
+async def run(args, products):
+    recorder = Recorder()
+    channel_layer = get_channel_layer()
+    stamp_group_sends(channel_layer)
+    flow = Flow(args, recorder, products)
+
+    listeners = [
+        asyncio.create_task(flow.listen(f"/ws/orders/bench_user{number}/", "user"))
+        for number in range(args.users) for _ in range(args.user_listeners)
+    ]
+    listeners += [
+        asyncio.create_task(flow.listen("/ws/admin/orders/", "admin"))
+        for _ in range(args.admin_listeners)
+    ]
+    # Let every socket join its group before the first order goes out
+    await asyncio.sleep(0.5)
+
+    consumer = ConsumeOrders(concurrency=args.workers)
+    consumer.thread_sleep_time = args.processing_time
+    stop_workers = asyncio.Event()
+    workers = asyncio.create_task(run_workers(consumer, channel_layer, stop_workers))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(flow.client(number, random.Random(args.seed + number)) for number in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    stop_workers.set()
+    await workers
+    # Let the last notifications reach the admin sockets
+    await asyncio.sleep(0.5)
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+    return recorder, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=10, help="concurrent clients, one user each")
+    parser.add_argument("--iterations", type=int, default=5, help="carts per client")
+    parser.add_argument("--items", type=int, default=3, help="orders per cart")
+    parser.add_argument("--user-listeners", type=int, default=1, help="sockets per user on ws/orders/<user>/")
+    parser.add_argument("--admin-listeners", type=int, default=5, help="sockets on ws/admin/orders/")
+    parser.add_argument("--workers", type=int, default=4, help="order worker threads")
+    parser.add_argument("--processing-time", type=float, default=0.0, help="simulated seconds per order")
+    parser.add_argument("--products", type=int, default=1000, help="products in the search index")
+    parser.add_argument("--auth-url", default=None, help="auth service to log in against, e.g. http://localhost:8000")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        rng = random.Random(args.seed)
+        products = [f"{rng.choice(['apple', 'banana', 'cherry', 'grape', 'melon'])} {number}"
+                    for number in range(args.products)]
+        Product.objects.bulk_create(Product(name=name) for name in products)
+        with _immediate_transactions():
+            recorder, elapsed = asyncio.run(run(args, products))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+
+    completed = len(recorder.latencies.get("order_to_processed", []))
+    requests = sum(sum(counts.values()) for step, counts in recorder.statuses.items() if step != "order_to_processed")
+    print(json.dumps({
+        "commit": _commit(),
+        "config": {key: value for key, value in vars(args).items()},
+        "login": "auth service" if args.auth_url else "tokens signed locally",
+        "elapsed_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "carts_per_second": round(completed / elapsed, 2),
+        "orders_per_second": round(completed * args.items / elapsed, 2),
+        "statuses": recorder.statuses,
+        "latency_ms": {step: _percentiles(values) for step, values in recorder.latencies.items()},
+        "notification_lag_ms": {kind: _percentiles(values) for kind, values in recorder.lag.items()},
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""OrderItemSerializer versus the values_list() fast path for order listings.
+
+Fills a throwaway SQLite database with orders, then for each row count
+times fetching + serializing + rendering a listing both ways and prints the
+results as JSON (best of ``--repeat`` runs, in milliseconds).
+
+    python benchmarks/serialization.py --rows 1000,10000,100000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "inventory_proj.settings")
+os.environ["INVENTORY_DB"] = "sqlite"
+os.environ["ORDER_CONSUMER_IN_PROCESS"] = "0"
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.http import JsonResponse  # noqa: E402
+
+from inventory.models import Order  # noqa: E402
+from inventory.rendering import FastJsonResponse, orjson  # noqa: E402
+from inventory.serializers import ORDER_LIST_FIELDS, OrderItemSerializer, order_list_data  # noqa: E402
+
+
+def serializer_listing(queryset, rows):
+    orders = list(queryset[:rows])
+    started = time.perf_counter()
+    data = OrderItemSerializer(orders, many=True).data
+    serialized = time.perf_counter()
+    response = JsonResponse({"orders": data, "next_cursor": None})
+    return serialized - started, time.perf_counter() - serialized, response.content
+
+
+def fast_listing(queryset, rows):
+    orders = list(queryset.values_list(*ORDER_LIST_FIELDS)[:rows])
+    started = time.perf_counter()
+    data = order_list_data(orders)
+    serialized = time.perf_counter()
+    response = FastJsonResponse({"orders": data, "next_cursor": None})
+    return serialized - started, time.perf_counter() - serialized, response.content
+
+
+def measure(listing, queryset, rows, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        serialize, render, content = listing(queryset, rows)
+        total = time.perf_counter() - started
+        if best is None or total < best["total_ms"] / 1000:
+            best = {
+                "total_ms": round(total * 1000, 2),
+                "query_ms": round((total - serialize - render) * 1000, 2),
+                "serialize_ms": round(serialize * 1000, 2),
+                "render_ms": round(render * 1000, 2),
+                "bytes": len(content),
+            }
+    return best, content
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", default="1000,10000,100000", help="comma-separated listing sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+    sizes = [int(value) for value in args.rows.split(",")]
+
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        run(sizes, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def run(sizes, repeat):
+    Order.objects.bulk_create(
+        [
+            Order(user_id=index % 50, username=f"user{index % 50}", item_id=index % 500,
+                  item_name=f"item {index % 500}", item_quantity=1 + index % 5, status="Pending")
+            for index in range(max(sizes))
+        ],
+        batch_size=5000,
+    )
+    queryset = Order.objects.order_by("-created_on", "-id")
+
+    for rows in sizes:
+        current, current_content = measure(serializer_listing, queryset, rows, repeat)
+        fast, fast_content = measure(fast_listing, queryset, rows, repeat)
+        print(json.dumps({
+            "rows": rows,
+            "json_renderer": "orjson" if orjson is not None else "json",
+            "same_output": json.loads(current_content) == json.loads(fast_content),
+            "serializer": current,
+            "fast_path": fast,
+            "speedup": round(current["total_ms"] / fast["total_ms"], 2),
+        }))
+
+
+if __name__ == "__main__":
+    main()
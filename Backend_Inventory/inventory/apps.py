@@ -1,20 +1,46 @@
 # apps.py
-from django.apps import AppConfig
+import logging
 import threading
+from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+_consumer_lock = threading.Lock()
+_consumer_started = False
+
+
+def start_order_consumer():
+    """Start this process's order consumer threads, if ORDER_CONSUMER_IN_PROCESS.
+
+    Called by the server entry points, inventory_proj/asgi.py and wsgi.py
+    (which runserver loads as well), not when the app registry is ready, so
+    management commands, test runs and scripts calling ``django.setup()``
+    never claim orders. Does nothing if the consumer already started.
+    """
+    global _consumer_started
+    if not getattr(settings, 'ORDER_CONSUMER_IN_PROCESS', True):
+        return
+    from .consumer import order_consumer
+
+    with _consumer_lock:
+        if _consumer_started:
+            return
+        _consumer_started = True
+    order_consumer.start()
+    logger.info("Order consumer threads started")
+
 
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
 
     def ready(self):
-        # Start the order consumer when Django starts
-        from .consumer import order_consumer
-        
-        if not hasattr(self, '_consumer_started'):
-            self._consumer_started = True
-            consumer_thread = threading.Thread(
-                target=order_consumer.consume_orders,
-                daemon=True
-            )
-            consumer_thread.start()
-            print("Order consumer thread started")
\ No newline at end of file
+        # Keep the product search index in sync with the catalog
+        from . import signals  # noqa: F401
+
+        # Count every connection's queries against the request being served
+        from django.db.backends.signals import connection_created
+        from .instrumentation import install_query_recorder
+        connection_created.connect(install_query_recorder)
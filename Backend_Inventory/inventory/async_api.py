@@ -0,0 +1,58 @@
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from rest_framework import exceptions, status
+
+from inventory.authentication import JWTAuthenticationWithoutUserDB
+
+
+def async_api_view(methods, admin=False):
+    """Turn an ``async def`` view into a JWT-authenticated JSON API endpoint.
+
+    Counterpart of DRF's ``@api_view`` + ``JWTAuthenticationWithoutUserDB`` +
+    ``IsAuthenticated`` for native async views, which DRF can't run: Django
+    awaits the view directly on the event loop instead of handing it to a
+    worker thread. ``request.user`` is the token's user and ``request.data``
+    the parsed JSON (or form) body. Views return ``JsonResponse``.
+
+    With ``admin=True`` only tokens carrying the ``is_admin`` claim get in.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+
+            try:
+                auth = JWTAuthenticationWithoutUserDB().authenticate(request)
+            except exceptions.AuthenticationFailed as e:
+                return JsonResponse({"detail": str(e.detail)}, status=status.HTTP_401_UNAUTHORIZED)
+            if auth is None:
+                return JsonResponse(
+                    {"detail": "Authentication credentials were not provided."},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            request.user = auth[0]
+            if admin and not request.user.is_admin:
+                return JsonResponse(
+                    {"detail": "You do not have permission to perform this action."},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+            request.data = request.POST
+            if request.content_type == 'application/json' and request.body:
+                try:
+                    request.data = json.loads(request.body)
+                except ValueError:
+                    return JsonResponse({"detail": "JSON parse error"}, status=status.HTTP_400_BAD_REQUEST)
+
+            return await view(request, *args, **kwargs)
+
+        # Token auth, no session cookies, so no CSRF check (same as DRF)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
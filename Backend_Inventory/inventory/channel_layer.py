@@ -0,0 +1,573 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import uuid
+from collections import deque
+
+from asyncio import CancelledError, get_running_loop, wait_for
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+from django.core.exceptions import ImproperlyConfigured
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('!I')
+
+# Writer thread commands, queued with the outgoing frames
+_STOP = object()
+_RECONNECT = object()
+
+
+def _encode_frame(payload):
+    data = json.dumps(payload, separators=(',', ':')).encode()
+    return _HEADER.pack(len(data)) + data
+
+
+def _send_frame(sock, payload):
+    sock.sendall(_encode_frame(payload))
+
+
+def _recv_exactly(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def _recv_frame(sock):
+    (size,) = _HEADER.unpack(_recv_exactly(sock, _HEADER.size))
+    return json.loads(_recv_exactly(sock, size))
+
+
+def _owner(channel):
+    """Prefix of the process that owns a channel ("<prefix>!<name>")."""
+    return channel.split('!', 1)[0]
+
+
+class ChannelBroker:
+    """Routes channel layer messages between the processes on one host.
+
+    Listens on a Unix domain socket. Every process using
+    ``LocalBrokerChannelLayer`` keeps one connection to it, announcing the
+    prefix of the channel names it owns. The broker keeps group membership
+    and forwards each ``group_send`` once to every process with members in
+    the group, listing the member channels. Memberships expire after
+    ``group_expiry`` seconds unless re-added, and are dropped as soon as the
+    owning process disconnects.
+
+    Each client has its own writer thread, fed from a queue of at most
+    ``max_pending`` frames, so a process that's slow to read holds up only
+    its own deliveries. Deliveries beyond that are dropped for it, as a
+    full channel drops ``group_send`` messages.
+    """
+
+    def __init__(self, path, group_expiry=86400, max_pending=1000):
+        self.path = path
+        self.group_expiry = group_expiry
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._groups = {}
+        self._conns = set()
+        self._server = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen(128)
+        threading.Thread(target=self._accept, name="channel-broker", daemon=True).start()
+
+    def stop(self):
+        """Stop listening and disconnect every client; they reconnect to the next broker."""
+        try:
+            # Wakes up the thread blocked in accept()
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        with self._lock:
+            conns = list(self._conns)
+        for conn in conns:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._conns.add(conn)
+            threading.Thread(target=self._serve, args=(conn,), name="channel-broker-client", daemon=True).start()
+
+    def _serve(self, conn):
+        prefix = None
+        client = _BrokerClient(conn, self.max_pending)
+        try:
+            while True:
+                frame = _recv_frame(conn)
+                op = frame['op']
+                if op == 'hello':
+                    prefix = frame['prefix']
+                    with self._lock:
+                        self._clients[prefix] = client
+                elif op == 'group_add':
+                    with self._lock:
+                        members = self._groups.setdefault(frame['group'], {})
+                        members[frame['channel']] = time.monotonic() + self.group_expiry
+                elif op == 'group_discard':
+                    with self._lock:
+                        members = self._groups.get(frame['group'], {})
+                        members.pop(frame['channel'], None)
+                        if not members:
+                            self._groups.pop(frame['group'], None)
+                elif op == 'group_send':
+                    self._group_send(frame['group'], frame['message'])
+                elif op == 'send':
+                    self._forward(_owner(frame['channel']), [frame['channel']], frame['message'])
+                elif op == 'flush':
+                    with self._lock:
+                        self._groups.clear()
+                if 'ack' in frame:
+                    client.reply({'op': 'ack', 'id': frame['ack']})
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            client.close()
+            with self._lock:
+                self._conns.discard(conn)
+            if prefix is not None:
+                self._disconnect(prefix, client)
+
+    def _disconnect(self, prefix, client):
+        with self._lock:
+            if self._clients.get(prefix) is client:
+                del self._clients[prefix]
+            for group in list(self._groups):
+                members = self._groups[group]
+                for channel in [c for c in members if _owner(c) == prefix]:
+                    del members[channel]
+                if not members:
+                    del self._groups[group]
+
+    def _group_send(self, group, message):
+        now = time.monotonic()
+        by_owner = {}
+        with self._lock:
+            members = self._groups.get(group, {})
+            for channel, expires in list(members.items()):
+                if expires < now:
+                    del members[channel]
+                else:
+                    by_owner.setdefault(_owner(channel), []).append(channel)
+        for prefix, channels in by_owner.items():
+            self._forward(prefix, channels, message)
+
+    def _forward(self, prefix, channels, message):
+        with self._lock:
+            client = self._clients.get(prefix)
+        if client is not None:
+            client.deliver({'op': 'deliver', 'channels': channels, 'message': message})
+
+
+class _BrokerClient:
+    """The broker's side of one client connection: a bounded outbox and the thread writing it."""
+
+    def __init__(self, conn, max_pending):
+        self.conn = conn
+        self._outbox = queue.Queue(max_pending)
+        self._dropped = 0
+        self._writer = threading.Thread(target=self._write, name="channel-broker-writer", daemon=True)
+        self._writer.start()
+
+    def deliver(self, frame):
+        """Queue a delivery, or drop it if the client is that far behind."""
+        try:
+            self._outbox.put_nowait(_encode_frame(frame))
+        except queue.Full:
+            self._dropped += 1
+            # Once per overflow, not for every dropped message
+            if self._dropped == 1:
+                logger.warning("Channel broker client too slow to read, dropping its messages")
+        else:
+            self._dropped = 0
+
+    def reply(self, frame):
+        """Queue a reply to the client's own request; waits for room rather than dropping it."""
+        self._outbox.put(_encode_frame(frame))
+
+    def close(self):
+        """Stop the writer once it has sent what's queued, then close the connection."""
+        self._outbox.put(_STOP)
+        self._writer.join()
+        self.conn.close()
+
+    def _write(self):
+        failed = False
+        while True:
+            data = self._outbox.get()
+            if data is _STOP:
+                return
+            if failed:
+                # Keep draining, so nobody waits on a full outbox
+                continue
+            try:
+                self.conn.sendall(data)
+            except OSError:
+                failed = True
+                try:
+                    # Also ends the client's reading thread
+                    self.conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+
+class LocalBrokerChannelLayer(BaseChannelLayer):
+    """Channel layer shared by all processes on one host, with no extra service.
+
+    Processes talk through a ``ChannelBroker`` on a Unix domain socket. The
+    broker isn't a separate deployment: the first process that finds no
+    broker listening starts one in a background thread (a file lock decides
+    who, if several try at once). If that process exits, the others reconnect,
+    one of them takes over, and every process re-registers its groups.
+
+    All socket I/O happens in two threads per layer: a writer that connects
+    (starting the broker if need be) and sends queued frames, and a reader
+    for each connection. The async API only queues frames, so it never
+    blocks the event loop.
+
+    Messages must be JSON-serializable. Channel queues hold at most
+    ``capacity`` messages: ``send`` raises ``ChannelFull`` beyond that and
+    ``group_send`` drops the message for that channel, like the other
+    channel layers. Undelivered messages expire after ``expiry`` seconds.
+    """
+
+    extensions = ["groups", "flush"]
+
+    def __init__(self, expiry=60, capacity=100, channel_capacity=None, **config):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        path = config.pop('path', None)
+        if not path:
+            raise ImproperlyConfigured("LocalBrokerChannelLayer needs the 'path' of the broker socket in its CONFIG")
+        self.path = str(path)
+        self.group_expiry = config.pop('group_expiry', 86400)
+        if config:
+            logger.warning("Ignoring unknown LocalBrokerChannelLayer options: %s", ", ".join(sorted(config)))
+        self.prefix = f"local.{os.getpid()}.{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._waiters = {}
+        self._groups = {}
+        self._acks = {}
+        self._ack_ids = iter(range(1, 2 ** 62))
+        self._next_sweep = 0.0
+        # Set while the broker has this process's hello
+        self._registered = threading.Event()
+        self._writer = None
+        self._outbox = None
+        self._broker = None
+
+    # Connection to the broker (writer and reader threads only)
+
+    def _send(self, frame):
+        """Queue a frame for the broker. Starts the writer thread on first use."""
+        with self._lock:
+            if self._writer is None:
+                self._outbox = queue.SimpleQueue()
+                self._writer = threading.Thread(
+                    target=self._write, args=(self._outbox,), name="channel-layer-writer", daemon=True,
+                )
+                self._writer.start()
+            outbox = self._outbox
+        outbox.put(frame)
+
+    def _write(self, outbox):
+        sock = reader = None
+        held = None
+        while True:
+            item, held = held or outbox.get(), None
+            if item is _STOP:
+                break
+            if isinstance(item, tuple):
+                # The reader lost the connection: reconnect even with nothing to
+                # send, so this process gets its group messages again
+                if item[1] is not sock:
+                    continue
+                self._disconnect(sock, reader)
+                sock = reader = None
+                try:
+                    sock, reader = self._open(outbox)
+                except OSError:
+                    logger.warning("Channel broker at %s unavailable, retrying", self.path)
+                    time.sleep(0.1)
+                    outbox.put((_RECONNECT, None))
+                continue
+            # Frames queued meanwhile go out in the same write
+            frames = [item]
+            while len(frames) < 512:
+                try:
+                    item = outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if not isinstance(item, dict):
+                    held = item
+                    break
+                frames.append(item)
+            data = b''.join(_encode_frame(frame) for frame in frames)
+            for attempt in range(2):
+                try:
+                    if sock is None:
+                        sock, reader = self._open(outbox)
+                    sock.sendall(data)
+                    break
+                except OSError:
+                    self._disconnect(sock, reader)
+                    sock = reader = None
+                    if attempt:
+                        logger.warning("Dropped %d frames: channel broker at %s unavailable", len(frames), self.path)
+        self._disconnect(sock, reader)
+        if self._broker is not None:
+            broker, lock_file = self._broker
+            self._broker = None
+            broker.stop()
+            # Unlocked only once the socket is gone, so the next broker can't lose its socket to us
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _open(self, outbox):
+        """Connect, announce this process and its groups, and start a reader for the connection."""
+        sock = self._connect()
+        try:
+            _send_frame(sock, {'op': 'hello', 'prefix': self.prefix})
+            now = time.monotonic()
+            with self._lock:
+                groups = [key for key, expires in self._groups.items() if expires > now]
+            for group, channel in groups:
+                _send_frame(sock, {'op': 'group_add', 'group': group, 'channel': channel})
+        except OSError:
+            sock.close()
+            raise
+        self._registered.set()
+        reader = threading.Thread(target=self._read, args=(sock, outbox), name="channel-layer-reader", daemon=True)
+        reader.start()
+        return sock, reader
+
+    def _disconnect(self, sock, reader):
+        self._registered.clear()
+        if sock is None:
+            return
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        reader.join()
+        sock.close()
+
+    def _connect(self, attempts=50):
+        for _ in range(attempts):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if not self._start_broker():
+                    time.sleep(0.05)
+        raise ConnectionError(f"No channel broker at {self.path}")
+
+    def _start_broker(self):
+        """Become the broker if no other process is doing so. Returns True if we did."""
+        if self._broker is not None:
+            return False
+        lock_file = open(self.path + '.lock', 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        # The lock stays held (file left open) until close() stops the broker
+        broker = ChannelBroker(self.path, group_expiry=self.group_expiry)
+        broker.start()
+        self._broker = (broker, lock_file)
+        return True
+
+    def _read(self, sock, outbox):
+        try:
+            while True:
+                frame = _recv_frame(sock)
+                if frame.get('op') == 'deliver':
+                    for channel in frame['channels']:
+                        self._deliver(channel, frame['message'], drop_if_full=True)
+                elif frame.get('op') == 'ack':
+                    with self._lock:
+                        waiter = self._acks.pop(frame['id'], None)
+                    if waiter is not None:
+                        loop, future = waiter
+                        try:
+                            loop.call_soon_threadsafe(_wake, future)
+                        except RuntimeError:
+                            pass
+        except (ConnectionError, OSError, ValueError):
+            outbox.put((_RECONNECT, sock))
+
+    async def _request(self, frame, timeout=5):
+        """Send a frame and wait until the broker has applied it.
+
+        Group changes are acknowledged so that, as with other channel layers,
+        a group_send issued after ``await group_add(...)`` returns - from any
+        process - reaches the new member.
+        """
+        future = get_running_loop().create_future()
+        with self._lock:
+            ack = next(self._ack_ids)
+            self._acks[ack] = (get_running_loop(), future)
+        try:
+            self._send(dict(frame, ack=ack))
+            await wait_for(future, timeout)
+        finally:
+            with self._lock:
+                self._acks.pop(ack, None)
+
+    # Local channel queues
+
+    def _deliver(self, channel, message, drop_if_full=False):
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            queue = self._channels.setdefault(channel, deque())
+            if len(queue) >= self.get_capacity(channel):
+                if drop_if_full:
+                    return
+                raise ChannelFull(channel)
+            queue.append((now + self.expiry, message))
+            waiters = self._waiters.get(channel)
+            waiter = waiters.pop(0) if waiters else None
+        if waiter is not None:
+            loop, future = waiter
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                # The receiver's event loop is gone; the message stays queued
+                pass
+
+    def _sweep(self, now):
+        """Drop expired messages, and the queues this leaves empty with nobody waiting on them.
+
+        Otherwise the queues of channels whose consumer has gone without a
+        group_discard would keep their messages forever: only ``receive()``
+        drops expired messages. Called at most every ``expiry`` seconds.
+        """
+        for channel, queue in list(self._channels.items()):
+            while queue and queue[0][0] < now:
+                queue.popleft()
+            if not queue and not self._waiters.get(channel):
+                del self._channels[channel]
+        for channel in [channel for channel, waiters in self._waiters.items() if not waiters]:
+            del self._waiters[channel]
+        self._next_sweep = now + self.expiry
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        assert "__asgi_channel__" not in message
+        if _owner(channel) == self.prefix:
+            self._deliver(channel, message)
+        else:
+            self._send({'op': 'send', 'channel': channel, 'message': message})
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        loop = get_running_loop()
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                queue = self._channels.get(channel)
+                while queue:
+                    expires, message = queue.popleft()
+                    if expires >= now:
+                        return message
+                future = loop.create_future()
+                waiter = (loop, future)
+                self._waiters.setdefault(channel, []).append(waiter)
+            try:
+                await future
+            except CancelledError:
+                with self._lock:
+                    waiters = self._waiters.get(channel, [])
+                    if waiter in waiters:
+                        waiters.remove(waiter)
+                raise
+
+    async def new_channel(self, prefix="specific"):
+        if not self._registered.is_set():
+            # Make sure the broker knows this process before anyone can send to it:
+            # the ack comes after the broker has handled our hello
+            await self._request({'op': 'ping'})
+        return f"{self.prefix}!{prefix}.{uuid.uuid4().hex}"
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        with self._lock:
+            self._groups[(group, channel)] = time.monotonic() + self.group_expiry
+        await self._request({'op': 'group_add', 'group': group, 'channel': channel})
+
+    async def group_discard(self, group, channel):
+        assert self.valid_group_name(group), "Group name not valid"
+        assert self.valid_channel_name(channel), "Channel name not valid"
+        with self._lock:
+            self._groups.pop((group, channel), None)
+            # Usually the channel's consumer is going away: free its queue
+            if not any(member == channel for _, member in self._groups):
+                self._channels.pop(channel, None)
+        await self._request({'op': 'group_discard', 'group': group, 'channel': channel})
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        assert self.valid_group_name(group), "Group name not valid"
+        self._send({'op': 'group_send', 'group': group, 'message': message})
+
+    async def flush(self):
+        with self._lock:
+            self._channels.clear()
+            self._groups.clear()
+        await self._request({'op': 'flush'})
+
+    async def close(self):
+        """Disconnect from the broker, and stop it if this process runs it.
+
+        Another process takes over as the broker. Using the layer again
+        afterwards reconnects.
+        """
+        with self._lock:
+            writer, outbox = self._writer, self._outbox
+            self._writer = self._outbox = None
+        if writer is not None:
+            outbox.put(_STOP)
+            await get_running_loop().run_in_executor(None, writer.join)
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,43 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli is optional
+    brotli = None
+
+re_accepts_brotli = re.compile(r"\bbr\b")
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Gzip (or Brotli, when installed and accepted) responses worth compressing.
+
+    Bodies under ``RESPONSE_COMPRESSION_MIN_SIZE`` bytes are sent as they are:
+    for a small JSON answer the compression costs more than it saves.
+    Streaming responses (order exports) are left alone too: Django gzips an
+    async stream as one gzip member per chunk, which not every client decodes.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        if response.streaming or len(response.content) < min_size or response.has_header("Content-Encoding"):
+            return response
+
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if brotli is None or not re_accepts_brotli.search(accept_encoding):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed = brotli.compress(response.content, quality=5)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers["Content-Length"] = str(len(compressed))
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
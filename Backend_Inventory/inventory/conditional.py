@@ -0,0 +1,51 @@
+import hashlib
+
+from django.db.models import Count, Max, Sum
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+from .models import OrderStatusCount
+
+
+async def listing_etag(queryset, request, scope="", version=None):
+    """ETag of an order listing request.
+
+    Built from the query string, the listing's ``version`` from
+    OrderListCache and ``(Max(updated_on), Count(id))`` of the filtered
+    orders, one aggregate answered from an index. It's known without
+    fetching or serializing a single row. ``scope`` separates listings that
+    share a URL, e.g. one user's orders from another's.
+
+    The version changes when a change to the orders commits. The aggregate
+    alone would miss a change stamped before the latest ``updated_on`` but
+    committed after it (the case the changes feed's grace window covers);
+    it still catches changes made without invalidating the cache.
+
+    Counting a whole unfiltered table would scan every row, so for those the
+    count is the total of the status rollups instead, which every order
+    creation and deletion changes (see inventory/rollups.py and signals.py).
+    """
+    orders = queryset.order_by()
+    if orders.query.where:
+        summary = await orders.aaggregate(last_change=Max('updated_on'), count=Count('id'))
+    else:
+        summary = await orders.aaggregate(last_change=Max('updated_on'))
+        summary.update(await OrderStatusCount.objects.aaggregate(count=Sum('count')))
+    last_change = summary['last_change'].isoformat() if summary['last_change'] else ""
+    raw = f"{scope}|{version}|{request.get_full_path()}|{last_change}|{summary['count']}"
+    return '"%s"' % hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def not_modified(request, etag):
+    """A 304 response if the client's ``If-None-Match`` matches ``etag``, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        set_validator(response, etag)
+    return response
+
+
+def set_validator(response, etag):
+    response["ETag"] = etag
+    # Cache, but ask us every time; the answer depends on who's asking
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ("Authorization",))
+    return response
@@ -1,83 +1,215 @@
+import logging
+import threading
 import time
-from .order_queue import order_queue
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from .order_queue import order_queue, make_worker_id
 from .models import Order
+from .order_cache import order_list_cache
+from .rollups import record_transition
+from . import metrics
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+logger = logging.getLogger(__name__)
+
+class WorkerStats:
+    """Throughput counters for a single worker thread."""
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.started_on = time.monotonic()
+        self.processed = 0
+        self.skipped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, outcome, busy_seconds):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.busy_seconds += busy_seconds
+
+    def as_dict(self):
+        with self._lock:
+            uptime = time.monotonic() - self.started_on
+            return {
+                "worker_id": self.worker_id,
+                "processed": self.processed,
+                "skipped": self.skipped,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "uptime_seconds": round(uptime, 3),
+                "orders_per_minute": round(self.processed * 60 / uptime, 2) if uptime else 0.0,
+                "utilization": round(self.busy_seconds / uptime, 3) if uptime else 0.0,
+            }
+
+
 class ConsumeOrders:
-    def __init__(self):
+    def __init__(self, queue=order_queue, concurrency=None):
+        self.queue = queue
         self.thread_sleep_time = 5
+        self.poll_interval = getattr(settings, 'ORDER_QUEUE_POLL_INTERVAL', 0.5)
+        self.concurrency = concurrency or getattr(settings, 'ORDER_CONSUMER_CONCURRENCY', 4)
+        self.worker_id = make_worker_id()
         self.running = False
+        self._threads = []
+        self._stats = {}
 
-    def consume_orders(self):
+    def process_next(self, channel_layer=None, worker_id=None):
+        """Claim and process one order.
+
+        Returns "processed" or "skipped", or None if the queue was empty.
+        """
+        entry = self.queue.claim(worker_id or self.worker_id)
+        if entry is None:
+            return None
+
+        order = entry.order
+        # Orders re-claimed after a lease ran out would count the lease too
+        if entry.attempts == 1:
+            metrics.order_queue_wait.observe((timezone.now() - entry.enqueued_on).total_seconds())
+        log = {"order_id": order.id, "worker_id": worker_id or self.worker_id}
+        logger.debug("Processing order", extra=log)
+
+        # Verify order is in Processing state (should be set by admin acceptance)
+        if order.status != "Processing":
+            logger.info("Order is not in Processing state, skipping", extra={**log, "status": order.status})
+            self.queue.complete(entry)
+            return "skipped"
+
+        # Simulate processing time
+        time.sleep(self.thread_sleep_time)
+
+        # Mark as processed, unless the order was cancelled while we worked on it
+        with transaction.atomic():
+            updated = Order.objects.filter(id=order.id, status="Processing").update(
+                status="Processed",
+                updated_on=timezone.now(),
+            )
+            self.queue.complete(entry)
+            if updated:
+                record_transition("Processing", "Processed")
+                order_list_cache.invalidate(order.username)
+
+        if not updated:
+            logger.info("Order changed state while processing, skipping", extra=log)
+            return "skipped"
+
+        # Send completion update to user
+        if channel_layer:
+            async_to_sync(metrics.timed_group_send)(
+                channel_layer,
+                f"user_{order.username}",
+                {
+                    "type": "order_status",
+                    "message": {
+                        "order_id": order.id,
+                        "status": "Processed",
+                        "item_name": order.item_name
+                    }
+                }
+            )
+
+            # Notify admin portal
+            async_to_sync(metrics.timed_group_send)(
+                channel_layer,
+                "admin_orders",
+                {
+                    "type": "order_update",
+                    "message": {
+                        "order_id": order.id,
+                        "action": "completed",
+                        "status": "Processed"
+                    }
+                }
+            )
+
+        logger.info("Order processed", extra=log)
+        return "processed"
+
+    def _work(self, worker_id, channel_layer):
+        stats = self._stats[worker_id]
+        try:
+            while self.running:
+                started = time.monotonic()
+                try:
+                    close_old_connections()
+                    outcome = self.process_next(channel_layer, worker_id)
+                except Exception as e:
+                    logger.exception("Failed to process order", extra={"worker_id": worker_id})
+                    stats.record("errors", time.monotonic() - started)
+                    metrics.order_processing_duration.labels("error").observe(time.monotonic() - started)
+                    time.sleep(1)
+                    continue
+
+                if outcome is None:
+                    # Block until an order is enqueued instead of spinning
+                    self.queue.wait(self.poll_interval)
+                else:
+                    stats.record(outcome, time.monotonic() - started)
+                    metrics.order_processing_duration.labels(outcome).observe(time.monotonic() - started)
+        finally:
+            connection.close()
+
+    def start(self):
+        """Start the worker threads and return immediately."""
+        if self.running:
+            return
         self.running = True
         channel_layer = get_channel_layer()
-        
-        print("Order consumer started...")
-        
-        while self.running:
-            try:
-                if not order_queue.empty():
-                    order_id = order_queue.get()
-                    print(f"Processing order {order_id}...")
-                    
-                    try:
-                        order = Order.objects.get(id=order_id)
-                        
-                        # Verify order is in Processing state (should be set by admin acceptance)
-                        if order.status != "Processing":
-                            print(f"Order {order_id} is not in Processing state. Current status: {order.status}")
-                            continue
-                        
-                        # Simulate processing time
-                        print(f"Processing order {order_id} for {self.thread_sleep_time} seconds...")
-                        time.sleep(self.thread_sleep_time)
-                        
-                        # Mark as processed
-                        order.status = "Processed"
-                        order.save()
-                        
-                        # Send completion update to user
-                        if channel_layer:
-                            async_to_sync(channel_layer.group_send)(
-                                f"user_{order.username}",
-                                {
-                                    "type": "order_status",
-                                    "message": {
-                                        "order_id": order.id,
-                                        "status": "Processed",
-                                        "item_name": order.item_name
-                                    }
-                                }
-                            )
-                            
-                            # Notify admin portal
-                            async_to_sync(channel_layer.group_send)(
-                                "admin_orders",
-                                {
-                                    "type": "order_update",
-                                    "message": {
-                                        "order_id": order.id,
-                                        "action": "completed",
-                                        "status": "Processed"
-                                    }
-                                }
-                            )
-                        
-                        print(f"Order {order_id} processed successfully")
-                        
-                    except Order.DoesNotExist:
-                        print(f"Order {order_id} not found!")
-                else:
-                    # Sleep briefly if queue is empty
-                    time.sleep(0.5)
-                    
-            except Exception as e:
-                print(f"Error processing order: {e}")
-                time.sleep(1)
-
-    def stop(self):
+
+        # Pick up orders left behind by workers that died mid-processing
+        try:
+            recovered = self.queue.recover()
+            if recovered:
+                logger.warning("Recovered orders stuck in Processing", extra={"recovered": recovered})
+        except Exception:
+            logger.exception("Failed to recover orders")
+        finally:
+            connection.close()
+
+        self._threads = []
+        self._stats = {}
+        for index in range(self.concurrency):
+            worker_id = f"{self.worker_id}-{index}"
+            self._stats[worker_id] = WorkerStats(worker_id)
+            thread = threading.Thread(
+                target=self._work,
+                args=(worker_id, channel_layer),
+                name=f"order-worker-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        logger.info("Order consumer started", extra={"worker_id": self.worker_id, "concurrency": self.concurrency})
+
+    def consume_orders(self):
+        """Run the worker pool and block until ``stop()`` is called."""
+        self.start()
+        for thread in self._threads:
+            thread.join()
+
+    def stop(self, timeout=None):
+        """Stop claiming new orders and wait for in-flight orders to finish.
+
+        Returns True if every worker finished within ``timeout`` seconds.
+        Orders a worker didn't get to finish stay claimed until their lease
+        runs out, and are then picked up again.
+        """
         self.running = False
+        self.queue.notify_all()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            thread.join(remaining)
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def stats(self):
+        """Per-worker throughput stats."""
+        return [stats.as_dict() for stats in self._stats.values()]
 
 # Global instance
-order_consumer = ConsumeOrders()
\ No newline at end of file
+order_consumer = ConsumeOrders()
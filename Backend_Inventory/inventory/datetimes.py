@@ -0,0 +1,10 @@
+def isoformat(value):
+    """ISO 8601, with UTC as "Z": how DRF's DateTimeField outputs datetimes.
+
+    Shared by the listings, exports and dashboard so all of them format dates
+    the same way. Doesn't change the time zone of ``value``.
+    """
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
@@ -0,0 +1,68 @@
+import csv
+import json
+
+from django.conf import settings
+
+from .datetimes import isoformat
+
+EXPORT_FIELDS = (
+    'id', 'user_id', 'username', 'item_id', 'item_name', 'item_quantity',
+    'status', 'created_on', 'updated_on',
+)
+
+
+async def export_batches(queryset, chunk_size=None):
+    """Yield the rows of ``queryset`` as lists of value tuples, ``chunk_size`` at a time.
+
+    Each batch is its own query, keyset-paginated on the primary key, so only
+    one batch is ever held in memory whatever the table size (the MySQL driver
+    buffers a whole result set client-side, so a single streamed query
+    wouldn't do). Rows changed while the export runs show up in their state at
+    the time their batch is read.
+    """
+    chunk_size = chunk_size or getattr(settings, 'ORDER_EXPORT_CHUNK_SIZE', 2000)
+    queryset = queryset.order_by('id').values_list(*EXPORT_FIELDS)
+    last_id = 0
+    while True:
+        batch = [row async for row in queryset.filter(id__gt=last_id)[:chunk_size]]
+        if batch:
+            yield batch
+        if len(batch) < chunk_size:
+            return
+        last_id = batch[-1][0]
+
+
+class _Echo:
+    """File-like object for csv.writer that hands back what it's given."""
+
+    def write(self, value):
+        return value
+
+
+async def ndjson_stream(batches):
+    created_on = EXPORT_FIELDS.index('created_on')
+    updated_on = EXPORT_FIELDS.index('updated_on')
+    async for batch in batches:
+        lines = []
+        for row in batch:
+            row = list(row)
+            row[created_on] = isoformat(row[created_on])
+            row[updated_on] = isoformat(row[updated_on])
+            lines.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=(',', ':')))
+        yield '\n'.join(lines) + '\n'
+
+
+async def csv_stream(batches):
+    writer = csv.writer(_Echo())
+    created_on = EXPORT_FIELDS.index('created_on')
+    updated_on = EXPORT_FIELDS.index('updated_on')
+    # The header goes out before the first query runs
+    yield writer.writerow(EXPORT_FIELDS)
+    async for batch in batches:
+        lines = []
+        for row in batch:
+            row = list(row)
+            row[created_on] = isoformat(row[created_on])
+            row[updated_on] = isoformat(row[updated_on])
+            lines.append(writer.writerow(row))
+        yield ''.join(lines)
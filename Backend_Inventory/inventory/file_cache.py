@@ -0,0 +1,34 @@
+import threading
+import time
+
+from django.core.cache.backends import filebased
+
+# Cache directory -> when this process may next check it for culling. Per
+# directory rather than per backend instance: Django makes a new instance of
+# a cache for every thread and async context.
+_next_cull = {}
+_cull_lock = threading.Lock()
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    """Django's file-based cache, checking whether to cull at most every ``CULL_INTERVAL`` seconds.
+
+    Django's lists the whole cache directory on every ``set()`` to compare
+    the number of entries with ``MAX_ENTRIES``: as many file system calls
+    as there are entries, for each write. This one does that at most once
+    every ``CULL_INTERVAL`` seconds (an OPTIONS entry, default 60) per
+    process, so the cache can go over ``MAX_ENTRIES`` by what the processes
+    write in between.
+    """
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self.cull_interval = params.get('OPTIONS', {}).get('CULL_INTERVAL', 60)
+
+    def _cull(self):
+        now = time.monotonic()
+        with _cull_lock:
+            if now < _next_cull.get(self._dir, 0.0):
+                return
+            _next_cull[self._dir] = now + self.cull_interval
+        super()._cull()
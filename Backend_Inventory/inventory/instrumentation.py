@@ -0,0 +1,95 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from . import metrics
+
+
+class MetricsMiddleware:
+    """Records the latency, query count and database time of every request.
+
+    Goes first in MIDDLEWARE so the time covers the whole stack. For
+    streaming responses (exports) it's the time to the first byte.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, stats, seconds):
+        match = getattr(request, 'resolver_match', None)
+        # URL names, not paths, so ids in the URL don't make new series
+        view = match.view_name if match else "unmatched"
+        metrics.http_request_duration.labels(view, request.method, str(response.status_code)).observe(seconds)
+        metrics.http_request_queries.labels(view).observe(stats.queries)
+        metrics.http_request_db_duration.labels(view).observe(stats.db_seconds)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver: count this connection's queries against the current request."""
+    if metrics.record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(metrics.record_query)
+
+
+def collect_database_metrics():
+    """Read the queue and order gauges at scrape time: two cheap queries."""
+    from .models import OrderStatusCount, QueuedOrder
+
+    now = timezone.now()
+    # Claimable as in DatabaseOrderQueue: never claimed, or the lease ran out
+    claimable = Q(lease_expires_on__isnull=True) | Q(lease_expires_on__lt=now)
+    queue = QueuedOrder.objects.aggregate(
+        waiting=Count('id', filter=claimable),
+        claimed=Count('id', filter=~claimable),
+        oldest=Min('enqueued_on', filter=claimable),
+    )
+    metrics.order_queue_depth.labels("waiting").set(queue['waiting'])
+    metrics.order_queue_depth.labels("claimed").set(queue['claimed'])
+    metrics.order_queue_oldest_age.set((now - queue['oldest']).total_seconds() if queue['oldest'] else 0)
+    for status, count in OrderStatusCount.objects.values_list('status', 'count'):
+        metrics.orders_by_status.labels(status).set(count)
+
+
+def collect_cache_metrics():
+    from .authentication import token_cache
+    from .order_cache import order_list_cache
+    from .search import search_cache
+
+    for name, cache in (("verified_tokens", token_cache), ("order_lists", order_list_cache), ("product_search", search_cache)):
+        stats = cache.stats()
+        metrics.cache_lookups.labels(name, "hit").set(stats["hits"] + stats.get("derived_hits", 0))
+        metrics.cache_lookups.labels(name, "miss").set(stats["misses"])
+
+
+metrics.registry.add_collector(collect_database_metrics)
+metrics.registry.add_collector(collect_cache_metrics)
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMinute
+
+from inventory.models import Order, OrderStatusBucket, OrderStatusCount
+from inventory.rollups import ORDER_STATUSES
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the order status counters and per-minute buckets from the order table. "
+        "Buckets are rebuilt from each order's creation (Pending) and its last change (current "
+        "status); transitions an order has since moved past, e.g. into Processing, aren't recorded "
+        "anywhere else and are lost. Use --counts-only to keep the existing buckets."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--counts-only', action='store_true',
+            help="Only reconcile the per-status counters",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # Status transitions update these rows too, so holding them makes
+            # concurrent transitions wait for the rebuild instead of being lost
+            before = dict(
+                OrderStatusCount.objects.select_for_update().order_by('status').values_list('status', 'count')
+            )
+            counts = dict.fromkeys(ORDER_STATUSES, 0)
+            counts.update(Order.objects.order_by().values_list('status').annotate(Count('id')))
+
+            OrderStatusCount.objects.all().delete()
+            OrderStatusCount.objects.bulk_create(
+                OrderStatusCount(status=status, count=count) for status, count in counts.items()
+            )
+            for status in sorted(set(before) | set(counts)):
+                if before.get(status, 0) != counts.get(status, 0):
+                    self.stdout.write(f"{status}: {before.get(status, 0)} -> {counts.get(status, 0)}")
+
+            if options['counts_only']:
+                self.stdout.write(f"Rebuilt {len(counts)} status counters")
+                return
+
+            buckets = {}
+            created = (
+                Order.objects.order_by().annotate(minute=TruncMinute('created_on'))
+                .values_list('minute').annotate(Count('id'))
+            )
+            for minute, count in created:
+                buckets[(minute, "Pending")] = count
+            changed = (
+                Order.objects.order_by().exclude(status="Pending").annotate(minute=TruncMinute('updated_on'))
+                .values_list('minute', 'status').annotate(Count('id'))
+            )
+            for minute, status, count in changed:
+                buckets[(minute, status)] = buckets.get((minute, status), 0) + count
+
+            OrderStatusBucket.objects.all().delete()
+            OrderStatusBucket.objects.bulk_create(
+                (OrderStatusBucket(minute=minute, status=status, count=count)
+                 for (minute, status), count in buckets.items()),
+                batch_size=1000,
+            )
+        self.stdout.write(f"Rebuilt {len(counts)} status counters and {len(buckets)} minute buckets")
@@ -0,0 +1,108 @@
+import logging
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def run_worker_process(concurrency, thread_sleep_time, metrics_port=None):
+    """Entry point of a worker process: run a ConsumeOrders pool until signalled."""
+    import django
+    django.setup()
+
+    from inventory.consumer import ConsumeOrders
+    from inventory.metrics import serve_metrics
+
+    if metrics_port is not None:
+        serve_metrics(metrics_port)
+
+    consumer = ConsumeOrders(concurrency=concurrency)
+    if thread_sleep_time is not None:
+        consumer.thread_sleep_time = thread_sleep_time
+
+    def shutdown(signum, frame):
+        # Stop claiming; consume_orders() returns once in-flight orders are done
+        consumer.stop(timeout=0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    consumer.consume_orders()
+    for stats in consumer.stats():
+        logger.info("Worker stats", extra=stats)
+
+
+class Command(BaseCommand):
+    help = "Process accepted orders in dedicated worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=1,
+            help="Number of worker processes to run (default: 1)",
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help="Worker threads per process (default: ORDER_CONSUMER_CONCURRENCY)",
+        )
+        parser.add_argument(
+            '--processing-time', type=float, default=None,
+            help="Simulated processing time per order in seconds",
+        )
+        parser.add_argument(
+            '--metrics-port', type=int, default=None,
+            help="Serve each process's Prometheus metrics on this port plus the process number",
+        )
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        concurrency = options['concurrency']
+        if processes < 1 or (concurrency is not None and concurrency < 1):
+            self.stderr.write("--processes and --concurrency must be at least 1")
+            return
+
+        # Children are spawned rather than forked so they don't inherit this
+        # process's database connections or threads
+        context = multiprocessing.get_context('spawn')
+        connections.close_all()
+        metrics_port = options['metrics_port']
+
+        def worker_args(index):
+            port = None if metrics_port is None else metrics_port + index
+            return (concurrency, options['processing_time'], port)
+
+        stopping = False
+
+        def shutdown(signum, frame):
+            nonlocal stopping
+            stopping = True
+            for process in workers:
+                if process.is_alive():
+                    process.terminate()
+
+        workers = []
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        for index in range(processes):
+            process = context.Process(target=run_worker_process, args=worker_args(index), daemon=False)
+            process.start()
+            workers.append(process)
+
+        self.stdout.write(f"Started {processes} order worker processes")
+
+        # Restart workers that die unexpectedly until asked to stop
+        while not stopping:
+            for index, process in enumerate(workers):
+                if not process.is_alive() and not stopping:
+                    self.stderr.write(f"Order worker {process.pid} exited with {process.exitcode}, restarting")
+                    workers[index] = context.Process(target=run_worker_process, args=worker_args(index), daemon=False)
+                    workers[index].start()
+            time.sleep(1)
+
+        for process in workers:
+            process.join()
+        self.stdout.write("Order workers stopped")
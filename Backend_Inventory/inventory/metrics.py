@@ -0,0 +1,293 @@
+"""In-process metrics, exposed in the Prometheus text format at /metrics.
+
+Every process keeps its own: scrape each daphne process, and each
+``run_order_workers`` process on its ``--metrics-port``. Values that live in
+the database (queue depth, order counts) are read at scrape time instead.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request latencies, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Wait and processing times of orders, seconds
+QUEUE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_format_labels(labelnames, values)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        # Per bucket, not cumulative; the last one is +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts = list(self.counts)
+            total = self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames + ('le',), values + (_format_value(float(bound)),))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, values)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(float(bound) for bound in buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Call ``collect()`` before every render, to refresh gauges read from elsewhere."""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "inventory_http_request_duration_seconds", "Time to produce a response, by view.",
+    ("view", "method", "status"),
+))
+http_request_queries = registry.register(Histogram(
+    "inventory_http_request_db_queries", "Database queries run per request, by view.",
+    ("view",), buckets=QUERY_COUNT_BUCKETS,
+))
+http_request_db_duration = registry.register(Histogram(
+    "inventory_http_request_db_duration_seconds", "Time spent in database queries per request, by view.",
+    ("view",),
+))
+order_queue_depth = registry.register(Gauge(
+    "inventory_order_queue_depth", "Accepted orders in the queue, by whether a worker holds them.",
+    ("state",),
+))
+order_queue_oldest_age = registry.register(Gauge(
+    "inventory_order_queue_oldest_age_seconds", "Age of the oldest order waiting in the queue.",
+))
+order_queue_wait = registry.register(Histogram(
+    "inventory_order_queue_wait_seconds", "Time from enqueueing an order to a worker claiming it.",
+    buckets=QUEUE_BUCKETS,
+))
+order_processing_duration = registry.register(Histogram(
+    "inventory_order_processing_seconds", "Time a worker spent on one order, by outcome.",
+    ("outcome",), buckets=QUEUE_BUCKETS,
+))
+orders_by_status = registry.register(Gauge(
+    "inventory_orders", "Orders by status, from the status rollups.",
+    ("status",),
+))
+websocket_connections = registry.register(Gauge(
+    "inventory_websocket_connections", "Open WebSocket connections, by endpoint.",
+    ("endpoint",),
+))
+group_send_duration = registry.register(Histogram(
+    "inventory_channel_group_send_seconds", "Time to hand a message to the channel layer, by group kind.",
+    ("group",),
+))
+cache_lookups = registry.register(Counter(
+    "inventory_cache_lookups_total", "Cache lookups, by cache and result.",
+    ("cache", "result"),
+))
+
+
+def group_kind(group):
+    # One label value per kind of group, not per user
+    if group == "admin_orders":
+        return "admin"
+    if group.startswith("user_"):
+        return "user"
+    return "other"
+
+
+async def timed_group_send(channel_layer, group, message):
+    """``channel_layer.group_send`` with its latency recorded."""
+    started = time.perf_counter()
+    try:
+        await channel_layer.group_send(group, message)
+    finally:
+        group_send_duration.labels(group_kind(group)).observe(time.perf_counter() - started)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+# Stats of the request being handled. Context variables follow the request
+# into the threads sync_to_async runs its ORM calls in.
+current_request = contextvars.ContextVar("inventory_request_stats", default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query to the current request's stats."""
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Serve this process's metrics on ``port`` from a daemon thread (for processes without a web server).
+
+    Only to this host by default, like /metrics (see METRICS_ALLOWED_NETWORKS).
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.27 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.IntegerField(default=0)),
+                ('username', models.CharField(max_length=150, null=True)),
+                ('item_id', models.IntegerField()),
+                ('item_name', models.CharField(max_length=100)),
+                ('item_quantity', models.IntegerField()),
+                ('status', models.CharField(default='Pending', max_length=50)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'inventory_order',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-18 15:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('enqueued_on', models.DateTimeField(auto_now_add=True)),
+                ('claimed_by', models.CharField(blank=True, max_length=100, null=True)),
+                ('lease_expires_on', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('order', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='queue_entry', to='inventory.order')),
+            ],
+            options={
+                'db_table': 'inventory_order_queue',
+            },
+        ),
+    ]
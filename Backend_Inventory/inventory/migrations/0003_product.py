@@ -0,0 +1,24 @@
+# Generated by Django 4.2.27 on 2026-10-18 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_queuedorder'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Product',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'inventory_product',
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+# Items that used to be hardcoded in views.inventory_list. They were identified
+# by their position in that list (0-4); as products they get database ids (1-5).
+INITIAL_PRODUCTS = ["apple", "banana", "cherries", "apricot", "blueberry"]
+
+
+def seed_products(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    if not Product.objects.exists():
+        Product.objects.bulk_create(Product(name=name) for name in INITIAL_PRODUCTS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_product'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_products, migrations.RunPython.noop),
+    ]
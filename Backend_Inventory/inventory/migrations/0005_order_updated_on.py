@@ -0,0 +1,25 @@
+# Generated by Django 4.2.27 on 2026-10-18 15:47
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_updated_on(apps, schema_editor):
+    Order = apps.get_model('inventory', 'Order')
+    Order.objects.update(updated_on=F('created_on'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_seed_products'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='updated_on',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(backfill_updated_on, migrations.RunPython.noop),
+    ]
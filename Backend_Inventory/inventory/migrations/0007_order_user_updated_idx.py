@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_order_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['username', 'updated_on'], name='order_user_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.27 on 2026-10-18 16:13
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Rows always present so status transitions can lock them (see inventory/rollups.py)
+ORDER_STATUSES = ["Pending", "Processing", "Processed", "Cancelled"]
+
+
+def seed_status_counts(apps, schema_editor):
+    # Current counts only; per-minute history is filled in by rebuild_order_rollups
+    Order = apps.get_model('inventory', 'Order')
+    OrderStatusCount = apps.get_model('inventory', 'OrderStatusCount')
+    counts = dict.fromkeys(ORDER_STATUSES, 0)
+    counts.update(Order.objects.order_by().values_list('status').annotate(Count('id')))
+    OrderStatusCount.objects.bulk_create(
+        OrderStatusCount(status=status, count=count) for status, count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_order_user_updated_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderStatusBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('minute', models.DateTimeField()),
+                ('status', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'inventory_order_status_bucket',
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(max_length=50, unique=True)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'inventory_order_status_count',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='orderstatusbucket',
+            constraint=models.UniqueConstraint(fields=('minute', 'status'), name='order_bucket_minute_status_uniq'),
+        ),
+        migrations.RunPython(seed_status_counts, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,17 @@ from django.db import models
 from django.contrib.auth.models import User
 
 # Create your models here.
+class Product(models.Model):
+    name = models.CharField(max_length=200)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'inventory_product'
+
+    def __str__(self):
+        return self.name
+
+
 class Order(models.Model):
     user_id = models.IntegerField(default=0)
     username = models.CharField(max_length=150, null=True)
@@ -10,9 +21,76 @@ class Order(models.Model):
     item_quantity = models.IntegerField()
     status = models.CharField(max_length=50, default="Pending")
     created_on = models.DateTimeField(auto_now_add=True)
+    # Bulk .update() calls bypass auto_now and must set this themselves
+    updated_on = models.DateTimeField(auto_now=True)
 
     class Meta:
         db_table = 'inventory_order'  # Add this to match the expected table name
+        # One index per hot access path; the trailing id matches the
+        # (created_on, id) / (updated_on, id) keyset ordering of the listings
+        indexes = [
+            # Admin listing: all orders newest first
+            models.Index(fields=['created_on', 'id'], name='order_created_idx'),
+            # User listing: filter(username=...) newest first
+            models.Index(fields=['username', 'created_on', 'id'], name='order_user_created_idx'),
+            # Status lookups (consumer recovery, admin status filter) newest first
+            models.Index(fields=['status', 'created_on', 'id'], name='order_status_created_idx'),
+            # Changes feed: updated_on > watermark, oldest first
+            models.Index(fields=['updated_on', 'id'], name='order_updated_idx'),
+            # ETag of a user's listing: Max(updated_on) and Count for one username
+            models.Index(fields=['username', 'updated_on'], name='order_user_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_name} (User {self.user_id})"
+
+class QueuedOrder(models.Model):
+    """An accepted order waiting to be processed by one of the order workers.
+
+    A worker claims a row by writing its id into ``claimed_by`` together with a
+    lease. Rows whose lease ran out (the worker crashed) can be claimed again.
+    """
+    order = models.OneToOneField(Order, on_delete=models.CASCADE, related_name='queue_entry')
+    enqueued_on = models.DateTimeField(auto_now_add=True)
+    claimed_by = models.CharField(max_length=100, null=True, blank=True)
+    lease_expires_on = models.DateTimeField(null=True, blank=True, db_index=True)
+    attempts = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'inventory_order_queue'
+
+    def __str__(self):
+        return f"Queued order {self.order_id}"
+
+
+class OrderStatusCount(models.Model):
+    """Number of orders currently in ``status``, kept up to date by inventory/rollups.py."""
+    status = models.CharField(max_length=50, unique=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'inventory_order_status_count'
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+
+class OrderStatusBucket(models.Model):
+    """Number of orders that moved into ``status`` during the minute starting at ``minute``.
+
+    Pending buckets count new orders; the others count transitions, e.g.
+    orders processed or cancelled per minute.
+    """
+    minute = models.DateTimeField()
+    status = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'inventory_order_status_bucket'
+        constraints = [
+            # Also serves the dashboard's minute range scan
+            models.UniqueConstraint(fields=['minute', 'status'], name='order_bucket_minute_status_uniq'),
+        ]
 
     def __str__(self):
-        return f"{self.item_name} (User {self.user_id})"
\ No newline at end of file
+        return f"{self.minute:%Y-%m-%d %H:%M} {self.status}: {self.count}"
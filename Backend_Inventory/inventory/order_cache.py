@@ -0,0 +1,122 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+class OrderListCache:
+    """Rendered pages of each user's order listing, in Django's cache framework.
+
+    Every user has a version token in the cache; page entries are keyed by
+    that version and a hash of the request's query string. A user's orders
+    only change at a few known points (``save_order``, ``accept_order``,
+    ``cancel_order`` and the order workers), which call ``invalidate`` so the
+    user gets a new version and every old page becomes unreachable. Old
+    entries are left to expire.
+
+    The version is a fresh token rather than an incremented counter, so
+    concurrent invalidations from different processes can't cancel out (the
+    default backend is a file cache shared by all processes on the host).
+    Invalidations are deferred until the current transaction commits, so a
+    reader can't cache data from before the change under the new version.
+    Orders changed any other way (a shell, raw SQL) show up once their pages
+    expire after ``timeout`` seconds.
+
+    Every invalidation also bumps the version of the listing of all orders.
+    Nothing caches that listing's pages, but the admin listing's ETag
+    includes its version (see inventory/conditional.py).
+    """
+
+    def __init__(self, alias='orders', timeout=300):
+        self.alias = alias
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _version_key(self, username):
+        if username is None:
+            return "order-list:version:all"
+        return f"order-list:version:{hashlib.sha256(username.encode()).hexdigest()[:32]}"
+
+    def _page_key(self, username, version, query):
+        digest = hashlib.sha256(f"{username}|{query}".encode()).hexdigest()[:32]
+        return f"order-list:page:{version}:{digest}"
+
+    async def version(self, username=None):
+        """Current version of ``username``'s listing, or of all orders' if None.
+
+        Read it before the rows, so a page built from rows read before a
+        concurrent change is stored under the version that change retired.
+        """
+        key = self._version_key(username)
+        version = await self.cache.aget(key)
+        if version is None:
+            version = time.time_ns()
+            # add(): if another request created it meanwhile, use theirs
+            if not await self.cache.aadd(key, version, timeout=None):
+                version = await self.cache.aget(key, version)
+        return version
+
+    async def get(self, username, version, query):
+        """Return ``(etag, content)`` of a cached page, or None."""
+        entry = await self.cache.aget(self._page_key(username, version, query))
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    async def put(self, username, version, query, etag, content):
+        await self.cache.aset(self._page_key(username, version, query), (etag, content), self.timeout)
+
+    def _bumped_versions(self, username):
+        version = time.time_ns()
+        keys = [self._version_key(None)]
+        if username:
+            keys.append(self._version_key(username))
+        return dict.fromkeys(keys, version)
+
+    def invalidate(self, username):
+        """Drop every cached page of ``username``'s orders once the transaction commits."""
+
+        def bump():
+            self.cache.set_many(self._bumped_versions(username), timeout=None)
+            with self._lock:
+                self.invalidations += 1
+
+        transaction.on_commit(bump)
+
+    async def ainvalidate(self, username):
+        # Async views run outside transactions, so this takes effect right away
+        await self.cache.aset_many(self._bumped_versions(username), timeout=None)
+        with self._lock:
+            self.invalidations += 1
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+order_list_cache = OrderListCache(
+    alias=getattr(settings, 'ORDER_LIST_CACHE_ALIAS', 'orders'),
+    timeout=getattr(settings, 'ORDER_LIST_CACHE_TIMEOUT', 300),
+)
@@ -1,3 +1,146 @@
-from queue import Queue
+import os
+import socket
+import threading
+import uuid
+from contextlib import nullcontext
+from datetime import timedelta
 
-order_queue = Queue()
\ No newline at end of file
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Order, QueuedOrder
+
+
+def make_worker_id():
+    """Unique id for a worker: host, process and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class DatabaseOrderQueue:
+    """Work queue of accepted orders stored in the ``inventory_order_queue`` table.
+
+    Any number of workers, in any process or on any host, can claim from the
+    queue. A claim is a conditional UPDATE on the row's lease, so only one
+    worker can win a given order. On MySQL candidate rows are read with
+    ``SELECT ... FOR UPDATE SKIP LOCKED`` so concurrent workers don't contend
+    for the same rows.
+    """
+
+    # Number of candidate rows looked at per claim attempt
+    claim_batch_size = 10
+
+    def __init__(self):
+        # Wakes up idle workers in this process as soon as an order is enqueued.
+        # ``_signals`` counts wakeups nobody has consumed yet, so a notify that
+        # lands between a failed claim and ``wait()`` isn't lost.
+        self._available = threading.Condition()
+        self._signals = 0
+
+    @property
+    def lease_seconds(self):
+        return getattr(settings, 'ORDER_QUEUE_LEASE_SECONDS', 60)
+
+    def put(self, order_id):
+        """Add an order to the queue. Enqueueing the same order twice is a no-op."""
+        QueuedOrder.objects.get_or_create(order_id=order_id)
+        transaction.on_commit(self.notify)
+
+    def notify(self):
+        with self._available:
+            self._signals += 1
+            self._available.notify()
+
+    def notify_all(self):
+        with self._available:
+            self._available.notify_all()
+
+    def wait(self, timeout):
+        """Block until an order is enqueued in this process or ``timeout`` passes.
+
+        Orders enqueued by other processes are only seen by claiming again, so
+        callers should use a timeout as the upper bound on pickup latency.
+        Returns True if woken up by an enqueue.
+        """
+        with self._available:
+            if not self._signals:
+                self._available.wait(timeout)
+            if self._signals:
+                self._signals -= 1
+                return True
+            return False
+
+    def _claimable(self, now):
+        return QueuedOrder.objects.filter(
+            Q(lease_expires_on__isnull=True) | Q(lease_expires_on__lt=now)
+        )
+
+    def claim(self, worker_id):
+        """Claim the oldest available order for ``worker_id``.
+
+        Returns the claimed ``QueuedOrder`` or ``None`` if the queue is empty.
+        """
+        now = timezone.now()
+        lease_expires_on = now + timedelta(seconds=self.lease_seconds)
+
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        # Without SKIP LOCKED (SQLite) the candidates are read outside a
+        # transaction: upgrading a read into a write lock there fails with
+        # "database is locked" instead of waiting. The conditional UPDATE below
+        # is what makes the claim exclusive either way.
+        with transaction.atomic() if skip_locked else nullcontext():
+            candidates = self._claimable(now).order_by('id')
+            if skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            candidate_ids = list(candidates.values_list('id', flat=True)[:self.claim_batch_size])
+
+            for entry_id in candidate_ids:
+                # Only succeeds if nobody else claimed the row in the meantime
+                won = self._claimable(now).filter(id=entry_id).update(
+                    claimed_by=worker_id,
+                    lease_expires_on=lease_expires_on,
+                    attempts=F('attempts') + 1,
+                )
+                if won:
+                    return QueuedOrder.objects.select_related('order').get(id=entry_id)
+        return None
+
+    def complete(self, entry):
+        """Remove a processed order from the queue."""
+        QueuedOrder.objects.filter(id=entry.id, claimed_by=entry.claimed_by).delete()
+
+    def release(self, entry):
+        """Give a claimed order back to the queue so another worker can take it."""
+        QueuedOrder.objects.filter(id=entry.id, claimed_by=entry.claimed_by).update(
+            claimed_by=None,
+            lease_expires_on=None,
+        )
+
+    def recover(self):
+        """Requeue orders left in "Processing" by a crashed worker.
+
+        Expired leases are released, and "Processing" orders that have no queue
+        entry (e.g. accepted before the queue table existed) are enqueued.
+        Returns the number of recovered orders.
+        """
+        now = timezone.now()
+        released = QueuedOrder.objects.filter(lease_expires_on__lt=now).update(
+            claimed_by=None,
+            lease_expires_on=None,
+        )
+        orphaned = Order.objects.filter(status="Processing", queue_entry__isnull=True)
+        requeued = 0
+        for order_id in orphaned.values_list('id', flat=True):
+            _, created = QueuedOrder.objects.get_or_create(order_id=order_id)
+            requeued += int(created)
+        return released + requeued
+
+    def qsize(self):
+        return QueuedOrder.objects.count()
+
+    def empty(self):
+        return not QueuedOrder.objects.exists()
+
+
+order_queue = DatabaseOrderQueue()
@@ -0,0 +1,161 @@
+import base64
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def encode_cursor(created_on, order_id):
+    raw = f"{created_on.isoformat()}|{order_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_on, order_id = raw.split("|")
+        created_on = parse_datetime(created_on)
+        order_id = int(order_id)
+    except ValueError:
+        raise InvalidPageRequest("Invalid cursor")
+    if created_on is None:
+        raise InvalidPageRequest("Invalid cursor")
+    return created_on, order_id
+
+
+def _parse_bound(value, name, end_of_day=False):
+    """Parse an ISO datetime or date query parameter into an aware datetime."""
+    try:
+        parsed = parse_datetime(value)
+        day = parse_date(value) if parsed is None else None
+    except ValueError:
+        parsed = day = None
+    if parsed is None:
+        if day is None:
+            raise InvalidPageRequest(f"{name} must be an ISO date or datetime")
+        parsed = datetime.combine(day, dt_time.max if end_of_day else dt_time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, dt_timezone.utc)
+    return parsed
+
+
+def filter_orders(queryset, params, allow_username=False):
+    """Apply the status / username / date range filters of a listing request.
+
+    ``created_after`` and ``created_before`` are inclusive; a bare date for
+    ``created_before`` covers the whole day.
+    """
+    statuses = params.get('status')
+    if statuses:
+        queryset = queryset.filter(status__in=statuses.split(','))
+
+    username = params.get('username')
+    if username and allow_username:
+        queryset = queryset.filter(username=username)
+
+    created_after = params.get('created_after')
+    if created_after:
+        queryset = queryset.filter(created_on__gte=_parse_bound(created_after, 'created_after'))
+
+    created_before = params.get('created_before')
+    if created_before:
+        queryset = queryset.filter(
+            created_on__lte=_parse_bound(created_before, 'created_before', end_of_day=True)
+        )
+    return queryset
+
+
+def _created_position(order):
+    return order.created_on, order.id
+
+
+def _updated_position(order):
+    return order.updated_on, order.id
+
+
+async def paginate_orders(queryset, params, position=_created_position):
+    """Return one page of orders, newest first, and the cursor of the next page.
+
+    Pages are keyset-paginated on ``(created_on, id)``: the next page starts
+    strictly after the last row of this one, so each page costs an index
+    range scan of ``limit`` rows however deep it is (no OFFSET).
+
+    ``queryset`` may also be a ``values_list()`` queryset; ``position`` then
+    returns the ``(created_on, id)`` of one of its rows.
+    """
+    try:
+        limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise InvalidPageRequest("limit must be an integer")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    queryset = queryset.order_by('-created_on', '-id')
+
+    cursor = params.get('cursor')
+    if cursor:
+        created_on, order_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_on__lt=created_on) | Q(created_on=created_on, id__lt=order_id)
+        )
+
+    rows = [row async for row in queryset[:limit + 1]]
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*position(rows[-1]))
+    return rows, next_cursor
+
+
+async def order_changes(queryset, params, position=_updated_position):
+    """Return orders created or changed after a watermark, and the next watermark.
+
+    The watermark is an opaque ``(updated_on, id)`` position. Changes are
+    returned oldest first, at most ``limit`` per call; ``has_more`` tells the
+    client to ask again straight away. Without a ``since`` parameter no rows
+    are returned, just a watermark to start syncing from.
+
+    A transaction can commit after others that started later, so rows stamped
+    in the last ``ORDER_CHANGES_GRACE_SECONDS`` are never moved past: they are
+    sent again on the next call and clients must upsert by order id.
+
+    As in ``paginate_orders``, ``position`` gives a row's ``(updated_on, id)``.
+    """
+    try:
+        limit = int(params.get('limit', MAX_PAGE_SIZE))
+    except ValueError:
+        raise InvalidPageRequest("limit must be an integer")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    grace = timedelta(seconds=getattr(settings, 'ORDER_CHANGES_GRACE_SECONDS', 5))
+    settled = (timezone.now() - grace, 0)
+
+    since = params.get('since')
+    if not since:
+        return [], encode_cursor(*settled), False
+
+    updated_on, order_id = decode_cursor(since)
+    queryset = queryset.filter(
+        Q(updated_on__gt=updated_on) | Q(updated_on=updated_on, id__gt=order_id)
+    ).order_by('updated_on', 'id')
+
+    rows = [row async for row in queryset[:limit + 1]]
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    watermark = (updated_on, order_id)
+    if rows:
+        last = position(rows[-1])
+        watermark = max(watermark, min(last, settled))
+        # Everything past this page is inside the grace window and would only
+        # come back again, so there's no point asking straight away
+        has_more = has_more and watermark == last
+    return rows, encode_cursor(*watermark), has_more
@@ -0,0 +1,23 @@
+import json
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+
+def dumps(data):
+    """Serialize to JSON bytes, with orjson when it's installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+class FastJsonResponse(HttpResponse):
+    """``JsonResponse`` for large listings: plain data only, rendered by ``dumps``."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
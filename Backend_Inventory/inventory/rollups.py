@@ -0,0 +1,87 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from .datetimes import isoformat
+from .models import OrderStatusBucket, OrderStatusCount
+
+ORDER_STATUSES = ("Pending", "Processing", "Processed", "Cancelled")
+
+# Longest window the dashboard serves, in minutes (one day)
+MAX_WINDOW_MINUTES = 24 * 60
+
+
+def _add(model, lookup, amount):
+    """Add ``amount`` to the ``count`` of the row matching ``lookup``, creating it if need be.
+
+    One upsert statement rather than an UPDATE followed by an INSERT when no
+    row matched: on MySQL, two transactions inserting the same new row that
+    way (the first transition of a minute) deadlock on the gap locks their
+    UPDATEs took.
+    """
+    fields = [model._meta.get_field(name) for name in lookup]
+    quote = connection.ops.quote_name
+    columns = [quote(field.column) for field in fields] + [quote('count')]
+    params = [field.get_db_prep_value(lookup[field.name], connection) for field in fields] + [amount, amount]
+    sql = f"INSERT INTO {quote(model._meta.db_table)} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    if connection.vendor == 'mysql':
+        sql += f" ON DUPLICATE KEY UPDATE {quote('count')} = {quote('count')} + %s"
+    else:
+        conflict = ', '.join(columns[:-1])
+        sql += f" ON CONFLICT ({conflict}) DO UPDATE SET {quote('count')} = {quote('count')} + %s"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def record_transition(old_status, new_status, amount=1, at=None):
+    """Move ``amount`` orders from ``old_status`` (None for new orders) to ``new_status`` (None for deleted ones).
+
+    Must run in the transaction that changes the orders, so the rollups
+    commit or roll back with them. The counter rows are updated in status
+    order, so concurrent transitions lock them in the same order and can't
+    deadlock each other.
+    """
+    if old_status == new_status or amount <= 0:
+        return
+    minute = (at or timezone.now()).replace(second=0, microsecond=0)
+    deltas = {}
+    if new_status is not None:
+        deltas[new_status] = amount
+    if old_status is not None:
+        deltas[old_status] = -amount
+    for status in sorted(deltas):
+        _add(OrderStatusCount, {'status': status}, deltas[status])
+    if new_status is not None:
+        _add(OrderStatusBucket, {'minute': minute, 'status': new_status}, amount)
+
+
+async def dashboard_stats(minutes=60, now=None):
+    """Order counts by status plus per-minute transitions over the last ``minutes`` minutes.
+
+    Reads the four counter rows and at most ``minutes * len(ORDER_STATUSES)``
+    buckets, whatever the size of the order table. The series has an entry
+    for every minute of the window, the current (partial) minute last.
+    """
+    counts = dict.fromkeys(ORDER_STATUSES, 0)
+    async for status, count in OrderStatusCount.objects.values_list('status', 'count'):
+        counts[status] = count
+
+    current = (now or timezone.now()).replace(second=0, microsecond=0)
+    since = current - timedelta(minutes=minutes - 1)
+    series = {since + timedelta(minutes=offset): dict.fromkeys(ORDER_STATUSES, 0) for offset in range(minutes)}
+    buckets = OrderStatusBucket.objects.filter(minute__gte=since, minute__lte=current).values_list('minute', 'status', 'count')
+    async for minute, status, count in buckets:
+        series.setdefault(minute, dict.fromkeys(ORDER_STATUSES, 0))[status] = count
+
+    return {
+        "counts": counts,
+        "total": sum(counts.values()),
+        # Accepted or waiting to be: what the order workers still have to get through
+        "backlog": counts["Pending"] + counts["Processing"],
+        "window_minutes": minutes,
+        "per_minute": [
+            {"minute": isoformat(minute), "counts": series[minute]}
+            for minute in sorted(series)
+        ],
+    }
@@ -0,0 +1,438 @@
+import heapq
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(text):
+    """Case- and whitespace-insensitive form of a product name or query."""
+    return " ".join(text.casefold().split())
+
+
+def trigrams(text):
+    """Set of character trigrams of a normalized string.
+
+    Each word is padded like pg_trgm does ("  word "), so the start of a word
+    contributes extra trigrams and short queries still produce some.
+    """
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _index_trigrams(postings, trigram_counts, product_id, key):
+    grams = trigrams(key)
+    trigram_counts[product_id] = len(grams)
+    for gram in grams:
+        postings.setdefault(gram, set()).add(product_id)
+
+
+def _unindex_trigrams(postings, trigram_counts, product_id, key):
+    trigram_counts.pop(product_id, None)
+    for gram in trigrams(key):
+        posting = postings.get(gram)
+        if posting is not None:
+            posting.discard(product_id)
+            if not posting:
+                del postings[gram]
+
+
+class ProductIndex:
+    """In-memory prefix index over product names.
+
+    Names are kept as a sorted list of ``(normalized_name, product_id)`` keys,
+    so a prefix lookup is a binary search to the first match followed by a
+    scan of at most ``limit`` entries: O(log n + k) regardless of catalog size.
+    The index is built from the database on first use and then kept up to
+    date by the Product save/delete signals.
+
+    Signals only fire in the process making the change, so they also publish
+    a new catalog version token in the shared ``catalog`` cache (the process
+    publishing it adopts it, its own index being up to date already). Other
+    processes compare it with the token their index was built at, at most
+    every ``check_interval`` seconds, and rebuild when it differs. Changes
+    that send no signal (``QuerySet.update``, raw SQL) or come from another
+    host are picked up by the rebuild done every ``max_age`` seconds. So a
+    search sees a catalog change about ``check_interval`` seconds late (plus
+    the time to rebuild), or ``max_age`` seconds for changes made without
+    signals.
+
+    Only the first build happens on a searching thread. Later rebuilds run
+    in a background thread while searches keep using the current index; the
+    new one is swapped in when complete, with the ``add``/``remove`` calls
+    made meanwhile applied to it.
+
+    For typo-tolerant search it also keeps a trigram inverted index
+    (trigram -> product ids), see ``fuzzy_search``.
+    """
+
+    # Fuzzy search: minimum share of the query's trigrams a name must contain
+    fuzzy_threshold = 0.5
+    # Fuzzy search: at most this many candidates are scored per query
+    fuzzy_max_candidates = 500
+    # Fuzzy search: trigrams occurring in more products than this are too
+    # common to narrow anything down and are skipped when rarer ones exist
+    fuzzy_max_posting = 20000
+    # Fuzzy search: shorter queries fall back to prefix search
+    fuzzy_min_length = 3
+
+    # Shared cache key of the catalog version token
+    token_key = "product-catalog:version"
+
+    def __init__(self, cache_alias='catalog', check_interval=1, max_age=300):
+        self.cache_alias = cache_alias
+        self.check_interval = check_interval
+        self.max_age = max_age
+        # Guards the index; held only briefly, never while reading the database
+        self._lock = threading.RLock()
+        # One build at a time
+        self._build_lock = threading.Lock()
+        self._keys = []
+        self._names = {}
+        self._postings = {}
+        self._trigram_counts = {}
+        self._loaded = False
+        # Catalog version token the index was built at, and when it was built and last checked
+        self._token = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        # While a build runs: the token it started at, and the changes to apply to it
+        self._build_token = None
+        self._pending = None
+        self._rebuilder = None
+        # Bumped on every catalog change, so caches of results can tell they're stale
+        self.version = 0
+
+    def ensure_loaded(self):
+        """Build the index on first use, and start a rebuild if it may be out of date."""
+        if not self._loaded:
+            with self._build_lock:
+                if not self._loaded:
+                    self._rebuild()
+            return
+        now = time.monotonic()
+        if now - self._built_at >= self.max_age:
+            self._rebuild_in_background()
+        elif now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            if caches[self.cache_alias].get(self.token_key) != self._token:
+                self._rebuild_in_background()
+
+    def publish_change(self):
+        """Tell the other processes' indexes that the catalog changed (after the change is committed).
+
+        The caller has applied the change to this index with ``add``/``remove``,
+        so this index takes the new token too, unless another process had
+        already moved the token on.
+        """
+        cache = caches[self.cache_alias]
+        token = uuid.uuid4().hex
+        with self._lock:
+            current = cache.get(self.token_key)
+            cache.set(self.token_key, token, timeout=None)
+            if self._loaded and current == self._token:
+                self._token = token
+            if self._pending is not None and current == self._build_token:
+                self._build_token = token
+
+    def rebuild(self):
+        """Reload the whole index from the Product table, then swap it in."""
+        with self._build_lock:
+            self._rebuild()
+
+    def _rebuild_in_background(self):
+        with self._lock:
+            if self._rebuilder is not None and self._rebuilder.is_alive():
+                return
+            self._rebuilder = threading.Thread(
+                target=self._background_rebuild, name="product-index-rebuild", daemon=True,
+            )
+            self._rebuilder.start()
+
+    def _background_rebuild(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("Failed to rebuild the product index")
+        finally:
+            connection.close()
+
+    def _rebuild(self):
+        with self._lock:
+            # Read before the rows: a change committed meanwhile publishes a newer token
+            self._build_token = caches[self.cache_alias].get(self.token_key)
+            self._pending = []
+        started = time.monotonic()
+        try:
+            names = dict(Product.objects.values_list('id', 'name').iterator(chunk_size=5000))
+            keys = sorted((normalize(name), product_id) for product_id, name in names.items())
+            postings = {}
+            trigram_counts = {}
+            for key, product_id in keys:
+                _index_trigrams(postings, trigram_counts, product_id, key)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._names = names
+            self._keys = keys
+            self._postings = postings
+            self._trigram_counts = trigram_counts
+            self._loaded = True
+            for product_id, name in self._pending:
+                if name is None:
+                    self._remove(product_id)
+                else:
+                    self._add(product_id, name)
+            self._pending = None
+            self._token = self._build_token
+            self._built_at = self._checked_at = started
+            self.version += 1
+
+    def add(self, product_id, name):
+        """Insert or rename a product."""
+        with self._lock:
+            self.version += 1
+            if self._pending is not None:
+                self._pending.append((product_id, name))
+            if self._loaded:
+                self._add(product_id, name)
+
+    def remove(self, product_id):
+        with self._lock:
+            self.version += 1
+            if self._pending is not None:
+                self._pending.append((product_id, None))
+            if self._loaded:
+                self._remove(product_id)
+
+    def _add(self, product_id, name):
+        self._remove(product_id)
+        self._names[product_id] = name
+        key = normalize(name)
+        insort(self._keys, (key, product_id))
+        _index_trigrams(self._postings, self._trigram_counts, product_id, key)
+
+    def _remove(self, product_id):
+        name = self._names.pop(product_id, None)
+        if name is None:
+            return
+        key = (normalize(name), product_id)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+        _unindex_trigrams(self._postings, self._trigram_counts, product_id, key[0])
+
+    def search(self, query, limit=10):
+        """Return up to ``limit`` products whose name starts with ``query``."""
+        prefix = normalize(query)
+        self.ensure_loaded()
+        with self._lock:
+            keys = self._keys
+            names = self._names
+            matches = []
+            position = bisect_left(keys, (prefix,))
+            while position < len(keys) and len(matches) < limit:
+                key, product_id = keys[position]
+                if not key.startswith(prefix):
+                    break
+                matches.append({"id": product_id, "name": names[product_id]})
+                position += 1
+        return matches
+
+    def fuzzy_search(self, query, limit=10):
+        """Return up to ``limit`` products whose name resembles ``query``.
+
+        Candidates are the products sharing the most trigrams with the query,
+        looked up in the inverted index, so only a bounded set of names is
+        ever scored. They must contain at least ``fuzzy_threshold`` of the
+        query's trigrams and are ranked by that share, then by trigram
+        (Jaccard) similarity of the whole name.
+        """
+        query = normalize(query)
+        # One or two characters say too little for similarity ranking
+        if len(query) < self.fuzzy_min_length:
+            return self.search(query, limit=limit)
+        query_grams = trigrams(query)
+
+        self.ensure_loaded()
+        with self._lock:
+            postings = sorted(
+                (self._postings[gram] for gram in query_grams if gram in self._postings),
+                key=len,
+            )
+            selective = [posting for posting in postings if len(posting) <= self.fuzzy_max_posting]
+            hits = Counter()
+            if selective:
+                for posting in selective:
+                    hits.update(posting)
+            elif postings:
+                hits.update(islice(postings[0], self.fuzzy_max_posting))
+
+            candidates = heapq.nlargest(self.fuzzy_max_candidates, hits, key=hits.__getitem__)
+            scored = []
+            for product_id in candidates:
+                # Exact count, including the common trigrams skipped above
+                shared = sum(product_id in posting for posting in postings)
+                containment = shared / len(query_grams)
+                if containment < self.fuzzy_threshold:
+                    continue
+                similarity = shared / (len(query_grams) + self._trigram_counts[product_id] - shared)
+                scored.append((-containment, -similarity, self._names[product_id], product_id))
+
+            return [
+                {"id": product_id, "name": name}
+                for _, _, name, product_id in heapq.nsmallest(limit, scored)
+            ]
+
+    def __len__(self):
+        self.ensure_loaded()
+        with self._lock:
+            return len(self._keys)
+
+
+class SearchCache:
+    """Bounded LRU cache of search results with a TTL.
+
+    Entries are keyed by ``(mode, normalized query, limit)`` and dropped as
+    soon as the index's version changes. A prefix query that misses can often
+    still be answered from a cached shorter prefix: if that result wasn't cut
+    off by its limit it holds every match of the shorter prefix, so the
+    matches of the longer one are just a filter of it.
+    """
+
+    def __init__(self, index, max_entries=10000, ttl=60):
+        self.index = index
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # normalized prefix -> key of a cached, complete prefix result
+        self._complete_prefixes = {}
+        self._version = None
+        self.hits = 0
+        self.derived_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _check_version(self):
+        if self._version != self.index.version:
+            self._entries.clear()
+            self._complete_prefixes.clear()
+            self._version = self.index.version
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, results = entry
+        if expires < now:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return results
+
+    def _drop(self, key):
+        del self._entries[key]
+        mode, query, limit = key
+        if self._complete_prefixes.get(query) == key:
+            del self._complete_prefixes[query]
+
+    def _derive(self, query, limit, now):
+        """Filter the cached complete result of the longest cached shorter prefix."""
+        for length in range(len(query) - 1, -1, -1):
+            key = self._complete_prefixes.get(query[:length])
+            if key is None:
+                continue
+            results = self._get(key, now)
+            if results is None:
+                continue
+            return [match for match in results if normalize(match["name"]).startswith(query)][:limit]
+        return None
+
+    def _put(self, key, results, now):
+        self._entries[key] = (now + self.ttl, results)
+        self._entries.move_to_end(key)
+        mode, query, limit = key
+        if mode == "prefix" and len(results) < limit:
+            self._complete_prefixes[query] = key
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def search(self, query, limit=10, mode="prefix"):
+        query = normalize(query)
+        key = (mode, query, limit)
+        now = time.monotonic()
+        # Loading the index bumps its version, so do it before reading that
+        self.index.ensure_loaded()
+        with self._lock:
+            self._check_version()
+            results = self._get(key, now)
+            if results is not None:
+                self.hits += 1
+                return results
+            if mode == "prefix":
+                results = self._derive(query, limit, now)
+                if results is not None:
+                    self.derived_hits += 1
+                    self._put(key, results, now)
+                    return results
+            self.misses += 1
+            version = self.index.version
+
+        if mode == "fuzzy":
+            results = self.index.fuzzy_search(query, limit=limit)
+        else:
+            results = self.index.search(query, limit=limit)
+
+        with self._lock:
+            self._check_version()
+            # Don't cache a result computed against a catalog that has changed since
+            if version == self._version:
+                self._put(key, results, now)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._complete_prefixes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.derived_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "derived_hits": self.derived_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.derived_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+product_index = ProductIndex(
+    check_interval=getattr(settings, 'PRODUCT_INDEX_CHECK_INTERVAL', 1),
+    max_age=getattr(settings, 'PRODUCT_INDEX_MAX_AGE', 300),
+)
+search_cache = SearchCache(
+    product_index,
+    max_entries=getattr(settings, 'PRODUCT_SEARCH_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'PRODUCT_SEARCH_CACHE_TTL', 60),
+)
@@ -1,5 +1,11 @@
+import functools
+
+from django.db import connection, connections, transaction
+from django.utils import timezone
 from rest_framework import serializers
+from .datetimes import isoformat
 from .models import Order
+from .rollups import record_transition
 
 class OrderItemSerializer(serializers.Serializer):
     id = serializers.IntegerField()
@@ -12,6 +18,88 @@ class OrderItemSerializer(serializers.Serializer):
         model = Order
         fields = ['user_id', 'item_id', 'item_name', 'item_quantity', 'status', 'created_on']
 
+# Columns of a listing row, in OrderItemSerializer's field order
+ORDER_LIST_FIELDS = ('id', 'item_name', 'item_quantity', 'created_on', 'status')
+
+
+def order_list_data(rows):
+    """Fast path for ``OrderItemSerializer(orders, many=True).data``.
+
+    Takes ``values_list(*ORDER_LIST_FIELDS, ...)`` tuples rather than model
+    instances (columns after the listed ones are ignored) and builds the same
+    dicts directly, without DRF's per-field machinery.
+    """
+    # Dates as DRF's DateTimeField outputs them: ISO 8601 in the current time zone, UTC as "Z"
+    current = timezone.get_current_timezone()
+    data = []
+    for order_id, item_name, item_quantity, created_on, order_status, *_ in rows:
+        data.append({
+            'id': order_id,
+            'item_name': item_name,
+            'item_quantity': item_quantity,
+            'created_on': isoformat(created_on.astimezone(current)),
+            'status': order_status,
+        })
+    return data
+
+
+class OrderListSerializer(serializers.ListSerializer):
+    """Creates all items of a cart in one INSERT inside one transaction.
+
+    On MySQL, which can't return the new ids, they are worked out from the
+    first one; that needs innodb_autoinc_lock_mode 0 or 1, so under mode 2
+    each item gets an INSERT of its own. Every item has already been
+    validated by ``is_valid()``, so either the whole cart is stored or none
+    of it is.
+    """
+
+    def create(self, validated_data):
+        user_id = self.context.get('user_id')
+        username = self.context.get('username')
+        if not user_id or not username:
+            raise serializers.ValidationError("User info missing")
+
+        orders = [Order(user_id=user_id, username=username, **item) for item in validated_data]
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Order.objects.bulk_create(orders)
+            else:
+                step = _consecutive_id_step(connection.alias)
+                if step is None:
+                    # The ids of one INSERT may interleave with other inserts': no way to tell them
+                    for order in orders:
+                        order.save(force_insert=True)
+                else:
+                    # One multi-row INSERT, whose first id MySQL reports
+                    Order.objects.bulk_create(orders)
+                    first_id = _last_insert_id(connection.alias)
+                    for index, order in enumerate(orders):
+                        order.id = first_id + index * step
+            record_transition(None, "Pending", len(orders))
+        return orders
+
+
+@functools.lru_cache
+def _consecutive_id_step(alias):
+    """Step between the ids of one multi-row INSERT on a MySQL database.
+
+    None if they may not be consecutive. With innodb_autoinc_lock_mode 0 or 1, a multi-row INSERT gets a
+    consecutive block of ids, ``auto_increment_increment`` apart. Mode 2
+    (MySQL 8's default) doesn't promise that under concurrent inserts.
+    """
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+        lock_mode, step = cursor.fetchone()
+    return step if lock_mode <= 1 else None
+
+
+def _last_insert_id(alias):
+    """First id generated by the last INSERT on this thread's connection to ``alias``."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT LAST_INSERT_ID()")
+        return cursor.fetchone()[0]
+
+
 class OrderSerializer(serializers.ModelSerializer):
     item_id = serializers.IntegerField()
     item_quantity = serializers.IntegerField()
@@ -19,14 +107,18 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['item_id', 'item_name', 'item_quantity']
+        list_serializer_class = OrderListSerializer
 
     def create(self, validated_data):
         user_id = self.context.get('user_id')
         username = self.context.get('username')
         if not user_id or not username:
             raise serializers.ValidationError("User info missing")
-        return Order.objects.create(
-            user_id=user_id,
-            username=username,
-            **validated_data
-        )
\ No newline at end of file
+        with transaction.atomic():
+            order = Order.objects.create(
+                user_id=user_id,
+                username=username,
+                **validated_data
+            )
+            record_transition(None, order.status, 1)
+        return order
\ No newline at end of file
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Order, Product
+from .order_cache import order_list_cache
+from .rollups import record_transition
+from .search import product_index
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    def update():
+        product_index.add(instance.id, instance.name)
+        product_index.publish_change()
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    product_id = instance.id
+
+    def update():
+        product_index.remove(product_id)
+        product_index.publish_change()
+    transaction.on_commit(update)
+
+
+@receiver(post_delete, sender=Order)
+def uncount_order(sender, instance, **kwargs):
+    # Orders are only deleted through the ORM (shell, scripts): keep the
+    # status rollups and the listings' versions exact anyway
+    record_transition(instance.status, None)
+    order_list_cache.invalidate(instance.username)
@@ -0,0 +1,39 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from asgiref.sync import async_to_sync
+from channels.layers import DEFAULT_CHANNEL_LAYER, channel_layers
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class InventoryTestRunner(DiscoverRunner):
+    """Runs the tests with the channel broker socket and file caches in a temporary directory.
+
+    The default socket and cache directories are shared by every process on
+    the host: tests would join a running development server's broker and
+    clear its caches (and parallel test runs each other's).
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._tempdir = tempfile.mkdtemp(prefix="inventory-tests-")
+        layers = copy.deepcopy(settings.CHANNEL_LAYERS)
+        layers[DEFAULT_CHANNEL_LAYER]['CONFIG']['path'] = os.path.join(self._tempdir, 'channels.sock')
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, cache in caches.items():
+            if cache['BACKEND'].endswith('FileBasedCache'):
+                cache['LOCATION'] = os.path.join(self._tempdir, f'cache-{alias}')
+        self._isolation = override_settings(CHANNEL_LAYERS=layers, CACHES=caches)
+        self._isolation.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        layer = channel_layers.backends.get(DEFAULT_CHANNEL_LAYER)
+        if layer is not None:
+            async_to_sync(layer.close)()
+        self._isolation.disable()
+        shutil.rmtree(self._tempdir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1363 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from asgiref.sync import async_to_sync
+from channels.exceptions import ChannelFull
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Count, Max, Q, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .apps import start_order_consumer
+from .authentication import TokenUser, VerifiedTokenCache
+from .channel_layer import ChannelBroker, LocalBrokerChannelLayer, _recv_frame, _send_frame
+from .consumer import ConsumeOrders
+from .export import EXPORT_FIELDS
+from .file_cache import FileBasedCache
+from .logs import JsonFormatter
+from .metrics import Counter, Histogram, Registry, websocket_connections
+from .models import Order, OrderStatusBucket, OrderStatusCount, Product, QueuedOrder
+from .order_cache import OrderListCache, order_list_cache
+from .order_queue import DatabaseOrderQueue
+from .pagination import encode_cursor
+from .rollups import record_transition
+from .search import ProductIndex, SearchCache, product_index
+from .serializers import (
+    ORDER_LIST_FIELDS, OrderItemSerializer, OrderSerializer, _consecutive_id_step, order_list_data,
+)
+from .websocket_consumer import AdminOrderConsumer
+
+
+def make_order(**kwargs):
+    fields = {
+        'user_id': 1,
+        'username': 'alice',
+        'item_id': 1,
+        'item_name': 'apple',
+        'item_quantity': 1,
+    }
+    fields.update(kwargs)
+    return Order.objects.create(**fields)
+
+
+def auth_headers(user_id=1, username='alice', is_admin=False):
+    claims = {'user_id': user_id, 'username': username, 'is_admin': is_admin}
+    token = jwt.encode(claims, settings.SECRET_KEY, algorithm='HS256')
+    return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+
+def admin_headers():
+    return auth_headers(user_id=99, username='admin', is_admin=True)
+
+
+class VerifiedTokenCacheTests(TestCase):
+    def setUp(self):
+        self.cache = VerifiedTokenCache(max_entries=2)
+
+    def token(self, user_id=1, lifetime=60):
+        payload = {'user_id': user_id, 'username': 'alice', 'exp': int(time.time()) + lifetime}
+        return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+    def test_repeated_token_is_decoded_once(self):
+        token = self.token(user_id=7)
+        with mock.patch('inventory.authentication.jwt.decode', wraps=jwt.decode) as decode:
+            first = self.cache.authenticate(token)
+            second = self.cache.authenticate(token)
+        self.assertEqual(decode.call_count, 1)
+        self.assertIsInstance(first, TokenUser)
+        self.assertEqual((first.id, second.id), (7, 7))
+        self.assertEqual((first.username, first.is_admin), ('alice', False))
+        self.assertTrue(first.is_authenticated)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["hit_ratio"]), (1, 1, 0.5))
+
+    def test_entry_is_dropped_at_token_expiry(self):
+        token = self.token(lifetime=60)
+        self.cache.authenticate(token)
+        # Past exp the token must go through jwt.decode again, which rejects it
+        with mock.patch('inventory.authentication.time.time', return_value=time.time() + 120), \
+                mock.patch('inventory.authentication.jwt.decode', side_effect=jwt.ExpiredSignatureError):
+            with self.assertRaises(jwt.ExpiredSignatureError):
+                self.cache.authenticate(token)
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_size_is_bounded(self):
+        for user_id in range(1, 5):
+            self.cache.authenticate(self.token(user_id=user_id))
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_invalid_tokens_and_tokens_without_expiry_are_not_cached(self):
+        forged = jwt.encode({'user_id': 1, 'username': 'alice', 'exp': int(time.time()) + 60}, 'not-the-key', algorithm='HS256')
+        with self.assertRaises(jwt.InvalidSignatureError):
+            self.cache.authenticate(forged)
+        self.cache.authenticate(jwt.encode({'user_id': 1, 'username': 'alice'}, settings.SECRET_KEY, algorithm='HS256'))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_token_without_username_claim_is_rejected(self):
+        token = jwt.encode({'user_id': 1}, settings.SECRET_KEY, algorithm='HS256')
+        response = self.client.get('/api/orders/user/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_view_rejects_expired_token(self):
+        token = self.token(lifetime=-1)
+        response = self.client.get('/api/orders/user/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["detail"], "Token expired")
+
+
+class DatabaseOrderQueueTests(TestCase):
+    def setUp(self):
+        self.queue = DatabaseOrderQueue()
+
+    def test_put_is_idempotent(self):
+        order = make_order(status="Processing")
+        self.queue.put(order.id)
+        self.queue.put(order.id)
+        self.assertEqual(self.queue.qsize(), 1)
+
+    def test_claim_returns_oldest_entry_once(self):
+        first = make_order(status="Processing")
+        second = make_order(status="Processing")
+        self.queue.put(first.id)
+        self.queue.put(second.id)
+
+        entry_a = self.queue.claim('worker-a')
+        entry_b = self.queue.claim('worker-b')
+
+        self.assertEqual(entry_a.order_id, first.id)
+        self.assertEqual(entry_b.order_id, second.id)
+        self.assertIsNone(self.queue.claim('worker-c'))
+
+    def test_expired_lease_can_be_reclaimed(self):
+        order = make_order(status="Processing")
+        self.queue.put(order.id)
+        self.queue.claim('worker-a')
+        QueuedOrder.objects.update(lease_expires_on=timezone.now() - timedelta(seconds=1))
+
+        entry = self.queue.claim('worker-b')
+
+        self.assertEqual(entry.claimed_by, 'worker-b')
+        self.assertEqual(entry.attempts, 2)
+
+    def test_complete_only_by_claim_holder(self):
+        order = make_order(status="Processing")
+        self.queue.put(order.id)
+        entry = self.queue.claim('worker-a')
+        entry.claimed_by = 'worker-b'
+        self.queue.complete(entry)
+        self.assertEqual(self.queue.qsize(), 1)
+
+    def test_wait_returns_after_commit_notify(self):
+        order = make_order(status="Processing")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.queue.put(order.id)
+        self.assertTrue(self.queue.wait(timeout=5))
+        self.assertFalse(self.queue.wait(timeout=0))
+
+    def test_recover_requeues_orphaned_processing_orders(self):
+        orphan = make_order(status="Processing")
+        make_order(status="Pending")
+
+        self.assertEqual(self.queue.recover(), 1)
+        self.assertEqual(list(QueuedOrder.objects.values_list('order_id', flat=True)), [orphan.id])
+
+
+class ConsumeOrdersTests(TestCase):
+    def setUp(self):
+        self.queue = DatabaseOrderQueue()
+        self.consumer = ConsumeOrders(queue=self.queue)
+        self.consumer.thread_sleep_time = 0
+
+    def test_process_next_marks_order_processed(self):
+        order = make_order(status="Processing")
+        self.queue.put(order.id)
+
+        self.assertTrue(self.consumer.process_next())
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, "Processed")
+        self.assertTrue(self.queue.empty())
+
+    def test_process_next_skips_cancelled_order(self):
+        order = make_order(status="Cancelled")
+        self.queue.put(order.id)
+
+        self.assertTrue(self.consumer.process_next())
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, "Cancelled")
+        self.assertTrue(self.queue.empty())
+
+    def test_process_next_on_empty_queue(self):
+        self.assertFalse(self.consumer.process_next())
+
+
+class ConsumeOrdersPoolTests(TransactionTestCase):
+    def test_workers_process_orders_concurrently(self):
+        queue = DatabaseOrderQueue()
+        consumer = ConsumeOrders(queue=queue, concurrency=3)
+        consumer.thread_sleep_time = 0.3
+        consumer.poll_interval = 0.1
+        orders = [make_order(status="Processing") for _ in range(3)]
+        for order in orders:
+            queue.put(order.id)
+
+        started = time.monotonic()
+        consumer.start()
+        try:
+            while Order.objects.filter(status="Processing").exists():
+                self.assertLess(time.monotonic() - started, 5)
+                time.sleep(0.05)
+        finally:
+            self.assertTrue(consumer.stop(timeout=5))
+
+        # Three orders of 0.3s each, handled in parallel rather than back to back
+        self.assertLess(time.monotonic() - started, 0.9)
+        stats = consumer.stats()
+        self.assertEqual(len(stats), 3)
+        self.assertEqual(sum(worker["processed"] for worker in stats), 3)
+
+
+class InProcessConsumerTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('inventory.apps._consumer_started', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_app_setup_does_not_start_consumer(self):
+        with mock.patch('inventory.consumer.order_consumer') as consumer:
+            apps.get_app_config('inventory').ready()
+        consumer.start.assert_not_called()
+
+    @override_settings(ORDER_CONSUMER_IN_PROCESS=True)
+    def test_server_entry_points_start_consumer_once(self):
+        with mock.patch('inventory.consumer.order_consumer') as consumer:
+            start_order_consumer()
+            start_order_consumer()
+        consumer.start.assert_called_once_with()
+
+    @override_settings(ORDER_CONSUMER_IN_PROCESS=False)
+    def test_consumer_can_be_left_to_worker_processes(self):
+        with mock.patch('inventory.consumer.order_consumer') as consumer:
+            start_order_consumer()
+        consumer.start.assert_not_called()
+
+
+class ProductIndexTests(TestCase):
+    def setUp(self):
+        Product.objects.all().delete()
+        self.index = ProductIndex()
+        for name in ["Apple", "apricot", "Banana", "blueberry", "Apple Juice"]:
+            Product.objects.create(name=name)
+
+    def test_prefix_search_is_case_insensitive_and_sorted(self):
+        names = [match["name"] for match in self.index.search("AP")]
+        self.assertEqual(names, ["Apple", "Apple Juice", "apricot"])
+
+    def test_limit(self):
+        self.assertEqual(len(self.index.search("a", limit=2)), 2)
+        self.assertEqual(len(self.index.search("", limit=3)), 3)
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search("cherry"), [])
+
+    def test_fuzzy_search_tolerates_typos(self):
+        self.assertEqual([match["name"] for match in self.index.search("bluberry")], [])
+        self.assertEqual([match["name"] for match in self.index.fuzzy_search("bluberry")], ["blueberry"])
+        self.assertEqual([match["name"] for match in self.index.fuzzy_search("aple juise")][0], "Apple Juice")
+
+    def test_fuzzy_search_short_query_uses_prefix(self):
+        self.assertEqual(self.index.fuzzy_search("ba"), self.index.search("ba"))
+
+    def test_fuzzy_search_no_match(self):
+        self.assertEqual(self.index.fuzzy_search("xylophone"), [])
+
+    def test_incremental_updates(self):
+        self.index.search("")
+        product = Product.objects.create(name="Cherry")
+        self.index.add(product.id, product.name)
+        self.assertEqual(self.index.search("ch"), [{"id": product.id, "name": "Cherry"}])
+
+        self.index.add(product.id, "Date")
+        self.assertEqual(self.index.search("ch"), [])
+        self.assertEqual(len(self.index), 6)
+
+        self.assertEqual(self.index.fuzzy_search("dat")[0]["name"], "Date")
+
+        self.index.remove(product.id)
+        self.assertEqual(self.index.search("d"), [])
+        self.assertEqual(self.index.fuzzy_search("dat"), [])
+
+    def test_publishing_process_keeps_its_index(self):
+        self.index.check_interval = 0
+        self.index.search("")
+        product = Product.objects.create(name="Cherry")
+        self.index.add(product.id, product.name)
+        self.index.publish_change()
+        with mock.patch.object(self.index, '_rebuild_in_background') as rebuild:
+            self.assertEqual([match["name"] for match in self.index.search("ch")], ["Cherry"])
+        rebuild.assert_not_called()
+
+    def test_changes_made_during_a_rebuild_are_applied_to_the_new_index(self):
+        self.index.search("")
+        product = Product.objects.create(name="Cherry")
+        building = threading.Event()
+        proceed = threading.Event()
+        values_list = Product.objects.values_list
+
+        def slow_values_list(*fields):
+            building.set()
+            proceed.wait(5)
+            return values_list(*fields)
+
+        with mock.patch.object(Product.objects, 'values_list', side_effect=slow_values_list):
+            rebuild = threading.Thread(target=self.index.rebuild)
+            rebuild.start()
+            building.wait(5)
+            # Searches are served by the current index meanwhile
+            self.assertEqual(self.index.search("ch"), [])
+            self.index.add(product.id, "Date")
+            proceed.set()
+            rebuild.join()
+        # TestCase data isn't visible to the rebuild's connection; the replayed add is
+        self.assertEqual([match["name"] for match in self.index.search("d")], ["Date"])
+
+
+class ProductIndexRefreshTests(TransactionTestCase):
+    """Rebuilds run in a thread of their own, so the rows must be committed."""
+
+    def setUp(self):
+        self.index = ProductIndex()
+        for name in ["Apple", "Banana"]:
+            Product.objects.create(name=name)
+        self.index.search("")
+
+    def search(self, query):
+        self.index.search(query)
+        if self.index._rebuilder is not None:
+            self.index._rebuilder.join()
+        return [match["name"] for match in self.index.search(query)]
+
+    def test_changes_made_by_other_processes_are_picked_up(self):
+        self.index.check_interval = 0
+        # As if saved in another process: the signals ran there, not here
+        with mock.patch('inventory.signals.product_index') as other_index:
+            Product.objects.create(name="Cherry")
+        self.assertEqual(self.search("ch"), [])
+        other_index.publish_change.assert_called_once_with()
+
+        ProductIndex().publish_change()
+        self.assertEqual(self.search("ch"), ["Cherry"])
+
+    def test_index_is_rebuilt_when_it_reaches_max_age(self):
+        # No signals: only the periodic rebuild notices
+        Product.objects.filter(name="Banana").update(name="Cherry")
+        self.assertEqual(self.search("ch"), [])
+        self.index.max_age = 0
+        self.assertEqual(self.search("ch"), ["Cherry"])
+
+
+class SearchCacheTests(TestCase):
+    def setUp(self):
+        Product.objects.all().delete()
+        self.index = ProductIndex()
+        for name in ["apple", "apple juice", "apricot", "banana"]:
+            Product.objects.create(name=name)
+        self.cache = SearchCache(self.index, max_entries=3, ttl=60)
+
+    def test_hit_and_miss(self):
+        first = self.cache.search("Ba")
+        second = self.cache.search("ba ")
+        self.assertEqual(first, second)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_longer_prefix_derived_from_complete_shorter_prefix(self):
+        self.cache.search("ap")
+        with mock.patch.object(self.index, 'search') as index_search:
+            results = self.cache.search("app")
+        index_search.assert_not_called()
+        self.assertEqual([match["name"] for match in results], ["apple", "apple juice"])
+        self.assertEqual(self.cache.stats()["derived_hits"], 1)
+
+    def test_truncated_prefix_result_is_not_used_for_derivation(self):
+        self.cache.search("ap", limit=2)
+        self.assertEqual([match["name"] for match in self.cache.search("apr")], ["apricot"])
+        self.assertEqual(self.cache.stats()["derived_hits"], 0)
+
+    def test_lru_eviction(self):
+        for query in ["apple", "banana", "apricot", "cherry"]:
+            self.cache.search(query, mode="fuzzy")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertEqual(self.cache.stats()["entries"], 3)
+
+    def test_ttl_expiry(self):
+        self.cache.ttl = 0
+        self.cache.search("ba")
+        self.cache.search("ba")
+        self.assertEqual(self.cache.stats()["hits"], 0)
+
+    def test_catalog_change_invalidates(self):
+        self.assertEqual(self.cache.search("ch"), [])
+        product = Product.objects.create(name="cherry")
+        self.index.add(product.id, product.name)
+        self.assertEqual(self.cache.search("ch"), [{"id": product.id, "name": "cherry"}])
+
+
+class ProductSearchViewTests(TestCase):
+    def setUp(self):
+        product_index.rebuild()
+
+    def test_search_uses_catalog(self):
+        response = self.client.get('/api/products/search/', {'search': 'ap'}, **auth_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([match["name"] for match in response.data["message"]], ["apple", "apricot"])
+
+    def test_signals_keep_index_in_sync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name="Apple Pie")
+        response = self.client.get('/api/products/search/', {'search': 'apple', 'limit': 1}, **auth_headers())
+        self.assertEqual(len(response.data["message"]), 1)
+
+        response = self.client.get('/api/products/search/', {'search': 'apple p'}, **auth_headers())
+        self.assertEqual(response.data["message"], [{"id": product.id, "name": "Apple Pie"}])
+
+    def test_fuzzy_mode(self):
+        response = self.client.get('/api/products/search/', {'search': 'bluberry', 'mode': 'fuzzy'}, **auth_headers())
+        self.assertEqual([match["name"] for match in response.data["message"]], ["blueberry"])
+
+    def test_invalid_mode(self):
+        response = self.client.get('/api/products/search/', {'search': 'a', 'mode': 'regex'}, **auth_headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_limit(self):
+        response = self.client.get('/api/products/search/', {'search': 'a', 'limit': 'x'}, **auth_headers())
+        self.assertEqual(response.status_code, 400)
+
+
+class OrderListingPaginationTests(TestCase):
+    def setUp(self):
+        order_list_cache.clear()
+        base = timezone.now() - timedelta(days=1)
+        self.orders = []
+        for index in range(5):
+            order = make_order(username='alice' if index % 2 else 'bob', status="Pending" if index < 3 else "Processed")
+            Order.objects.filter(id=order.id).update(created_on=base + timedelta(minutes=index // 2))
+            self.orders.append(order)
+
+    def fetch_all(self, url, **params):
+        ids = []
+        cursor = None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            headers = admin_headers() if url.startswith('/api/admin/') else auth_headers()
+            response = self.client.get(url, params, **headers)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(order["id"] for order in response.json()["orders"])
+            cursor = response.json()["next_cursor"]
+            if not cursor:
+                return ids
+
+    def test_pages_cover_all_orders_newest_first(self):
+        ids = self.fetch_all('/api/admin/orders/', limit=2)
+        # Ties on created_on are broken by id, descending
+        self.assertEqual(ids, [order.id for order in reversed(self.orders)])
+
+    def test_filters(self):
+        self.assertEqual(len(self.fetch_all('/api/admin/orders/', status='Pending')), 3)
+        self.assertEqual(len(self.fetch_all('/api/admin/orders/', username='alice')), 2)
+        self.assertEqual(len(self.fetch_all('/api/admin/orders/', status='Pending,Processed', username='bob')), 3)
+        tomorrow = (timezone.now() + timedelta(days=1)).date().isoformat()
+        self.assertEqual(len(self.fetch_all('/api/admin/orders/', created_after=tomorrow)), 0)
+        self.assertEqual(len(self.fetch_all('/api/admin/orders/', created_before=tomorrow)), 5)
+
+    def test_user_orders_are_scoped_to_user(self):
+        ids = self.fetch_all('/api/orders/user/', limit=1, username='bob')
+        self.assertEqual(ids, [order.id for order in reversed(self.orders) if order.username == 'alice'])
+
+    def test_page_query_does_not_use_offset(self):
+        response = self.client.get('/api/admin/orders/', {'limit': 2}, **admin_headers())
+        # The ETag's latest change and rollup total, then the page itself
+        with self.assertNumQueries(3) as queries:
+            self.client.get('/api/admin/orders/', {'limit': 2, 'cursor': response.json()["next_cursor"]}, **admin_headers())
+        self.assertNotIn('OFFSET', queries.captured_queries[-1]['sql'].upper())
+
+    def test_invalid_parameters(self):
+        for params in ({'cursor': 'garbage'}, {'limit': 'x'}, {'created_after': 'yesterday'}):
+            response = self.client.get('/api/admin/orders/', params, **admin_headers())
+            self.assertEqual(response.status_code, 400)
+
+
+class OrderChangesTests(TestCase):
+    url = '/api/admin/orders/changes/'
+
+    def get(self, **params):
+        response = self.client.get(self.url, params, **admin_headers())
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_changes_since_watermark(self):
+        old = make_order()
+        Order.objects.filter(id=old.id).update(updated_on=timezone.now() - timedelta(minutes=5))
+        start = self.get()
+        self.assertEqual(start["orders"], [])
+
+        changed = make_order()
+        data = self.get(since=start["watermark"])
+        self.assertEqual([order["id"] for order in data["orders"]], [changed.id])
+
+        # Status changes show up again
+        self.client.post(f'/api/admin/orders/{old.id}/cancel/', **admin_headers())
+        data = self.get(since=start["watermark"])
+        self.assertEqual({order["id"] for order in data["orders"]}, {old.id, changed.id})
+
+    def test_watermark_advances_past_settled_changes(self):
+        earlier = timezone.now() - timedelta(minutes=5)
+        orders = [make_order() for _ in range(3)]
+        for index, order in enumerate(orders):
+            Order.objects.filter(id=order.id).update(updated_on=earlier + timedelta(seconds=index))
+        since = encode_cursor(earlier - timedelta(seconds=1), 0)
+
+        data = self.get(since=since, limit=2)
+        self.assertEqual([order["id"] for order in data["orders"]], [orders[0].id, orders[1].id])
+        self.assertTrue(data["has_more"])
+
+        data = self.get(since=data["watermark"], limit=2)
+        self.assertEqual([order["id"] for order in data["orders"]], [orders[2].id])
+        self.assertFalse(data["has_more"])
+        self.assertEqual(self.get(since=data["watermark"])["orders"], [])
+
+    def test_recent_changes_are_resent_within_grace_window(self):
+        start = self.get()
+        order = make_order()
+        first = self.get(since=start["watermark"])
+        second = self.get(since=first["watermark"])
+        self.assertEqual([o["id"] for o in second["orders"]], [order.id])
+
+    def test_consumer_updates_change_timestamp(self):
+        order = make_order(status="Processing")
+        Order.objects.filter(id=order.id).update(updated_on=timezone.now() - timedelta(minutes=5))
+        queue = DatabaseOrderQueue()
+        queue.put(order.id)
+        consumer = ConsumeOrders(queue=queue)
+        consumer.thread_sleep_time = 0
+        consumer.process_next()
+        order.refresh_from_db()
+        self.assertGreater(order.updated_on, timezone.now() - timedelta(minutes=1))
+
+
+class ConditionalListingTests(TestCase):
+    def setUp(self):
+        order_list_cache.clear()
+        self.orders = [make_order() for _ in range(30)]
+
+    def test_unchanged_poll_is_a_304_after_one_query(self):
+        response = self.client.get('/api/orders/user/', **auth_headers())
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        # Without the page cache, the ETag aggregate alone answers the poll
+        with mock.patch.object(order_list_cache, 'get', mock.AsyncMock(return_value=None)):
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/orders/user/', HTTP_IF_NONE_MATCH=etag, **auth_headers())
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+
+    def test_change_committed_after_a_later_one_changes_the_etag(self):
+        admin_etag = self.client.get('/api/admin/orders/', **admin_headers())['ETag']
+        user_etag = self.client.get('/api/orders/user/', **auth_headers())['ETag']
+        # Stamped before the latest updated_on, committed after it: neither
+        # Max(updated_on) nor the count changes
+        order = self.orders[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(id=order.id).update(status="Processed", updated_on=order.created_on)
+            order_list_cache.invalidate(order.username)
+        response = self.client.get('/api/admin/orders/', HTTP_IF_NONE_MATCH=admin_etag, **admin_headers())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/orders/user/', HTTP_IF_NONE_MATCH=user_etag, **auth_headers())
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_with_orders_and_parameters(self):
+        etag = self.client.get('/api/admin/orders/', **admin_headers())['ETag']
+        self.assertNotEqual(self.client.get('/api/admin/orders/', {'limit': 5}, **admin_headers())['ETag'], etag)
+
+        self.client.post(f'/api/admin/orders/{self.orders[0].id}/cancel/', **admin_headers())
+        response = self.client.get('/api/admin/orders/', HTTP_IF_NONE_MATCH=etag, **admin_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        Order.objects.filter(id=self.orders[1].id).delete()
+        self.assertNotEqual(self.client.get('/api/admin/orders/', **admin_headers())['ETag'], response['ETag'])
+
+    def test_unfiltered_admin_listing_does_not_count_every_order(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/admin/orders/', **admin_headers())
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/admin/orders/', {'status': 'Pending'}, **admin_headers())
+        self.assertTrue(any('COUNT(' in query['sql'] for query in queries.captured_queries))
+
+    def test_users_do_not_share_etags(self):
+        make_order(username='bob')
+        alice = self.client.get('/api/orders/user/', **auth_headers(username='alice'))['ETag']
+        response = self.client.get('/api/orders/user/', HTTP_IF_NONE_MATCH=alice, **auth_headers(username='bob'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_large_bodies_are_gzipped_small_ones_are_not(self):
+        response = self.client.get('/api/admin/orders/', HTTP_ACCEPT_ENCODING='gzip, br', **admin_headers())
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertTrue(response['ETag'].startswith('W/'))
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))["orders"]), 30)
+        # And the weakened ETag still validates
+        response = self.client.get('/api/admin/orders/', HTTP_IF_NONE_MATCH=response['ETag'],
+                                   HTTP_ACCEPT_ENCODING='gzip', **admin_headers())
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/api/admin/orders/', {'limit': 1}, HTTP_ACCEPT_ENCODING='gzip', **admin_headers())
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_brotli_when_available(self):
+        fake_brotli = mock.Mock(compress=lambda data, quality: b'br:' + data[:10])
+        with mock.patch('inventory.compression.brotli', fake_brotli):
+            response = self.client.get('/api/admin/orders/', HTTP_ACCEPT_ENCODING='gzip, br', **admin_headers())
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertTrue(response.content.startswith(b'br:'))
+
+
+class OrderListCacheTests(TestCase):
+    url = '/api/orders/user/'
+
+    def setUp(self):
+        order_list_cache.clear()
+        self.order = make_order(status="Pending")
+
+    def listed(self, username='alice'):
+        response = self.client.get(self.url, **auth_headers(username=username))
+        self.assertEqual(response.status_code, 200)
+        return {order["id"]: order["status"] for order in response.json()["orders"]}
+
+    def test_repeated_listing_is_served_without_queries(self):
+        first = self.client.get(self.url, {'limit': 10}, **auth_headers())
+        before = order_list_cache.stats()
+        with self.assertNumQueries(0):
+            second = self.client.get(self.url, {'limit': 10}, **auth_headers())
+            not_modified = self.client.get(self.url, {'limit': 10}, HTTP_IF_NONE_MATCH=first['ETag'], **auth_headers())
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        after = order_list_cache.stats()
+        self.assertEqual(after["hits"] - before["hits"], 2)
+        self.assertEqual(after["misses"], before["misses"])
+
+    def test_pages_and_users_are_cached_separately(self):
+        make_order(username='bob')
+        self.assertEqual(len(self.client.get(self.url, {'limit': 1}, **auth_headers()).json()["orders"]), 1)
+        self.assertEqual(list(self.listed()), [self.order.id])
+        self.assertNotIn(self.order.id, self.listed(username='bob'))
+
+    def test_save_order_invalidates(self):
+        self.listed()
+        response = self.client.post('/api/orders/', [{"item_id": 2, "item_name": "pear", "item_quantity": 1}],
+                                    content_type='application/json', **auth_headers())
+        self.assertEqual(set(self.listed()), {self.order.id, *response.json()["order_ids"]})
+
+    def test_admin_actions_invalidate(self):
+        self.listed()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/admin/orders/{self.order.id}/accept/', **admin_headers())
+        self.assertEqual(self.listed()[self.order.id], "Processing")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/admin/orders/{self.order.id}/cancel/', **admin_headers())
+        self.assertEqual(self.listed()[self.order.id], "Cancelled")
+
+    def test_consumer_invalidates(self):
+        order = make_order(status="Processing")
+        queue = DatabaseOrderQueue()
+        queue.put(order.id)
+        consumer = ConsumeOrders(queue=queue)
+        consumer.thread_sleep_time = 0
+        self.listed()
+        with self.captureOnCommitCallbacks(execute=True):
+            consumer.process_next()
+        self.assertEqual(self.listed()[order.id], "Processed")
+
+    def test_invalidation_waits_for_commit(self):
+        cache = OrderListCache()
+        version = async_to_sync(cache.version)('alice')
+        with self.captureOnCommitCallbacks() as callbacks:
+            cache.invalidate('alice')
+            self.assertEqual(async_to_sync(cache.version)('alice'), version)
+        callbacks[0]()
+        self.assertNotEqual(async_to_sync(cache.version)('alice'), version)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_cache_directory_is_not_listed_on_every_write(self):
+        tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tempdir.cleanup)
+        cache = FileBasedCache(tempdir.name, {'OPTIONS': {'MAX_ENTRIES': 2, 'CULL_INTERVAL': 60}})
+        with mock.patch.object(cache, '_list_cache_files', wraps=cache._list_cache_files) as listing:
+            for number in range(5):
+                cache.set(f'key-{number}', number)
+        self.assertEqual(listing.call_count, 1)
+        self.assertEqual(cache.get('key-4'), 4)
+
+        # Culled again once the interval has passed
+        cache.cull_interval = 0
+        with mock.patch('inventory.file_cache._next_cull', {}):
+            cache.set('key-5', 5)
+        self.assertLess(len(cache._list_cache_files()), 6)
+
+
+class OrderRollupTests(TestCase):
+    url = '/api/admin/orders/stats/'
+
+    def counts(self):
+        return dict(OrderStatusCount.objects.values_list('status', 'count'))
+
+    def source_counts(self):
+        counts = dict.fromkeys(("Pending", "Processing", "Processed", "Cancelled"), 0)
+        counts.update(Order.objects.order_by().values_list('status').annotate(Count('id')))
+        return counts
+
+    def create_orders(self, size):
+        response = self.client.post('/api/orders/', [{"item_id": 1, "item_name": "apple", "item_quantity": 1}] * size,
+                                    content_type='application/json', **auth_headers())
+        return response.json()["order_ids"]
+
+    def test_transitions_keep_counters_in_step_with_orders(self):
+        ids = self.create_orders(4)
+        self.client.post(f'/api/admin/orders/{ids[0]}/accept/', **admin_headers())
+        self.client.post(f'/api/admin/orders/{ids[1]}/accept/', **admin_headers())
+        self.client.post(f'/api/admin/orders/{ids[1]}/cancel/', **admin_headers())
+        self.client.post(f'/api/admin/orders/{ids[2]}/cancel/', **admin_headers())
+        consumer = ConsumeOrders(queue=DatabaseOrderQueue())
+        consumer.thread_sleep_time = 0
+        consumer.process_next()  # ids[1] was cancelled, only ids[0] is processed
+        consumer.process_next()
+
+        # Refused transitions leave the counters alone
+        response = self.client.post(f'/api/admin/orders/{ids[0]}/cancel/', **admin_headers())
+        self.assertEqual(response.status_code, 400)
+        self.client.post(f'/api/admin/orders/{ids[2]}/accept/', **admin_headers())
+
+        self.assertEqual(self.counts(), self.source_counts())
+        self.assertEqual(self.counts(), {"Pending": 1, "Processing": 0, "Processed": 1, "Cancelled": 2})
+        buckets = dict(OrderStatusBucket.objects.values_list('status').annotate(Sum('count')))
+        self.assertEqual(buckets, {"Pending": 4, "Processing": 2, "Processed": 1, "Cancelled": 2})
+
+    def test_dashboard_reads_only_rollups(self):
+        ids = self.create_orders(3)
+        self.client.post(f'/api/admin/orders/{ids[0]}/cancel/', **admin_headers())
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'minutes': 5}, **admin_headers())
+        data = response.json()
+        self.assertEqual(data["counts"], {"Pending": 2, "Processing": 0, "Processed": 0, "Cancelled": 1})
+        self.assertEqual((data["total"], data["backlog"], data["window_minutes"]), (3, 2, 5))
+        self.assertEqual(len(data["per_minute"]), 5)
+        self.assertTrue(data["per_minute"][-1]["minute"].endswith(':00Z'))
+        self.assertEqual(sum(minute["counts"]["Pending"] for minute in data["per_minute"]), 3)
+
+    def test_dashboard_parameters_and_permissions(self):
+        for minutes in ('x', 0, 24 * 60 + 1):
+            response = self.client.get(self.url, {'minutes': minutes}, **admin_headers())
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(self.url, **auth_headers()).status_code, 403)
+
+    def test_rebuild_reconciles_with_orders(self):
+        self.create_orders(2)
+        # Written behind the rollups' back
+        make_order(status="Processed")
+        Order.objects.filter(status="Pending").update(status="Cancelled")
+        out = io.StringIO()
+        call_command('rebuild_order_rollups', stdout=out)
+        self.assertEqual(self.counts(), self.source_counts())
+        self.assertIn("Cancelled: 0 -> 2", out.getvalue())
+        buckets = dict(OrderStatusBucket.objects.values_list('status').annotate(Sum('count')))
+        self.assertEqual(buckets, {"Pending": 3, "Processed": 1, "Cancelled": 2})
+
+    def test_rebuild_counts_only_keeps_buckets(self):
+        self.create_orders(2)
+        self.client.post(f'/api/admin/orders/{Order.objects.first().id}/accept/', **admin_headers())
+        buckets = list(OrderStatusBucket.objects.values_list('minute', 'status', 'count'))
+        make_order()
+        call_command('rebuild_order_rollups', counts_only=True, stdout=io.StringIO())
+        self.assertEqual(self.counts()["Pending"], 2)
+        self.assertEqual(list(OrderStatusBucket.objects.values_list('minute', 'status', 'count')), buckets)
+
+
+class OrderRollupConcurrencyTests(TransactionTestCase):
+    def test_concurrent_first_transitions_of_a_minute(self):
+        minute = timezone.now().replace(second=0, microsecond=0) + timedelta(minutes=5)
+        barrier = threading.Barrier(6)
+        errors = []
+
+        def transition():
+            try:
+                barrier.wait()
+                with transaction.atomic():
+                    record_transition(None, "Pending", at=minute)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=transition) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(OrderStatusBucket.objects.get(minute=minute, status="Pending").count, 6)
+        self.assertEqual(OrderStatusCount.objects.get(status="Pending").count, 6)
+
+
+class OrderListDataTests(TestCase):
+    def test_matches_order_item_serializer(self):
+        orders = [make_order(item_name=f"item {index}") for index in range(3)]
+        # With and without microseconds, in and out of UTC
+        Order.objects.filter(id=orders[0].id).update(created_on=timezone.now().replace(microsecond=0))
+        queryset = Order.objects.order_by('id')
+        for time_zone in ('UTC', 'Asia/Kolkata'):
+            with timezone.override(time_zone):
+                expected = json.loads(json.dumps(OrderItemSerializer(queryset, many=True).data))
+                self.assertEqual(order_list_data(queryset.values_list(*ORDER_LIST_FIELDS)), expected)
+
+    def test_listing_is_rendered_without_model_instances(self):
+        make_order()
+        with mock.patch.object(OrderItemSerializer, 'to_representation') as to_representation:
+            response = self.client.get('/api/admin/orders/', **admin_headers())
+        to_representation.assert_not_called()
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(list(response.json()["orders"][0]), list(ORDER_LIST_FIELDS))
+
+
+@override_settings(ORDER_EXPORT_CHUNK_SIZE=2)
+class OrderExportTests(TestCase):
+    url = '/api/admin/orders/export/'
+
+    def setUp(self):
+        self.orders = [make_order(item_name=f"item, {index}", status="Processed" if index % 2 else "Pending")
+                       for index in range(5)]
+
+    def export(self, **params):
+        response = self.client.get(self.url, params, **admin_headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        async def read():
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        return response, async_to_sync(read)().decode()
+
+    def test_ndjson_streams_all_rows_in_keyset_batches(self):
+        # Batches of 2: three queries, no OFFSET
+        with self.assertNumQueries(3) as queries:
+            response, body = self.export()
+        self.assertTrue(all('OFFSET' not in query['sql'].upper() for query in queries.captured_queries))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["id"] for row in rows], [order.id for order in self.orders])
+        self.assertEqual(rows[0]["item_name"], "item, 0")
+        self.assertEqual(rows[0]["username"], "alice")
+        self.assertTrue(rows[0]["created_on"].endswith("Z"))
+
+    def test_csv_with_filters(self):
+        response, body = self.export(format='csv', status='Processed')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="orders.csv"')
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], list(EXPORT_FIELDS))
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.orders[1].id, self.orders[3].id])
+        self.assertEqual(rows[1][EXPORT_FIELDS.index('item_name')], "item, 1")
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url, {'format': 'xml'}, **admin_headers()).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'created_after': 'soon'}, **admin_headers()).status_code, 400)
+        self.assertEqual(self.client.get(self.url, **auth_headers()).status_code, 403)
+
+
+class OrderQueryPlanTests(TestCase):
+    """The hot Order queries must be served by an index, without a sort step."""
+
+    # How SQLite / MySQL report an extra sort in EXPLAIN output
+    SORT_MARKERS = ('USE TEMP B-TREE FOR ORDER BY', 'Using filesort')
+
+    def setUp(self):
+        for index in range(20):
+            make_order(username=f'user{index % 4}', status=["Pending", "Processing", "Processed"][index % 3])
+
+    def assertUsesIndex(self, queryset, index_name, ordered=True):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        if ordered:
+            for marker in self.SORT_MARKERS:
+                self.assertNotIn(marker, plan)
+
+    def test_admin_listing(self):
+        queryset = Order.objects.order_by('-created_on', '-id')[:51]
+        self.assertUsesIndex(queryset, 'order_created_idx')
+
+    def test_user_listing(self):
+        queryset = Order.objects.filter(username='user1').order_by('-created_on', '-id')[:51]
+        self.assertUsesIndex(queryset, 'order_user_created_idx')
+
+    def test_status_listing(self):
+        queryset = Order.objects.filter(status='Pending').order_by('-created_on', '-id')[:51]
+        self.assertUsesIndex(queryset, 'order_status_created_idx')
+
+    def test_status_lookup(self):
+        queryset = Order.objects.filter(status='Processing')
+        self.assertUsesIndex(queryset, 'order_status_created_idx', ordered=False)
+
+    def test_changes_feed(self):
+        since = timezone.now() - timedelta(minutes=5)
+        queryset = Order.objects.filter(
+            Q(updated_on__gt=since) | Q(updated_on=since, id__gt=10)
+        ).order_by('updated_on', 'id')[:501]
+        self.assertUsesIndex(queryset, 'order_updated_idx')
+
+    def test_user_listing_etag(self):
+        # An aggregate has no QuerySet.explain(), so EXPLAIN the SQL it runs
+        with CaptureQueriesContext(connection) as queries:
+            Order.objects.filter(username='user1').aggregate(Max('updated_on'), Count('id'))
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {queries.captured_queries[0]['sql']}")
+            plan = str(cursor.fetchall())
+        self.assertIn('order_user_updated_idx', plan)
+
+    def test_keyset_page(self):
+        created_on = Order.objects.order_by('created_on').values_list('created_on', flat=True)[10]
+        queryset = Order.objects.filter(
+            Q(created_on__lt=created_on) | Q(created_on=created_on, id__lt=10)
+        ).order_by('-created_on', '-id')[:51]
+        self.assertUsesIndex(queryset, 'order_created_idx')
+
+
+class SaveOrderTests(TestCase):
+    url = '/api/orders/'
+
+    def cart(self, size):
+        return [{"item_id": index, "item_name": f"item {index}", "item_quantity": 1} for index in range(size)]
+
+    def post(self, data):
+        return self.client.post(self.url, data, content_type='application/json', **auth_headers())
+
+    def test_cart_is_inserted_with_constant_queries(self):
+        with self.assertNumQueries(5) as small:
+            self.post(self.cart(2))
+        with self.assertNumQueries(len(small.captured_queries)):
+            response = self.post(self.cart(50))
+
+        self.assertEqual(response.status_code, 201)
+        ids = response.json()["order_ids"]
+        self.assertEqual(len(ids), 50)
+        self.assertEqual(
+            list(Order.objects.filter(id__in=ids).order_by('id').values_list('item_name', flat=True)),
+            [f"item {index}" for index in range(50)],
+        )
+
+    def test_notifications_are_batched_per_group(self):
+        channel_layer = get_channel_layer()
+        user_channel = async_to_sync(channel_layer.new_channel)()
+        admin_channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)('user_alice', user_channel)
+        async_to_sync(channel_layer.group_add)('admin_orders', admin_channel)
+
+        with mock.patch.object(type(channel_layer), 'group_send', autospec=True,
+                               side_effect=channel_layer.group_send.__func__) as group_send:
+            response = self.post(self.cart(10))
+        self.assertEqual(group_send.call_count, 2)
+
+        user_message = async_to_sync(channel_layer.receive)(user_channel)
+        admin_message = async_to_sync(channel_layer.receive)(admin_channel)
+        self.assertEqual(user_message["type"], "order_status_batch")
+        self.assertEqual([m["order_id"] for m in user_message["messages"]], response.json()["order_ids"])
+        self.assertEqual(admin_message["type"], "order_update_batch")
+        self.assertEqual(len(admin_message["messages"]), 10)
+
+    def test_requires_authentication(self):
+        response = self.client.post(self.url, self.cart(1), content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/api/admin/orders/', HTTP_AUTHORIZATION='Bearer garbage')
+        self.assertEqual(response.status_code, 401)
+
+    def test_username_comes_from_token_not_header(self):
+        response = self.client.post(
+            self.url, self.cart(1), content_type='application/json',
+            HTTP_X_USERNAME='mallory', **auth_headers(username='alice')
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get(id=response.json()["order_ids"][0]).username, 'alice')
+
+    def test_admin_endpoints_require_admin_claim(self):
+        order = make_order()
+        for method, url in (('get', '/api/admin/orders/'), ('get', '/api/admin/orders/changes/'),
+                            ('post', f'/api/admin/orders/{order.id}/accept/'),
+                            ('post', f'/api/admin/orders/{order.id}/cancel/')):
+            response = getattr(self.client, method)(url, **auth_headers())
+            self.assertEqual(response.status_code, 403, url)
+        self.assertEqual(Order.objects.get(id=order.id).status, "Pending")
+
+    def test_method_not_allowed(self):
+        response = self.client.get(self.url, **auth_headers())
+        self.assertEqual(response.status_code, 405)
+
+    def test_invalid_item_rejects_whole_cart(self):
+        cart = self.cart(3)
+        cart[2]["item_quantity"] = "many"
+        response = self.post(cart)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+    def save_without_returned_ids(self, step):
+        """Save a cart as on MySQL: bulk_create returns no ids, the server's id step is ``step``."""
+        serializer = OrderSerializer(data=self.cart(3), many=True, context={'user_id': 1, 'username': 'alice'})
+        self.assertTrue(serializer.is_valid())
+        with mock.patch.object(
+            type(connection.features), 'can_return_rows_from_bulk_insert',
+            new_callable=mock.PropertyMock, return_value=False,
+        ), mock.patch('inventory.serializers._consecutive_id_step', return_value=step), mock.patch(
+            # SQLite reports the last id of the INSERT where MySQL reports the first
+            'inventory.serializers._last_insert_id', side_effect=lambda alias: Order.objects.latest('id').id - 2,
+        ):
+            return serializer.save()
+
+    def test_ids_follow_the_first_insert_id_when_consecutive(self):
+        orders = self.save_without_returned_ids(step=1)
+        self.assertEqual(
+            [Order.objects.get(id=order.id).item_name for order in orders],
+            ["item 0", "item 1", "item 2"],
+        )
+
+    def test_orders_are_inserted_one_by_one_when_ids_may_interleave(self):
+        orders = self.save_without_returned_ids(step=None)
+        self.assertEqual(
+            [Order.objects.get(id=order.id).item_name for order in orders],
+            ["item 0", "item 1", "item 2"],
+        )
+
+    def test_id_step_is_read_from_the_given_database(self):
+        other = mock.MagicMock()
+        other.cursor.return_value.__enter__.return_value.fetchone.return_value = (1, 2)
+        _consecutive_id_step.cache_clear()
+        self.addCleanup(_consecutive_id_step.cache_clear)
+        with mock.patch('inventory.serializers.connections', {'other': other}):
+            self.assertEqual(_consecutive_id_step('other'), 2)
+        other.cursor.assert_called_once_with()
+
+
+class OrderWebsocketConsumerTests(TestCase):
+    async def test_admin_batch_is_sent_as_one_frame(self):
+        communicator = WebsocketCommunicator(AdminOrderConsumer.as_asgi(), '/ws/admin/orders/')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+
+        messages = [{"order_id": 1, "action": "new_order", "status": "Pending"},
+                    {"order_id": 2, "action": "new_order", "status": "Pending"}]
+        await get_channel_layer().group_send('admin_orders', {"type": "order_update_batch", "messages": messages})
+
+        frame = await communicator.receive_json_from()
+        self.assertEqual(frame, {"type": "order_update_batch", "data": messages})
+        self.assertTrue(await communicator.receive_nothing())
+        await communicator.disconnect()
+
+
+def sample(name, **labels):
+    """Value of one sample on /metrics (0 if it isn't there yet)."""
+    from .metrics import registry
+    wanted = "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}" if labels else ""
+    for line in registry.render().splitlines():
+        if line.startswith(name + wanted + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+class MetricsTests(TestCase):
+    def test_prometheus_text_format(self):
+        registry = Registry()
+        latency = registry.register(Histogram("test_seconds", "Latency.", ("view",), buckets=(0.1, 1)))
+        hits = registry.register(Counter("test_hits_total", "Hits."))
+        latency.labels('a"b').observe(0.05)
+        latency.labels('a"b').observe(0.5)
+        latency.labels('a"b').observe(5)
+        hits.inc(3)
+        self.assertEqual(registry.render().splitlines(), [
+            '# HELP test_seconds Latency.',
+            '# TYPE test_seconds histogram',
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            'test_seconds_bucket{view="a\\"b",le="1"} 2',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 3',
+            'test_seconds_sum{view="a\\"b"} 5.55',
+            'test_seconds_count{view="a\\"b"} 3',
+            '# HELP test_hits_total Hits.',
+            '# TYPE test_hits_total counter',
+            'test_hits_total 3',
+        ])
+
+    def test_requests_are_timed_with_their_queries(self):
+        make_order()
+        labels = {'view': 'get_user_orders', 'method': 'GET', 'status': '200'}
+        requests = sample('inventory_http_request_duration_seconds_count', **labels)
+        queries = sample('inventory_http_request_db_queries_sum', view='get_user_orders')
+        order_list_cache.clear()
+        self.client.get('/api/orders/user/', **auth_headers())
+
+        self.assertEqual(sample('inventory_http_request_duration_seconds_count', **labels), requests + 1)
+        # The ETag aggregate and the page, run in sync_to_async's thread
+        self.assertEqual(sample('inventory_http_request_db_queries_sum', view='get_user_orders'), queries + 2)
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_scraping_is_limited_to_allowed_networks_or_the_token(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        with override_settings(METRICS_ALLOWED_NETWORKS=['203.0.113.0/24']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.7').status_code, 200)
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_queue_and_order_gauges_are_read_at_scrape_time(self):
+        order = make_order()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/admin/orders/{order.id}/accept/', **admin_headers())
+        self.assertEqual(sample('inventory_order_queue_depth', state='waiting'), 1)
+        self.assertEqual(sample('inventory_order_queue_depth', state='claimed'), 0)
+        self.assertEqual(sample('inventory_orders', status='Processing'), 1)
+
+    def test_consumer_and_group_send_are_timed(self):
+        order = make_order(status="Processing")
+        queue = DatabaseOrderQueue()
+        queue.put(order.id)
+        consumer = ConsumeOrders(queue=queue)
+        consumer.thread_sleep_time = 0
+        waits = sample('inventory_order_queue_wait_seconds_count')
+        sends = sample('inventory_channel_group_send_seconds_count', group='admin')
+        consumer.process_next(get_channel_layer())
+        self.assertEqual(sample('inventory_order_queue_wait_seconds_count'), waits + 1)
+        self.assertEqual(sample('inventory_channel_group_send_seconds_count', group='admin'), sends + 1)
+
+    async def test_websocket_connections_are_counted(self):
+        # Rendering runs queries, which an async test can't do
+        gauge = websocket_connections.labels('admin')
+        before = gauge.value
+        communicator = WebsocketCommunicator(AdminOrderConsumer.as_asgi(), '/ws/admin/orders/')
+        await communicator.connect()
+        self.assertEqual(gauge.value, before + 1)
+        await communicator.disconnect()
+        self.assertEqual(gauge.value, before)
+
+    async def test_connections_never_accepted_are_not_uncounted(self):
+        gauge = websocket_connections.labels('admin')
+        before = gauge.value
+        consumer = AdminOrderConsumer()
+        consumer.channel_layer = mock.AsyncMock()
+        consumer.channel_name = 'test!never-accepted'
+        consumer.room_group_name = 'admin_orders'
+        await consumer.disconnect(1006)
+        self.assertEqual(gauge.value, before)
+
+    def test_json_log_lines(self):
+        record = logging.LogRecord('inventory.consumer', logging.INFO, __file__, 1, "Order processed", (), None)
+        record.order_id = 7
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(
+            {key: entry[key] for key in ('level', 'logger', 'message', 'order_id')},
+            {'level': 'INFO', 'logger': 'inventory.consumer', 'message': 'Order processed', 'order_id': 7},
+        )
+        self.assertTrue(entry['time'].endswith('+00:00'))
+
+
+class OrderStatusViewTests(TestCase):
+    def test_accept_enqueues_order(self):
+        order = make_order(status="Pending")
+        response = self.client.post(f'/api/admin/orders/{order.id}/accept/', **admin_headers())
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "Processing")
+        self.assertTrue(QueuedOrder.objects.filter(order=order).exists())
+
+        response = self.client.post(f'/api/admin/orders/{order.id}/accept/', **admin_headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_cancel(self):
+        order = make_order(status="Processing")
+        response = self.client.post(f'/api/admin/orders/{order.id}/cancel/', **admin_headers())
+        self.assertEqual(response.status_code, 200)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "Cancelled")
+
+        response = self.client.post(f'/api/admin/orders/{order.id}/cancel/', **admin_headers())
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_order(self):
+        for action in ('accept', 'cancel'):
+            response = self.client.post(f'/api/admin/orders/999/{action}/', **admin_headers())
+            self.assertEqual(response.status_code, 404)
+
+
+class LocalBrokerChannelLayerTests(TestCase):
+    """Two layer instances stand in for two processes: each owns its own channels."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.path = os.path.join(self.tempdir.name, 'channels.sock')
+
+    def make_layer(self, path=None, **kwargs):
+        layer = LocalBrokerChannelLayer(path=path or self.path, **kwargs)
+        self.addCleanup(async_to_sync(layer.close))
+        return layer
+
+    async def receive(self, layer, channel):
+        return await asyncio.wait_for(layer.receive(channel), timeout=2)
+
+    async def test_group_send_reaches_other_process(self):
+        web, worker = self.make_layer(), self.make_layer()
+        admin_socket = await web.new_channel()
+        other_socket = await worker.new_channel()
+        await web.group_add('admin_orders', admin_socket)
+        await worker.group_add('admin_orders', other_socket)
+
+        await worker.group_send('admin_orders', {'type': 'order_update', 'message': {'order_id': 1}})
+
+        self.assertEqual((await self.receive(web, admin_socket))['message'], {'order_id': 1})
+        self.assertEqual((await self.receive(worker, other_socket))['message'], {'order_id': 1})
+
+    async def test_send_to_channel_of_other_process(self):
+        web, worker = self.make_layer(), self.make_layer()
+        channel = await web.new_channel()
+        await worker.new_channel()
+        await worker.send(channel, {'type': 'hello'})
+        self.assertEqual(await self.receive(web, channel), {'type': 'hello'})
+
+    async def test_group_discard(self):
+        web, worker = self.make_layer(), self.make_layer()
+        channel = await web.new_channel()
+        await web.group_add('admin_orders', channel)
+        await web.group_discard('admin_orders', channel)
+        await worker.group_send('admin_orders', {'type': 'order_update'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(web.receive(channel), timeout=0.2)
+
+    async def test_group_membership_expires(self):
+        web = self.make_layer(group_expiry=0)
+        channel = await web.new_channel()
+        await web.group_add('admin_orders', channel)
+        await asyncio.sleep(0.01)
+        await web.group_send('admin_orders', {'type': 'order_update'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(web.receive(channel), timeout=0.2)
+
+    async def test_capacity(self):
+        web = self.make_layer(capacity=2)
+        channel = await web.new_channel()
+        await web.send(channel, {'type': 'a'})
+        await web.send(channel, {'type': 'b'})
+        with self.assertRaises(ChannelFull):
+            await web.send(channel, {'type': 'c'})
+        self.assertEqual((await self.receive(web, channel))['type'], 'a')
+
+    async def test_messages_expire(self):
+        web = self.make_layer(expiry=0)
+        channel = await web.new_channel()
+        await web.send(channel, {'type': 'stale'})
+        await asyncio.sleep(0.01)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(web.receive(channel), timeout=0.2)
+
+    async def test_close_hands_over_the_broker(self):
+        web, worker = self.make_layer(), self.make_layer()
+        await web.new_channel()
+        await worker.new_channel()
+        self.assertIsNotNone(web._broker)
+
+        await web.close()
+
+        # The worker takes over the broker; a new process can join it
+        other = self.make_layer()
+        channel = await other.new_channel()
+        await other.group_add('admin_orders', channel)
+        await worker.group_send('admin_orders', {'type': 'order_update'})
+        self.assertEqual((await self.receive(other, channel))['type'], 'order_update')
+        self.assertIsNone(web._broker)
+
+    async def test_unreachable_broker_does_not_block_the_event_loop(self):
+        layer = self.make_layer(path=os.path.join(self.tempdir.name, 'missing', 'channels.sock'))
+        started = time.monotonic()
+        with self.assertLogs('inventory.channel_layer', 'WARNING'):
+            await layer.group_send('admin_orders', {'type': 'order_update'})
+            self.assertLess(time.monotonic() - started, 0.1)
+            await layer.close()
+
+    async def test_queues_of_gone_channels_are_freed(self):
+        web = self.make_layer(expiry=0)
+        gone = await web.new_channel()
+        await web.send(gone, {'type': 'unread'})
+        await asyncio.sleep(0.01)
+        live = await web.new_channel()
+        await web.send(live, {'type': 'hello'})
+        self.assertNotIn(gone, web._channels)
+        self.assertIn(live, web._channels)
+
+    def test_slow_client_does_not_hold_up_the_others(self):
+        broker = ChannelBroker(self.path, max_pending=2)
+        broker.start()
+        self.addCleanup(broker.stop)
+
+        def connect(prefix):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            sock.settimeout(2)
+            self.addCleanup(sock.close)
+            _send_frame(sock, {'op': 'hello', 'prefix': prefix, 'ack': 0})
+            self.assertEqual(_recv_frame(sock), {'op': 'ack', 'id': 0})
+            return sock
+
+        # Never reads what it's sent
+        connect('slow')
+        fast = connect('fast')
+        sender = connect('sender')
+        big = 'x' * 65536
+        with self.assertLogs('inventory.channel_layer', 'WARNING'):
+            for _ in range(50):
+                _send_frame(sender, {'op': 'send', 'channel': 'slow!a', 'message': {'type': 'big', 'data': big}})
+            _send_frame(sender, {'op': 'send', 'channel': 'fast!a', 'message': {'type': 'hello'}})
+            frame = _recv_frame(fast)
+        self.assertEqual(frame, {'op': 'deliver', 'channels': ['fast!a'], 'message': {'type': 'hello'}})
+
+    def test_unknown_options_are_ignored(self):
+        with self.assertLogs('inventory.channel_layer', 'WARNING') as logs:
+            layer = self.make_layer(hosts=[('localhost', 6379)], capacity=5)
+        self.assertEqual(layer.capacity, 5)
+        self.assertIn('hosts', logs.output[0])
+
+
+class TestRunnerTests(TestCase):
+    def test_tests_use_their_own_cache_and_channel_broker(self):
+        tempdir = os.path.dirname(settings.CACHES['orders']['LOCATION'])
+        self.assertTrue(os.path.basename(tempdir).startswith('inventory-tests-'))
+        self.assertEqual(os.path.dirname(get_channel_layer().path), tempdir)
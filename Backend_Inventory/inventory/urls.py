@@ -8,6 +8,9 @@ urlpatterns = [
     
     # Admin endpoints
     path('admin/orders/', views.get_all_orders_admin, name='get_all_orders_admin'),
+    path('admin/orders/changes/', views.get_order_changes_admin, name='get_order_changes_admin'),
+    path('admin/orders/stats/', views.get_order_stats_admin, name='get_order_stats_admin'),
+    path('admin/orders/export/', views.export_orders_admin, name='export_orders_admin'),
     path('admin/orders/<int:order_id>/accept/', views.accept_order, name='accept_order'),
     path('admin/orders/<int:order_id>/cancel/', views.cancel_order, name='cancel_order'),
 
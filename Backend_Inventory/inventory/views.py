@@ -1,39 +1,65 @@
+import hmac
+import ipaddress
+import logging
+from operator import itemgetter
+
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.response import Response
 
 from inventory.authentication import JWTAuthenticationWithoutUserDB
-from .serializers import OrderSerializer, OrderItemSerializer
+from .serializers import ORDER_LIST_FIELDS, OrderSerializer, order_list_data
 from .order_queue import order_queue
+from .search import search_cache
+from .pagination import InvalidPageRequest, filter_orders, order_changes, paginate_orders
 
 from .models import Order
+from .async_api import async_api_view
+from .conditional import listing_etag, not_modified, set_validator
+from .order_cache import order_list_cache
+from .rollups import MAX_WINDOW_MINUTES, dashboard_stats, record_transition
+from .rendering import FastJsonResponse
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry, timed_group_send
+from .export import csv_stream, export_batches, ndjson_stream
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+from asgiref.sync import sync_to_async
+
+logger = logging.getLogger(__name__)
+
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 100
 
-inventory_list = ["apple", "banana", "cherries", "apricot", "blueberry"]
+# Keyset positions of the values_list() rows the listings page through
+LIST_ROW_POSITION = itemgetter(ORDER_LIST_FIELDS.index('created_on'), ORDER_LIST_FIELDS.index('id'))
+CHANGE_ROW_POSITION = itemgetter(len(ORDER_LIST_FIELDS), ORDER_LIST_FIELDS.index('id'))
 
 @api_view(["GET"])
 @authentication_classes([JWTAuthenticationWithoutUserDB])
 @permission_classes([IsAuthenticated])
 def searchList(request):
     value = request.GET.get('search', '').strip()
-    print(value)
-    
-    matches = []
-    for index, item in enumerate(inventory_list):
-        if item.lower().startswith(value.lower()):
-            matches.append({"id": index, "name": item})
+    try:
+        limit = int(request.GET.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return Response(data={"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
 
-    print(matches)
+    mode = request.GET.get('mode', 'prefix')
+    if mode not in ('prefix', 'fuzzy'):
+        return Response(data={"error": "mode must be 'prefix' or 'fuzzy'"}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches = search_cache.search(value, limit=limit, mode=mode)
     return Response(data = {"message": matches}, status = status.HTTP_200_OK)
 
 # Create your views here.
-@api_view(["POST"])
-@authentication_classes([JWTAuthenticationWithoutUserDB])
-@permission_classes([IsAuthenticated])
-def save_order(request):
-    username = request.headers.get("X-Username")
+@async_api_view(["POST"])
+async def save_order(request):
+    # From the token's signed claim, not a header the client could set
+    username = request.user.username
     
     # Handle list of orders
     orderSerialiser = OrderSerializer(
@@ -43,108 +69,213 @@ def save_order(request):
     )
     
     if orderSerialiser.is_valid():
-        orders = orderSerialiser.save()
+        # Runs in a transaction, which the async ORM can't do yet
+        orders = await sync_to_async(orderSerialiser.save)()
+        await order_list_cache.ainvalidate(username)
         
-        # Notify user via WebSocket that order is pending
+        # Notify user and admin portal via WebSocket, one batch message per group
         channel_layer = get_channel_layer()
-        for order in orders:
-            if channel_layer:
-                async_to_sync(channel_layer.group_send)(
-                    f"user_{username}",
-                    {
-                        "type": "order_status",
-                        "message": {
+        if channel_layer:
+            await timed_group_send(
+                channel_layer,
+                f"user_{username}",
+                {
+                    "type": "order_status_batch",
+                    "messages": [
+                        {
                             "order_id": order.id,
                             "status": "Pending",
                             "item_name": order.item_name
                         }
-                    }
-                )
-            
-            # Notify admin portal of new order
-            async_to_sync(channel_layer.group_send)(
+                        for order in orders
+                    ]
+                }
+            )
+
+            await timed_group_send(
+                channel_layer,
                 "admin_orders",
                 {
-                    "type": "order_update",
-                    "message": {
-                        "order_id": order.id,
-                        "action": "new_order",
-                        "status": "Pending"
-                    }
+                    "type": "order_update_batch",
+                    "messages": [
+                        {
+                            "order_id": order.id,
+                            "action": "new_order",
+                            "status": "Pending"
+                        }
+                        for order in orders
+                    ]
                 }
             )
 
-        return Response(
-            data={"message": "Order Created"}, 
+        return JsonResponse(
+            {"message": "Order Created", "order_ids": [order.id for order in orders]},
             status=status.HTTP_201_CREATED
         )
     
-    return Response(
-        data={"error": orderSerialiser.errors}, 
+    return JsonResponse(
+        {"error": orderSerialiser.errors},
         status=status.HTTP_400_BAD_REQUEST
     )
 
-@api_view(["GET"])
-@authentication_classes([JWTAuthenticationWithoutUserDB])
-@permission_classes([IsAuthenticated])
-def get_user_orders(request):
+@async_api_view(["GET"])
+async def get_user_orders(request):
+    username = request.user.username
+    query = request.get_full_path()
     try:
-        username = request.headers.get("X-Username")
-        orders = Order.objects.filter(username=username).order_by('-created_on')
-        orderSerialiser = OrderItemSerializer(orders, many=True)
-        # print(orderSerialiser.data)
-        return Response(data={"orders": orderSerialiser.data}, status=status.HTTP_200_OK)
-    except Exception as e:
-        print(f"Error fetching orders: {str(e)}")
-        return Response(
-            data={"error": "Failed to fetch orders"}, 
+        # Served from the cache until one of the user's orders changes
+        version = await order_list_cache.version(username)
+        cached = await order_list_cache.get(username, version, query)
+        if cached is not None:
+            etag, content = cached
+            response = not_modified(request, etag)
+            if response is None:
+                response = set_validator(HttpResponse(content, content_type='application/json'), etag)
+            return response
+
+        orders = filter_orders(Order.objects.filter(username=username), request.GET)
+        # Unchanged since the client's last poll: one aggregate query, no body
+        etag = await listing_etag(orders, request, scope=username, version=version)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        rows, next_cursor = await paginate_orders(
+            orders.values_list(*ORDER_LIST_FIELDS), request.GET, position=LIST_ROW_POSITION
+        )
+        response = FastJsonResponse({"orders": order_list_data(rows), "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+        await order_list_cache.put(username, version, query, etag, response.content)
+        return set_validator(response, etag)
+    except InvalidPageRequest as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception:
+        logger.exception("Failed to fetch orders", extra={"username": request.user.username})
+        return JsonResponse(
+            {"error": "Failed to fetch orders"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 # Admin Views
-@api_view(["GET"])
-@authentication_classes([JWTAuthenticationWithoutUserDB])
-@permission_classes([IsAuthenticated])
-def get_all_orders_admin(request):
-    """Get all orders for admin portal"""
+@async_api_view(["GET"], admin=True)
+async def get_all_orders_admin(request):
+    """Get a page of orders for admin portal"""
     try:
-        # In production, you should check if user has admin privileges
-        # For now, we'll allow any authenticated user
-        orders = Order.objects.all().order_by('-created_on')
-        orderSerialiser = OrderItemSerializer(orders, many=True)
-        return Response(data={"orders": orderSerialiser.data}, status=status.HTTP_200_OK)
-    except Exception as e:
-        print(f"Error fetching admin orders: {str(e)}")
-        return Response(
-            data={"error": "Failed to fetch orders"}, 
+        # Read before the rows, as for the user listing
+        version = await order_list_cache.version()
+        orders = filter_orders(Order.objects.all(), request.GET, allow_username=True)
+        etag = await listing_etag(orders, request, version=version)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        rows, next_cursor = await paginate_orders(
+            orders.values_list(*ORDER_LIST_FIELDS), request.GET, position=LIST_ROW_POSITION
+        )
+        response = FastJsonResponse({"orders": order_list_data(rows), "next_cursor": next_cursor}, status=status.HTTP_200_OK)
+        return set_validator(response, etag)
+    except InvalidPageRequest as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception:
+        logger.exception("Failed to fetch admin orders")
+        return JsonResponse(
+            {"error": "Failed to fetch orders"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(["POST"])
-@authentication_classes([JWTAuthenticationWithoutUserDB])
-@permission_classes([IsAuthenticated])
-def accept_order(request, order_id):
-    """Accept an order and add it to the processing queue"""
+@async_api_view(["GET"], admin=True)
+async def get_order_changes_admin(request):
+    """Get orders created or changed since the client's watermark"""
     try:
-        order = Order.objects.get(id=order_id)
-        
+        rows, watermark, has_more = await order_changes(
+            Order.objects.values_list(*ORDER_LIST_FIELDS, 'updated_on'), request.GET, position=CHANGE_ROW_POSITION
+        )
+        return FastJsonResponse(
+            {"orders": order_list_data(rows), "watermark": watermark, "has_more": has_more},
+            status=status.HTTP_200_OK
+        )
+    except InvalidPageRequest as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception:
+        logger.exception("Failed to fetch order changes")
+        return JsonResponse(
+            {"error": "Failed to fetch orders"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+@async_api_view(["GET"], admin=True)
+async def get_order_stats_admin(request):
+    """Dashboard stats from the order rollups, without scanning the order table"""
+    try:
+        minutes = int(request.GET.get('minutes', 60))
+    except ValueError:
+        return JsonResponse({"error": "minutes must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= minutes <= MAX_WINDOW_MINUTES:
+        return JsonResponse(
+            {"error": f"minutes must be between 1 and {MAX_WINDOW_MINUTES}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        return FastJsonResponse(await dashboard_stats(minutes), status=status.HTTP_200_OK)
+    except Exception:
+        logger.exception("Failed to fetch order stats")
+        return JsonResponse(
+            {"error": "Failed to fetch order stats"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', ndjson_stream),
+    'csv': ('text/csv', csv_stream),
+}
+
+@async_api_view(["GET"], admin=True)
+async def export_orders_admin(request):
+    """Stream every order matching the listing filters as NDJSON or CSV"""
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({"error": "format must be 'ndjson' or 'csv'"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        orders = filter_orders(Order.objects.all(), request.GET, allow_username=True)
+    except InvalidPageRequest as e:
+        return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    content_type, stream = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(stream(export_batches(orders)), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="orders.{export_format}"'
+    return response
+
+def _mark_processing(order_id):
+    """Move a pending order to Processing and enqueue it, in one transaction.
+
+    Returns the order, or None if it wasn't pending.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(id=order_id)
         if order.status != "Pending":
-            return Response(
-                data={"error": "Only pending orders can be accepted"}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Update status to Processing
+            return None
         order.status = "Processing"
         order.save()
-        
-        # Add to processing queue
         order_queue.put(order.id)
+        record_transition("Pending", "Processing")
+        order_list_cache.invalidate(order.username)
+    return order
+
+@async_api_view(["POST"], admin=True)
+async def accept_order(request, order_id):
+    """Accept an order and add it to the processing queue"""
+    try:
+        order = await sync_to_async(_mark_processing)(order_id)
+        if order is None:
+            return JsonResponse(
+                {"error": "Only pending orders can be accepted"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Notify user via WebSocket
         channel_layer = get_channel_layer()
         if channel_layer:
-            async_to_sync(channel_layer.group_send)(
+            await timed_group_send(
+                channel_layer,
                 f"user_{order.username}",
                 {
                     "type": "order_status",
@@ -157,7 +288,8 @@ def accept_order(request, order_id):
             )
             
             # Notify admin portal
-            async_to_sync(channel_layer.group_send)(
+            await timed_group_send(
+                channel_layer,
                 "admin_orders",
                 {
                     "type": "order_update",
@@ -169,45 +301,56 @@ def accept_order(request, order_id):
                 }
             )
         
-        return Response(
-            data={"message": "Order accepted and added to processing queue"}, 
+        return JsonResponse(
+            {"message": "Order accepted and added to processing queue"},
             status=status.HTTP_200_OK
         )
         
     except Order.DoesNotExist:
-        return Response(
-            data={"error": "Order not found"}, 
+        return JsonResponse(
+            {"error": "Order not found"},
             status=status.HTTP_404_NOT_FOUND
         )
-    except Exception as e:
-        print(f"Error accepting order: {str(e)}")
-        return Response(
-            data={"error": "Failed to accept order"}, 
+    except Exception:
+        logger.exception("Failed to accept order", extra={"order_id": order_id})
+        return JsonResponse(
+            {"error": "Failed to accept order"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(["POST"])
-@authentication_classes([JWTAuthenticationWithoutUserDB])
-@permission_classes([IsAuthenticated])
-def cancel_order(request, order_id):
+def _mark_cancelled(order_id):
+    """Cancel an order that isn't processed or cancelled yet, in one transaction.
+
+    Returns the order, or None if it can't be cancelled any more.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(id=order_id)
+        if order.status in ("Processed", "Cancelled"):
+            return None
+        previous = order.status
+        order.status = "Cancelled"
+        order.save()
+        record_transition(previous, "Cancelled")
+        order_list_cache.invalidate(order.username)
+    return order
+
+@async_api_view(["POST"], admin=True)
+async def cancel_order(request, order_id):
     """Cancel an order"""
     try:
-        order = Order.objects.get(id=order_id)
-        
-        if order.status in ["Processed", "Cancelled"]:
-            return Response(
-                data={"error": "Cannot cancel processed or already cancelled orders"}, 
+        # The row lock waits for a worker finishing the order meanwhile
+        order = await sync_to_async(_mark_cancelled)(order_id)
+        if order is None:
+            return JsonResponse(
+                {"error": "Cannot cancel processed or already cancelled orders"},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update status to Cancelled
-        order.status = "Cancelled"
-        order.save()
-        
         # Notify user via WebSocket
         channel_layer = get_channel_layer()
         if channel_layer:
-            async_to_sync(channel_layer.group_send)(
+            await timed_group_send(
+                channel_layer,
                 f"user_{order.username}",
                 {
                     "type": "order_status",
@@ -220,7 +363,8 @@ def cancel_order(request, order_id):
             )
             
             # Notify admin portal
-            async_to_sync(channel_layer.group_send)(
+            await timed_group_send(
+                channel_layer,
                 "admin_orders",
                 {
                     "type": "order_update",
@@ -232,19 +376,36 @@ def cancel_order(request, order_id):
                 }
             )
         
-        return Response(
-            data={"message": "Order cancelled successfully"}, 
+        return JsonResponse(
+            {"message": "Order cancelled successfully"},
             status=status.HTTP_200_OK
         )
         
     except Order.DoesNotExist:
-        return Response(
-            data={"error": "Order not found"}, 
+        return JsonResponse(
+            {"error": "Order not found"},
             status=status.HTTP_404_NOT_FOUND
         )
-    except Exception as e:
-        print(f"Error cancelling order: {str(e)}")
-        return Response(
-            data={"error": "Failed to cancel order"}, 
+    except Exception:
+        logger.exception("Failed to cancel order", extra={"order_id": order_id})
+        return JsonResponse(
+            {"error": "Failed to cancel order"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+def _may_scrape(request):
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network.strip()) for network in settings.METRICS_ALLOWED_NETWORKS)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint: this process's metrics plus queue and order gauges"""
+    if not _may_scrape(request):
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    return HttpResponse(registry.render(), content_type=METRICS_CONTENT_TYPE)
@@ -1,8 +1,12 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 
+from .metrics import websocket_connections
+
 class OrderStatusConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for user order status updates"""
+    counted = False
+
     async def connect(self):
         self.username = self.scope['url_route']['kwargs'].get('username')
         self.room_group_name = f'user_{self.username}'
@@ -14,8 +18,13 @@ class OrderStatusConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        websocket_connections.labels("user").inc()
+        self.counted = True
 
     async def disconnect(self, close_code):
+        # Not counted if connect() failed before accepting
+        if self.counted:
+            websocket_connections.labels("user").dec()
         # Leave room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -32,9 +41,18 @@ class OrderStatusConsumer(AsyncWebsocketConsumer):
             'data': message
         }))
 
+    # Several order status updates at once (e.g. a whole cart), sent as one frame
+    async def order_status_batch(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'order_status_batch',
+            'data': event['messages']
+        }))
+
 
 class AdminOrderConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for admin order updates"""
+    counted = False
+
     async def connect(self):
         self.room_group_name = 'admin_orders'
 
@@ -45,8 +63,13 @@ class AdminOrderConsumer(AsyncWebsocketConsumer):
         )
 
         await self.accept()
+        websocket_connections.labels("admin").inc()
+        self.counted = True
 
     async def disconnect(self, close_code):
+        # Not counted if connect() failed before accepting
+        if self.counted:
+            websocket_connections.labels("admin").dec()
         # Leave admin room group
         await self.channel_layer.group_discard(
             self.room_group_name,
@@ -61,4 +84,11 @@ class AdminOrderConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'type': 'order_update',
             'data': message
-        }))
\ No newline at end of file
+        }))
+
+    # Several order updates at once (e.g. a whole cart), sent as one frame
+    async def order_update_batch(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'order_update_batch',
+            'data': event['messages']
+        }))
@@ -2,6 +2,7 @@ import os
 from django.core.asgi import get_asgi_application
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
+from inventory.apps import start_order_consumer
 from inventory.routing import websocket_urlpatterns
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_proj.settings')
@@ -13,4 +14,7 @@ application = ProtocolTypeRouter({
             websocket_urlpatterns
         )
     ),
-})
\ No newline at end of file
+})
+
+# Process orders in this server process too (see ORDER_CONSUMER_IN_PROCESS)
+start_order_consumer()
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -71,7 +73,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so request latencies cover the whole stack (see /metrics)
+    'inventory.instrumentation.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Above everything else that reads or writes the response body
+    'inventory.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -102,9 +108,102 @@ WSGI_APPLICATION = 'inventory_proj.wsgi.application'
 
 ASGI_APPLICATION = 'inventory_proj.asgi.application'
 
+# Order queue
+# A worker that claims an order holds a lease on it; if the worker dies the
+# lease runs out and another worker picks the order up again.
+ORDER_QUEUE_LEASE_SECONDS = 60
+# Idle workers are woken up immediately by orders accepted in the same
+# process; orders enqueued by other processes are picked up within this interval.
+ORDER_QUEUE_POLL_INTERVAL = 0.5
+
+# Number of worker threads processing orders concurrently
+ORDER_CONSUMER_CONCURRENCY = 4
+
+# Run the order consumer threads inside the web process. Set
+# ORDER_CONSUMER_IN_PROCESS=0 when orders are processed by dedicated
+# `manage.py run_order_workers` processes instead. Only the server entry
+# points (inventory_proj/asgi.py and wsgi.py, also loaded by runserver) start
+# it; other management commands and scripts never do.
+ORDER_CONSUMER_IN_PROCESS = os.environ.get("ORDER_CONSUMER_IN_PROCESS", "1") == "1"
+
+# Order changes feed: rows changed in the last few seconds are sent again on
+# the next poll, in case a slower transaction commits a change stamped earlier
+ORDER_CHANGES_GRACE_SECONDS = 5
+
+# Rows per query when streaming an order export
+ORDER_EXPORT_CHUNK_SIZE = 2000
+
+# Rendered pages of each user's order listing, dropped whenever one of the
+# user's orders changes (see inventory/order_cache.py). A file cache is shared
+# by the web and order worker processes on this host; a locmem cache would
+# miss invalidations made by other processes. The tests use directories of
+# their own (see inventory/test_runner.py).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Django's file cache lists the whole directory on every write to see if
+    # it's full; this one only does so every CULL_INTERVAL seconds (see
+    # inventory/file_cache.py)
+    "orders": {
+        "BACKEND": "inventory.file_cache.FileBasedCache",
+        "LOCATION": os.environ.get(
+            "ORDER_LIST_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "inventory-order-lists"),
+        ),
+        "OPTIONS": {"MAX_ENTRIES": 10000, "CULL_INTERVAL": 60},
+    },
+    # Version token of the product catalog, so every process's search index
+    # notices changes made by the others (see inventory/search.py)
+    "catalog": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get(
+            "PRODUCT_CATALOG_CACHE_DIR",
+            os.path.join(tempfile.gettempdir(), "inventory-catalog"),
+        ),
+    },
+}
+ORDER_LIST_CACHE_TIMEOUT = 300
+
+# Responses smaller than this (bytes) aren't worth compressing
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+
+# Product search index: how often (seconds) to check whether another process
+# changed the catalog, and how old the index may get before a full rebuild,
+# which catches changes made without model signals (bulk updates, raw SQL)
+PRODUCT_INDEX_CHECK_INTERVAL = 1
+PRODUCT_INDEX_MAX_AGE = 300
+
+# Product search result cache (entries, seconds)
+PRODUCT_SEARCH_CACHE_SIZE = 10000
+PRODUCT_SEARCH_CACHE_TTL = 60
+
+# Access tokens already verified, kept until they expire
+JWT_VERIFIED_TOKEN_CACHE_SIZE = 10000
+
+# Who may scrape /metrics: clients on these networks (by default a scraper
+# on this host; behind a proxy, the proxy's address is what's checked), and
+# any client sending "Authorization: Bearer <METRICS_TOKEN>" if it's set.
+METRICS_ALLOWED_NETWORKS = os.environ.get("METRICS_ALLOWED_NETWORKS", "127.0.0.0/8,::1/128").split(",")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+# Shared by every daphne / order worker process on this host through a
+# Unix-socket broker that the processes start among themselves (see
+# inventory/channel_layer.py). Use channels.layers.InMemoryChannelLayer
+# for a single process. The tests use a socket of their own (see
+# inventory/test_runner.py).
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        'BACKEND': 'inventory.channel_layer.LocalBrokerChannelLayer',
+        'CONFIG': {
+            'path': os.environ.get(
+                'CHANNEL_BROKER_SOCKET',
+                os.path.join(tempfile.gettempdir(), 'inventory-channels.sock'),
+            ),
+            'capacity': 100,
+            'expiry': 60,
+            'group_expiry': 86400,
+        },
     }
 }
 
@@ -141,6 +240,26 @@ DATABASES = {
     }
 }
 
+# Set INVENTORY_DB=sqlite to run locally (or run the test suite) without MySQL
+if os.environ.get("INVENTORY_DB") == "sqlite":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": {
+                "timeout": 20,
+            },
+            # On-disk test database so the order worker threads can share it
+            "TEST": {
+                "NAME": BASE_DIR / "test_db.sqlite3",
+            },
+        }
+    }
+
+
+# Keeps the tests off the host's shared channel broker socket and cache
+TEST_RUNNER = 'inventory.test_runner.InventoryTestRunner'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -177,3 +296,22 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+
+# One JSON object per log line (see inventory/logs.py)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"()": "inventory.logs.JsonFormatter"},
+    },
+    "handlers": {
+        "console": {"class": "logging.StreamHandler", "formatter": "json"},
+    },
+    "root": {
+        "handlers": ["console"],
+        "level": os.environ.get("LOG_LEVEL", "INFO"),
+    },
+    "loggers": {
+        "django": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
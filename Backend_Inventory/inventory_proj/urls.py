@@ -17,7 +17,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from inventory import views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('api/', include('inventory.urls'))
+    path('api/', include('inventory.urls')),
+    # Prometheus scrape endpoint
+    path('metrics', views.metrics, name='metrics'),
 ]
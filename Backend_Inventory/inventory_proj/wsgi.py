@@ -11,6 +11,11 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from inventory.apps import start_order_consumer
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_proj.settings')
 
 application = get_wsgi_application()
+
+# Process orders in this server process too (see ORDER_CONSUMER_IN_PROCESS)
+start_order_consumer()
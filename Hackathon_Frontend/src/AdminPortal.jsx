@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import InventoryApi from './api';
 import './AdminPortal.css';
@@ -15,6 +15,10 @@ export default function AdminPortal() {
     const inventoryClass = new InventoryApi();
     const navigate = useNavigate();
 
+    // All known orders by id, and the watermark of the last change we've seen
+    const ordersById = useRef(new Map());
+    const watermark = useRef(null);
+
     useEffect(() => {
         // Connect to WebSocket for real-time updates
         const websocket = new WebSocket(`ws://127.0.0.1:8000/ws/admin/orders/`);
@@ -25,10 +29,10 @@ export default function AdminPortal() {
 
         websocket.onmessage = (event) => {
             const data = JSON.parse(event.data);
-            if (data.type === 'order_update') {
+            if (data.type === 'order_update' || data.type === 'order_update_batch') {
                 console.log('Order update received:', data.data);
-                // Refresh all orders when an update is received
-                fetchAllOrders();
+                // Pull just the changed orders when an update is received
+                syncOrderChanges();
             }
         };
 
@@ -49,19 +53,29 @@ export default function AdminPortal() {
 
     useEffect(() => {
         fetchAllOrders();
-        // Poll for updates every 10 seconds
-        const interval = setInterval(fetchAllOrders, 10000);
+        // Poll for changes every 10 seconds
+        const interval = setInterval(syncOrderChanges, 10000);
         return () => clearInterval(interval);
     }, []);
 
+    const categorizeOrders = () => {
+        const orders = Array.from(ordersById.current.values()).sort(
+            (a, b) => new Date(b.created_on) - new Date(a.created_on) || b.id - a.id
+        );
+        setPendingOrders(orders.filter(o => o.status === 'Pending'));
+        setProcessingOrders(orders.filter(o => o.status === 'Processing'));
+        setCompletedOrders(orders.filter(o => o.status === 'Processed' || o.status === 'Cancelled'));
+    };
+
     const fetchAllOrders = async () => {
         try {
+            // Take the watermark first so nothing changed during the full load is missed
+            const start = await inventoryClass.getOrderChangesAdmin();
             const orders = await inventoryClass.getAllOrdersAdmin();
-            if (orders) {
-                // Categorize orders by status
-                setPendingOrders(orders.filter(o => o.status === 'Pending'));
-                setProcessingOrders(orders.filter(o => o.status === 'Processing'));
-                setCompletedOrders(orders.filter(o => o.status === 'Processed' || o.status === 'Cancelled'));
+            if (start && orders) {
+                watermark.current = start.watermark;
+                ordersById.current = new Map(orders.map(o => [o.id, o]));
+                categorizeOrders();
             }
         } catch (err) {
             console.error('Error fetching orders:', err);
@@ -69,13 +83,34 @@ export default function AdminPortal() {
         }
     };
 
+    const syncOrderChanges = async () => {
+        if (!watermark.current) {
+            return fetchAllOrders();
+        }
+        try {
+            let changes;
+            do {
+                changes = await inventoryClass.getOrderChangesAdmin(watermark.current);
+                if (!changes) {
+                    return;
+                }
+                changes.orders.forEach(o => ordersById.current.set(o.id, o));
+                watermark.current = changes.watermark;
+            } while (changes.has_more);
+            categorizeOrders();
+        } catch (err) {
+            console.error('Error syncing orders:', err);
+            setError('Failed to fetch orders');
+        }
+    };
+
     const handleAcceptOrder = async (orderId) => {
         try {
             const result = await inventoryClass.acceptOrder(orderId);
             if (result) {
                 setSuccessMessage(`Order #${orderId} accepted successfully`);
                 setTimeout(() => setSuccessMessage(''), 3000);
-                await fetchAllOrders();
+                await syncOrderChanges();
             } else {
                 setError('Failed to accept order');
             }
@@ -92,7 +127,7 @@ export default function AdminPortal() {
                 if (result) {
                     setSuccessMessage(`Order #${orderId} cancelled successfully`);
                     setTimeout(() => setSuccessMessage(''), 3000);
-                    await fetchAllOrders();
+                    await syncOrderChanges();
                 } else {
                     setError('Failed to cancel order');
                 }
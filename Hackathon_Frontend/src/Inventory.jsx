@@ -42,6 +42,20 @@ export default function Inventory() {
                 // Show success message for status updates
                 setSuccess(`Order #${data.data.order_id} status updated to: ${data.data.status}`);
                 setTimeout(() => setSuccess(''), 5000);
+            } else if (data.type === 'order_status_batch') {
+                console.log('Order status updates:', data.data);
+
+                const updates = new Map(data.data.map(update => [update.order_id, update.status]));
+                setOrderHistory(prev =>
+                    prev.map(order =>
+                        updates.has(order.id)
+                            ? { ...order, status: updates.get(order.id) }
+                            : order
+                    )
+                );
+
+                setSuccess(`${data.data.length} orders updated`);
+                setTimeout(() => setSuccess(''), 5000);
             }
         };
 
@@ -387,7 +401,11 @@ function InlineProductSearch({ rowId, value, onProductSelect }) {
         setIsSearching(true);
 
         try {
-            const result = await inventoryClass.searchItems(value);
+            let result = await inventoryClass.searchItems(value);
+            // Nothing starts with that: maybe a typo
+            if (result.length === 0 && value.trim().length >= 3) {
+                result = await inventoryClass.searchItems(value, "fuzzy");
+            }
             setSearchResults(result);
             setShowDropdown(true);
             setSelectedIndex(-1);
@@ -3,7 +3,6 @@ import axios from "axios";
 export default class InventoryApi {
     constructor() {
         this.BASE = "http://127.0.0.1:8000/api/";
-        this.username = sessionStorage.getItem("user");
         this.accessToken = sessionStorage.getItem("accessToken");
     }
 
@@ -14,7 +13,6 @@ export default class InventoryApi {
                 headers: {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${this.accessToken}`,
-                    "X-Username": this.username
                 }
             }
         );
@@ -28,22 +26,33 @@ export default class InventoryApi {
         }
     }
 
-    async getAllOrders() {
-        try {
+    // Order listings are paginated; follow the cursors to collect every page
+    async fetchAllPages(path, params = {}) {
+        const orders = [];
+        let cursor = null;
+        do {
             const response = await axios.get(
-                this.BASE + "orders/user/", {
+                this.BASE + path, {
+                    params: { ...params, limit: 500, ...(cursor ? { cursor } : {}) },
                     headers: {
                         'Authorization': `Bearer ${this.accessToken}`,
-                        "X-Username": this.username
                     }
                 }
             );
-
-            if(response.status === 200){
-                console.log(response.data.orders);
-                return response.data.orders;
+            if(response.status !== 200){
+                return null;
             }
-            return null;
+            orders.push(...response.data.orders);
+            cursor = response.data.next_cursor;
+        } while (cursor);
+        return orders;
+    }
+
+    async getAllOrders() {
+        try {
+            const orders = await this.fetchAllPages("orders/user/");
+            console.log(orders);
+            return orders;
         } catch (error) {
             console.error("Error fetching orders:", error.response?.data || error.message);
             return null;
@@ -52,23 +61,34 @@ export default class InventoryApi {
 
     // Admin Methods
     async getAllOrdersAdmin() {
+        try {
+            const orders = await this.fetchAllPages("admin/orders/");
+            console.log(orders);
+            return orders;
+        } catch (error) {
+            console.error("Error fetching admin orders:", error.response?.data || error.message);
+            return null;
+        }
+    }
+
+    // Orders created or changed since `since` (omit it to get a starting watermark)
+    async getOrderChangesAdmin(since) {
         try {
             const response = await axios.get(
-                this.BASE + "admin/orders/", {
+                this.BASE + "admin/orders/changes/", {
+                    params: since ? { since } : {},
                     headers: {
                         'Authorization': `Bearer ${this.accessToken}`,
-                        "X-Username": this.username
                     }
                 }
             );
 
             if(response.status === 200){
-                console.log(response.data.orders);
-                return response.data.orders;
+                return response.data;
             }
             return null;
         } catch (error) {
-            console.error("Error fetching admin orders:", error.response?.data || error.message);
+            console.error("Error fetching order changes:", error.response?.data || error.message);
             return null;
         }
     }
@@ -81,7 +101,6 @@ export default class InventoryApi {
                 {
                     headers: {
                         'Authorization': `Bearer ${this.accessToken}`,
-                        "X-Username": this.username
                     }
                 }
             );
@@ -105,7 +124,6 @@ export default class InventoryApi {
                 {
                     headers: {
                         'Authorization': `Bearer ${this.accessToken}`,
-                        "X-Username": this.username
                     }
                 }
             );
@@ -121,17 +139,21 @@ export default class InventoryApi {
         }
     }
 
-    async searchItems(searchQuery) {
+    // Products are { id, name }, id being the database id: the seeded products are
+    // 1-5 (before the catalog moved to the database they were numbered 0-4).
+    // Prefix results are cached server-side and answer longer prefixes as the user
+    // types; "fuzzy" (typo-tolerant) is opt-in.
+    async searchItems(searchQuery, mode = "prefix") {
         try {
             const response = await axios.get(
                 this.BASE + "products/search/", {
                     params: {
-                        search: searchQuery
+                        search: searchQuery,
+                        mode: mode
                     },
                     
                     headers: {
                         'Authorization': `Bearer ${this.accessToken}`,
-                        "X-Username": this.username,
                     }
                 }
             );